@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from backend.metrics import registry
+
+        from . import signals  # noqa: F401
+        from .notifications import render_notification_stats
+        from .relations import render_relations_stats
+
+        registry.add_collector(render_notification_stats)
+        registry.add_collector(render_relations_stats)
@@ -0,0 +1,346 @@
+"""
+Асинхронные представления для нагруженных эндпоинтов чтения.
+
+Работают под ASGI-сервером и включаются настройкой ASYNC_VIEWS. Обычные
+GET-запросы обрабатываются через асинхронный ORM, всё остальное
+(другие методы, HTML-версия API, неверный токен, некорректные
+параметры) передаётся синхронным представлениям DRF, чтобы ответы
+и ошибки совпадали.
+"""
+import asyncio
+import functools
+import math
+import weakref
+
+from asgiref.sync import sync_to_async
+from backend.metrics import measure_serialization, set_endpoint
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.paginator import InvalidPage
+from django.http import (Http404, HttpResponse, HttpResponseNotAllowed,
+                         StreamingHttpResponse)
+from django.shortcuts import redirect
+from recipes.models import Ingredient, Recipe
+from rest_framework.exceptions import (APIException, AuthenticationFailed,
+                                       NotAuthenticated)
+from rest_framework.request import Request
+
+from .catalog import ingredient_catalog
+from .conditional import conditional_response
+from .constants import NOTIFICATIONS_RETRY
+from .filters import RecipeFilter
+from .mixins import get_endpoint
+from .notifications import (Listener, broker, format_event, get_backlog,
+                            get_following, get_following_version,
+                            get_last_id)
+from .pagination import CustomPagination
+from .renderers import ORJSONRenderer
+from .serializers import RecipeReadSerializer
+from .throttling import concurrency_limiter
+from .utils import (get_shopping_cart_ingredients, read_queryset,
+                    shopping_cart_response)
+from .views import IngredientViewSet, RecipeViewSet
+
+JSON_MEDIA_TYPE = 'application/json'
+EVENTS_ENDPOINT = 'RecipeViewSet.events'
+
+db_semaphores = weakref.WeakKeyDictionary()
+
+
+def db_limit():
+    """Ограничивает число одновременных обращений к БД в цикле событий."""
+    loop = asyncio.get_running_loop()
+    semaphore = db_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = db_semaphores[loop] = asyncio.Semaphore(
+            settings.ASYNC_DB_CONCURRENCY)
+    return semaphore
+
+
+def authenticate(request):
+    """Возвращает пользователя или None для неверных учётных данных.
+
+    Используются те же классы аутентификации, что и в DRF, поэтому при
+    попадании в кеш (api.authentication) запросов к БД нет.
+    """
+    if 'HTTP_AUTHORIZATION' not in request.META:
+        return AnonymousUser()
+    try:
+        for authenticator in RecipeViewSet().get_authenticators():
+            user_auth = authenticator.authenticate(request)
+            if user_auth is not None:
+                return user_auth[0]
+    except APIException:
+        return None
+    return AnonymousUser()
+
+
+async def get_user(request):
+    async with db_limit():
+        return await sync_to_async(authenticate)(request)
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        ORJSONRenderer().render(data), content_type=JSON_MEDIA_TYPE,
+        status=status)
+
+
+def error_response(exc):
+    response = json_response({'detail': exc.detail}, exc.status_code)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = str(math.ceil(exc.wait))
+    return response
+
+
+def allow_request(sync_view, request):
+    """Проверяет ограничения частоты синхронного представления.
+
+    Если запрос не прошёл, его обрабатывает sync_view и отвечает 429.
+    Прошедший запрос помечается, чтобы при передаче в sync_view токен
+    не списывался второй раз.
+    """
+    view = sync_view.cls(**sync_view.initkwargs)
+    view.action = sync_view.actions['get']
+    view.request = request
+    for throttle in view.get_throttles():
+        if not throttle.allow_request(request, view):
+            return False
+    request._request.throttle_checked = True
+    return True
+
+
+def async_read_view(sync_view):
+    """Оборачивает асинхронное представление запасным синхронным.
+
+    Если асинхронное представление вернуло None, запрос обрабатывает
+    sync_view.
+    """
+    endpoint = get_endpoint(sync_view.cls, sync_view.actions['get'])
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            set_endpoint(endpoint)
+            if (request.method == 'GET'
+                    and 'text/html' not in request.headers.get('Accept', '')):
+                user = await get_user(request)
+                if user is not None:
+                    request = Request(request)
+                    request.user = user
+                    request.accepted_media_type = JSON_MEDIA_TYPE
+                    if await sync_to_async(allow_request)(
+                            sync_view, request):
+                        response = await view(request, *args, **kwargs)
+                        if response is not None:
+                            return response
+                    request = request._request
+            return await sync_to_async(sync_view)(request, *args, **kwargs)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def get_filtered(filterset):
+    return filterset.qs if filterset.is_valid() else None
+
+
+def serialize_recipes(request, recipes, many):
+    with measure_serialization():
+        return RecipeReadSerializer(
+            recipes, many=many, context={'request': request}).data
+
+
+@async_read_view(RecipeViewSet.as_view(
+    {'get': 'list', 'post': 'create'}, basename='recipes', detail=False))
+async def recipe_list(request):
+    filterset = RecipeFilter(
+        request.query_params, queryset=read_queryset(), request=request)
+    async with db_limit():
+        # Фильтры по избранному и списку покупок читают кеш отношений.
+        queryset = await sync_to_async(get_filtered)(filterset)
+        if queryset is None:
+            return None
+        pagination = CustomPagination()
+        pagination.request = request
+        paginator = pagination.django_paginator_class(
+            queryset, pagination.get_page_size(request))
+        paginator.count = await queryset.acount()
+        try:
+            pagination.page = paginator.page(
+                pagination.get_page_number(request, paginator))
+        except InvalidPage:
+            return None
+        recipes = [recipe async for recipe in pagination.page.object_list]
+
+    def get_response():
+        return json_response({
+            'count': paginator.count,
+            'next': pagination.get_next_link(),
+            'previous': pagination.get_previous_link(),
+            'results': serialize_recipes(request, recipes, many=True),
+        })
+
+    async with db_limit():
+        return await sync_to_async(conditional_response)(
+            request, recipes, get_response, paginator.count)
+
+
+@async_read_view(RecipeViewSet.as_view(
+    {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+     'delete': 'destroy'}, basename='recipes', detail=True))
+async def recipe_detail(request, pk):
+    async with db_limit():
+        recipe = await read_queryset().filter(pk=pk).afirst()
+        if recipe is None:
+            return None
+        return await sync_to_async(conditional_response)(
+            request, (recipe,),
+            lambda: json_response(
+                serialize_recipes(request, recipe, many=False)))
+
+
+@async_read_view(IngredientViewSet.as_view(
+    {'get': 'list'}, basename='ingredients', detail=False))
+async def ingredient_list(request):
+    if not request.query_params:
+        return await sync_to_async(ingredient_catalog.response)(request)
+    if set(request.query_params) != {'name'}:
+        return None
+    queryset = Ingredient.objects.filter(
+        name__icontains=request.query_params['name']).values(
+        'id', 'name', 'measurement_unit')
+    async with db_limit():
+        ingredients = [
+            ingredient async for ingredient in queryset.aiterator()]
+    return json_response(ingredients)
+
+
+@async_read_view(RecipeViewSet.as_view(
+    {'get': 'download_shopping_cart', 'post': 'enqueue_shopping_cart'},
+    basename='recipes',
+    **RecipeViewSet.download_shopping_cart.kwargs))
+async def download_shopping_cart(request):
+    if not request.user.is_authenticated or request.query_params:
+        return None
+    async with db_limit():
+        ingredients = [
+            ingredient async for ingredient in
+            get_shopping_cart_ingredients(request.user).aiterator()]
+    return shopping_cart_response(ingredients)
+
+
+async def recipe_redirection(request, short_link):
+    async with db_limit():
+        recipe_id = await Recipe.objects.filter(
+            short_link=short_link).values_list('id', flat=True).afirst()
+    if recipe_id is None:
+        raise Http404
+    return redirect(
+        request.build_absolute_uri('/') + f'recipes/{recipe_id}/')
+
+
+def get_last_event_id(request):
+    try:
+        return max(0, int(request.headers.get('Last-Event-ID', '')))
+    except ValueError:
+        return None
+
+
+async def next_event(listener, disconnected, timeout):
+    """Ждёт событие не дольше timeout секунд, None - если его нет."""
+    get = asyncio.ensure_future(listener.queue.get())
+    wait = asyncio.ensure_future(disconnected.wait())
+    done, pending = await asyncio.wait(
+        (get, wait), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    return get.result() if get in done else None
+
+
+async def stream_events(request, user, client, last_id):
+    """Поток SSE: пропущенные рецепты, затем новые и heartbeat.
+
+    Без Last-Event-ID клиент сначала получает id последнего рецепта без
+    данных: браузер запоминает его и после обрыва запросит всё, что
+    появилось позже. Подписки перечитываются на heartbeat, если
+    изменилась их версия. Через NOTIFICATIONS_MAX_AGE секунд поток
+    закрывается, и клиент переподключается, возможно к другому
+    процессу.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.NOTIFICATIONS_MAX_AGE
+    # Отключение клиента отмечает backend.asgi.DisconnectMiddleware.
+    disconnected = request.scope.get('disconnected') or asyncio.Event()
+    listener = None
+    try:
+        async with db_limit():
+            version, authors = await sync_to_async(get_following)(user.pk)
+        listener = Listener(loop, user.pk, authors)
+        # Подключение регистрируется до чтения пропущенного, чтобы не
+        # потерять рецепты между чтением и подпиской.
+        broker.add(listener)
+        yield b'retry: %d\n\n' % NOTIFICATIONS_RETRY
+        async with db_limit():
+            if last_id is None:
+                backlog = ()
+                last_id = await sync_to_async(get_last_id)()
+            else:
+                backlog = await sync_to_async(get_backlog)(
+                    request, listener.authors, last_id)
+        if not backlog:
+            yield b'id: %d\n\n' % last_id
+        sent = set()
+        for event in backlog:
+            sent.add(event.id)
+            yield format_event(event)
+        while True:
+            timeout = min(
+                settings.NOTIFICATIONS_HEARTBEAT, deadline - loop.time())
+            if timeout <= 0:
+                return
+            event = await next_event(listener, disconnected, timeout)
+            if disconnected.is_set() or listener.overflowed:
+                return
+            if event is None:
+                yield b': ping\n\n'
+                if await sync_to_async(get_following_version)(
+                        user.pk) != version:
+                    async with db_limit():
+                        version, authors = await sync_to_async(
+                            get_following)(user.pk)
+                    broker.follow(listener, authors)
+            elif event.id not in sent:
+                yield format_event(event)
+    finally:
+        if listener is not None:
+            broker.discard(listener)
+        concurrency_limiter.release(EVENTS_ENDPOINT, client)
+
+
+async def recipe_events(request):
+    """Новые рецепты авторов, на которых подписан пользователь (SSE)."""
+    set_endpoint(EVENTS_ENDPOINT)
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(('GET',))
+    user = await get_user(request)
+    if user is None:
+        return error_response(AuthenticationFailed())
+    if not user.is_authenticated:
+        return error_response(NotAuthenticated())
+    client = f'user:{user.pk}'
+    try:
+        concurrency_limiter.acquire(
+            EVENTS_ENDPOINT, client,
+            *settings.CONCURRENCY_LIMITS[EVENTS_ENDPOINT])
+    except APIException as exc:
+        return error_response(exc)
+    response = StreamingHttpResponse(
+        stream_events(request, user, client, get_last_event_id(request)),
+        content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+recipe_events.csrf_exempt = True
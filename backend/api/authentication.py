@@ -0,0 +1,155 @@
+"""
+Аутентификация без обращения к БД на каждый запрос.
+
+Соответствие токена пользователю и снимок полей пользователя хранятся
+в общем кеше (AUTH_CACHE_TIMEOUT) и в кеше процесса
+(AUTH_CACHE_LOCAL_TIMEOUT). Записи сбрасываются при удалении токена
+(выход), изменении и удалении пользователя (в том числе смене пароля),
+см. api.signals. В других процессах снимок может жить ещё до
+AUTH_CACHE_LOCAL_TIMEOUT секунд.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import LocalCache
+
+User = get_user_model()
+
+TOKEN_KEY = 'auth:token:{}'
+# v2: снимок только с полями SNAPSHOT_FIELDS.
+USER_KEY = 'auth:user:v2:{}'
+
+# Поля пользователя, которые нужны аутентификации и представлениям, в
+# порядке полей модели (его ждёт Model.from_db). Остальные (password,
+# last_login, date_joined) при обращении читаются из БД как отложенные.
+SNAPSHOT_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {
+        'id', 'email', 'username', 'first_name', 'last_name', 'is_active',
+        'is_staff', 'is_superuser', 'avatar'})
+
+local_cache = LocalCache(
+    settings.AUTH_CACHE_LOCAL_TIMEOUT, settings.AUTH_CACHE_LOCAL_MAX_SIZE)
+
+
+def get_token_cache_key(key):
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def get_cached(key):
+    value = local_cache.get(key)
+    if value is None:
+        value = cache.get(key)
+        if value is not None:
+            local_cache.set(key, value)
+    return value
+
+
+def set_cached(key, value):
+    cache.set(key, value, settings.AUTH_CACHE_TIMEOUT)
+    local_cache.set(key, value)
+
+
+def delete_cached(key):
+    cache.delete(key)
+    local_cache.delete(key)
+
+
+def make_snapshot(user):
+    """Поля SNAPSHOT_FIELDS и MD5 хеша пароля для проверки отзыва JWT
+    (сам хеш пароля в кеш не попадает)."""
+    return {
+        'fields': [getattr(user, field) for field in SNAPSHOT_FIELDS],
+        'password_hash': get_md5_hash_password(user.password),
+    }
+
+
+def get_password_hash(user):
+    password_hash = getattr(user, '_password_hash', None)
+    if password_hash is None:
+        return get_md5_hash_password(user.password)
+    return password_hash
+
+
+def cache_user(user):
+    set_cached(USER_KEY.format(user.pk), make_snapshot(user))
+
+
+def invalidate_user(user_id):
+    delete_cached(USER_KEY.format(user_id))
+
+
+def invalidate_token(key):
+    delete_cached(get_token_cache_key(key))
+
+
+def get_cached_user(user_id):
+    """Возвращает пользователя из снимка в кеше или из БД."""
+    snapshot = get_cached(USER_KEY.format(user_id))
+    if snapshot is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            cache_user(user)
+        return user
+    user = User.from_db(
+        DEFAULT_DB_ALIAS, SNAPSHOT_FIELDS, list(snapshot['fields']))
+    user._password_hash = snapshot['password_hash']
+    return user
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который берёт токен и пользователя из кеша."""
+
+    def authenticate_credentials(self, key):
+        cache_key = get_token_cache_key(key)
+        user_id = get_cached(cache_key)
+        user = None if user_id is None else get_cached_user(user_id)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            set_cached(cache_key, user.pk)
+            cache_user(user)
+            return user, token
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        return user, self.get_model()(key=key, user=user)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication, который проверяет токен без обращения к БД.
+
+    Подпись и срок действия токена проверяются локально, пользователь
+    берётся из снимка в кеше.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification'))
+        user = get_cached_user(user_id)
+        if user is None:
+            raise exceptions.AuthenticationFailed(
+                _('User not found'), code='user_not_found')
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User is inactive'), code='user_inactive')
+        if jwt_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+                jwt_settings.REVOKE_TOKEN_CLAIM
+        ) != get_password_hash(user):
+            raise exceptions.AuthenticationFailed(
+                _("The user's password has been changed."),
+                code='password_changed')
+        return user
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+VERSION_KEY = 'version:{}'
+
+
+def get_versions(*names):
+    """Возвращает текущие версии наборов данных одним запросом к кешу.
+
+    Версия - это момент последнего изменения данных. Если версии ещё нет
+    в кеше, она создаётся, поэтому после очистки кеша все производные
+    от неё ключи становятся недействительными.
+    """
+    keys = [VERSION_KEY.format(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = time.time()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def get_version(name):
+    """Возвращает текущую версию набора данных."""
+    return get_versions(name)[0]
+
+
+def bump_version(name):
+    """Помечает набор данных изменённым."""
+    cache.set(VERSION_KEY.format(name), time.time(), None)
+
+
+class LocalCache:
+    """Кеш внутри процесса с ограничением по размеру и времени жизни.
+
+    Используется перед общим кешем для самых частых ключей. Записи
+    других процессов он не видит, поэтому timeout должен быть коротким.
+    """
+
+    def __init__(self, timeout, max_size):
+        self.timeout = timeout
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def values(self):
+        """Снимок значений, включая устаревшие, для метрик."""
+        with self._lock:
+            return [value for expires, value in self._data.values()]
+
+    def __len__(self):
+        return len(self._data)
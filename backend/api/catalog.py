@@ -0,0 +1,95 @@
+import gzip
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from recipes.models import Ingredient, Tag
+
+from .cache import bump_version, get_version
+from .constants import (BROTLI_QUALITY, CATALOG_CACHE_TIMEOUT,
+                        CATALOG_MAX_AGE, GZIP_LEVEL)
+from .renderers import ORJSONRenderer
+from .serializers import IngredientSerializer, TagSerializer
+from .utils import choose_encoding
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Catalog:
+    """Справочник, который отдаётся одинаково всем пользователям.
+
+    Ответ рендерится один раз на версию справочника и хранится в кеше
+    уже сжатым, поэтому запрос справочника сводится к чтению версии
+    из кеша и отдаче готовых байтов.
+    """
+
+    def __init__(self, name, queryset, serializer_class):
+        self.name = name
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self._payload = None
+
+    @property
+    def version_name(self):
+        return f'catalog:{self.name}'
+
+    def invalidate(self):
+        """Сбрасывает справочник, он будет заново собран при запросе."""
+        bump_version(self.version_name)
+
+    def render(self, version):
+        """Рендерит справочник в JSON и сжимает его."""
+        data = self.serializer_class(self.queryset.all(), many=True).data
+        content = ORJSONRenderer().render(data)
+        encodings = {'identity': content}
+        if brotli is not None:
+            encodings['br'] = brotli.compress(content, quality=BROTLI_QUALITY)
+        encodings['gzip'] = gzip.compress(content, GZIP_LEVEL, mtime=0)
+        return {
+            'version': version,
+            'etag': hashlib.sha256(content).hexdigest()[:32],
+            'encodings': encodings,
+        }
+
+    def get_payload(self):
+        version = get_version(self.version_name)
+        payload = self._payload
+        if payload is not None and payload['version'] == version:
+            return payload
+        key = f'{self.version_name}:{version}'
+        payload = cache.get(key)
+        if payload is None:
+            payload = self.render(version)
+            cache.set(key, payload, CATALOG_CACHE_TIMEOUT)
+        self._payload = payload
+        return payload
+
+    def response(self, request):
+        """Возвращает ответ со справочником или 304."""
+        payload = self.get_payload()
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''),
+            payload['encodings'])
+        etag = payload['etag']
+        if encoding != 'identity':
+            etag = f'{etag}-{encoding}'
+        response = get_conditional_response(request, etag=f'"{etag}"')
+        if response is None:
+            response = HttpResponse(
+                payload['encodings'][encoding],
+                content_type='application/json')
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+        response['ETag'] = f'"{etag}"'
+        response['Cache-Control'] = f'public, max-age={CATALOG_MAX_AGE}'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+ingredient_catalog = Catalog(
+    'ingredients', Ingredient.objects.all(), IngredientSerializer)
+tag_catalog = Catalog('tags', Tag.objects.all(), TagSerializer)
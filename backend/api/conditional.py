@@ -0,0 +1,53 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .cache import get_versions
+from .catalog import ingredient_catalog, tag_catalog
+from .relations import RELATIONS_VERSION
+
+PROFILES_VERSION = 'profiles'
+RECIPES_VERSION = 'recipes'
+
+
+def get_recipe_validators(request, recipes, *extra):
+    """Вычисляет ETag и Last-Modified для набора рецептов.
+
+    Представление рецепта зависит не только от самого рецепта, но и от
+    справочников, профилей авторов и отношений текущего пользователя
+    (избранное, список покупок, подписки), поэтому в валидаторы входят
+    и версии этих данных.
+    """
+    names = [
+        PROFILES_VERSION, RECIPES_VERSION,
+        tag_catalog.version_name, ingredient_catalog.version_name]
+    user = request.user
+    if user.is_authenticated:
+        names.append(RELATIONS_VERSION.format(user.pk))
+    versions = get_versions(*names)
+    timestamps = [recipe.updated_at.timestamp() for recipe in recipes]
+    parts = [
+        request.accepted_media_type, request.get_full_path(), user.pk,
+        *extra, *versions,
+        *((recipe.pk, recipe.updated_at.timestamp()) for recipe in recipes)]
+    etag = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+    return f'"{etag}"', int(max(versions + timestamps))
+
+
+def conditional_response(request, recipes, get_response, *extra):
+    """Отвечает 304, если у клиента актуальная версия рецептов.
+
+    get_response вызывается только тогда, когда ответ нужно построить,
+    поэтому для неизменившихся данных сериализация не выполняется.
+    """
+    etag, last_modified = get_recipe_validators(request, recipes, *extra)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = get_response()
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Authorization',))
+    return response
@@ -1,4 +1,6 @@
 PAGE_SIZE = 6
+MAX_PAGE_SIZE = 100
+RECIPES_LIMIT_MAX = 100
 INVALID_USERNAME = 'me'
 USERNAME_MAX_LENGTH = 150
 EMAIL_MAX_LENGTH = 254
@@ -10,3 +12,31 @@ NAME_TAG_MAX_LENGTH = 32
 SLUG_MAX_LENGTH = 32
 NAME_RECIPE_MAX_LENGTH = 256
 SHORT_LINK_MAX_LENGTH = 5
+CATALOG_MAX_AGE = 60
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+RECOMMENDATIONS_TOP_K = 20
+RECOMMENDATIONS_SEEDS = 50
+RECOMMENDATIONS_POPULAR = 100
+RECOMMENDATIONS_CART_WEIGHT = 0.5
+RECIPE_TOTALS_CACHE_TIMEOUT = 60 * 60 * 24
+JOB_NAME_MAX_LENGTH = 128
+JOB_STATUS_MAX_LENGTH = 16
+JOB_FILENAME_MAX_LENGTH = 128
+JOB_CONTENT_TYPE_MAX_LENGTH = 128
+JOB_MAX_ATTEMPTS = 3
+SHOPPING_CART_FILE_CACHE_TIMEOUT = 60 * 60
+USERNAME_TAKEN = 'Имя пользователя уже занято!'
+EMAIL_TAKEN = 'Email уже используется!'
+RECIPE_IO_BATCH_SIZE = 500
+RECIPE_IMPORT_MAX_ERRORS = 100
+RECIPE_IMPORT_IMAGE_MAX_SIZE = 10 * 2 ** 20
+RECIPE_IMPORT_IMAGE_TIMEOUT = 10
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_MODEL_MAX_LENGTH = 100
+OUTBOX_ACTION_MAX_LENGTH = 16
+OUTBOX_CONSUMER_MAX_LENGTH = 200
+NOTIFICATIONS_BACKLOG_SIZE = 100
+NOTIFICATIONS_QUEUE_SIZE = 100
+NOTIFICATIONS_RETRY = 3000
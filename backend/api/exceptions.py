@@ -0,0 +1,12 @@
+from backend.postgresql_pool.base import PoolTimeout
+from rest_framework.views import exception_handler as drf_exception_handler
+
+from .throttling import ServiceUnavailable
+
+
+def exception_handler(exc, context):
+    """Обработчик ошибок DRF, который отвечает 503, если пул не выдал
+    соединение за DB_POOL_TIMEOUT."""
+    if isinstance(exc, PoolTimeout):
+        exc = ServiceUnavailable()
+    return drf_exception_handler(exc, context)
@@ -1,6 +1,8 @@
 import django_filters
 from recipes.models import Ingredient, Recipe, Tag
 
+from .relations import get_request_relations
+
 
 class RecipeFilter(django_filters.FilterSet):
     is_favorited = django_filters.NumberFilter(method='is_favorited_filter')
@@ -17,11 +19,17 @@ class RecipeFilter(django_filters.FilterSet):
 
     def is_favorited_filter(self, queryset, name, value):
         if value == 1 and self.request.user.is_authenticated:
+            relations = get_request_relations(self.request)
+            if relations is not None:
+                return queryset.filter(pk__in=relations.favorites)
             return queryset.filter(favorite__user=self.request.user)
         return queryset
 
     def is_in_shopping_cart_filter(self, queryset, name, value):
         if value == 1 and self.request.user.is_authenticated:
+            relations = get_request_relations(self.request)
+            if relations is not None:
+                return queryset.filter(pk__in=relations.shopping_cart)
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
 
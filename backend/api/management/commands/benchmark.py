@@ -0,0 +1,114 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from backend.postgresql_pool.base import get_pool_stats
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+
+def get_latency_stats(timings):
+    """Сводка по задержкам в миллисекундах."""
+    quantiles = statistics.quantiles(timings, n=100, method='inclusive')
+    return {
+        'mean': statistics.fmean(timings) * 1000,
+        'p50': quantiles[49] * 1000,
+        'p95': quantiles[94] * 1000,
+        'p99': quantiles[98] * 1000,
+        'max': max(timings) * 1000,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure API endpoint latency with the Django test client "
+        "or, with --url, against a running server. Run it with DB_POOL "
+        "on and off to compare connection handling, or against WSGI and "
+        "ASGI deployments with equal worker counts.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/recipes/')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--user', help='Email of the user to authenticate as')
+        parser.add_argument(
+            '--url', help='Base URL of a running server, e.g. '
+                          'http://127.0.0.1:9100')
+
+    def get_headers(self, email):
+        if not email:
+            return {}
+        token, _ = Token.objects.get_or_create(
+            user=User.objects.get(email=email))
+        return {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+
+    def run_requests(self, path, count, headers):
+        """Выполняет запросы как WSGI-сервер: с закрытием соединений."""
+        client = Client()
+        timings, errors = [], 0
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                response = client.get(path, **headers)
+                close_old_connections()
+                timings.append(time.perf_counter() - started)
+                errors += response.status_code >= 400
+        finally:
+            connections.close_all()
+        return timings, errors
+
+    def run_http_requests(self, url, count, headers):
+        """Выполняет запросы к запущенному серверу."""
+        headers = {
+            'Authorization': headers['HTTP_AUTHORIZATION']
+        } if headers else {}
+        timings, errors = [], 0
+        with requests.Session() as session:
+            for _ in range(count):
+                started = time.perf_counter()
+                try:
+                    response = session.get(
+                        url, headers=headers, allow_redirects=False)
+                    errors += response.status_code >= 400
+                except requests.RequestException:
+                    errors += 1
+                timings.append(time.perf_counter() - started)
+        return timings, errors
+
+    def handle(self, *args, **options):
+        path = options['path']
+        concurrency = options['concurrency']
+        headers = self.get_headers(options['user'])
+        if options['url']:
+            target = options['url'].rstrip('/') + path
+            run = self.run_http_requests
+        else:
+            target = path
+            run = self.run_requests
+        run(target, options['warmup'], headers)
+
+        counts = [options['requests'] // concurrency] * concurrency
+        counts[0] += options['requests'] % concurrency
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(
+                lambda count: run(target, count, headers), counts))
+        elapsed = time.perf_counter() - started
+
+        timings = [timing for result in results for timing in result[0]]
+        errors = sum(result[1] for result in results)
+        self.stdout.write(
+            f'{target}: {len(timings)} requests, concurrency {concurrency}, '
+            f'{len(timings) / elapsed:.1f} req/s, {errors} errors')
+        for name, value in get_latency_stats(timings).items():
+            self.stdout.write(f'  {name:>4}: {value:8.2f} ms')
+        for alias, stats in get_pool_stats().items():
+            self.stdout.write(f'  pool {alias}: {stats}')
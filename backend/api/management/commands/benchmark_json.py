@@ -0,0 +1,90 @@
+import io
+import time
+
+from api.async_views import read_queryset
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer, orjson
+from api.serializers import RecipeReadSerializer
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+
+def measure(func, pages, iterations):
+    """Лучшее из iterations время обработки всех страниц."""
+    best = float('inf')
+    for _ in range(iterations):
+        started = time.perf_counter()
+        for page in pages:
+            func(page)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare JSON encoding and decoding of recipe list pages with "
+        "DRF's JSONRenderer/JSONParser and the orjson-based "
+        "ORJSONRenderer/ORJSONParser. Pages are built from recipes in "
+        "the database (see seed_data). Fails if the outputs differ.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--iterations', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write('orjson is not installed, the fallback '
+                              'renderer and parser are the DRF ones')
+        pages = self.build_pages(options['pages'], options['page_size'])
+        if not pages:
+            raise CommandError('No recipes, run seed_data first')
+
+        encoded = [JSONRenderer().render(page) for page in pages]
+        if [ORJSONRenderer().render(page) for page in pages] != encoded:
+            raise CommandError('ORJSONRenderer output differs')
+        parsed = [JSONParser().parse(io.BytesIO(page)) for page in encoded]
+        if [ORJSONParser().parse(io.BytesIO(page))
+                for page in encoded] != parsed:
+            raise CommandError('ORJSONParser output differs')
+
+        size = sum(map(len, encoded)) / 2 ** 20
+        self.stdout.write(
+            f'{len(pages)} pages of up to {options["page_size"]} recipes, '
+            f'{size:.2f} MiB of JSON, outputs identical')
+        cases = (
+            ('encode', JSONRenderer().render, ORJSONRenderer().render,
+             pages),
+            ('decode', lambda page: JSONParser().parse(io.BytesIO(page)),
+             lambda page: ORJSONParser().parse(io.BytesIO(page)), encoded),
+        )
+        for name, baseline, accelerated, inputs in cases:
+            before = measure(baseline, inputs, options['iterations'])
+            after = measure(accelerated, inputs, options['iterations'])
+            self.stdout.write(
+                f'{name}: json {size / before:.1f} MiB/s, '
+                f'orjson {size / after:.1f} MiB/s, '
+                f'x{before / after:.1f}')
+
+    def build_pages(self, count, page_size):
+        """Страницы списка рецептов в том виде, в каком их отдаёт API."""
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        pages = []
+        for number in range(count):
+            recipes = list(read_queryset()[
+                number * page_size:(number + 1) * page_size])
+            if not recipes:
+                break
+            pages.append({
+                'count': page_size * count,
+                'next': f'http://testserver/api/recipes/?page={number + 2}',
+                'previous': None,
+                'results': RecipeReadSerializer(
+                    recipes, many=True, context={'request': request}).data,
+            })
+        return pages
@@ -0,0 +1,378 @@
+import contextlib
+import json
+import platform
+import time
+from collections import defaultdict, namedtuple
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.urls import URLResolver, get_resolver, reverse
+from recipes.models import Recipe, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .benchmark import get_latency_stats
+from .seed_data import SEED_EMAIL_DOMAIN
+
+User = get_user_model()
+
+BENCHMARK_EMAIL_DOMAIN = 'benchmark.example.com'
+
+PASSWORD = 'Benchmark-password-1'
+
+NEW_PASSWORD = 'Benchmark-password-2'
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAA'
+    'DElEQVR4nGP4z8AAAAMBAQDJ/pLvAAAAAElFTkSuQmCC')
+
+# Маршруты djoser, завязанные на отправку писем, не проверяются.
+SKIPPED_ROUTES = {
+    'users-activation', 'users-resend-activation', 'users-reset-password',
+    'users-reset-password-confirm', 'users-reset-username',
+    'users-reset-username-confirm', 'users-set-username',
+}
+
+Case = namedtuple(
+    'Case', 'name method route path client data save',
+    defaults=(None, None))
+
+
+def api_path(route, query='', **kwargs):
+    return lambda ctx: reverse(
+        f'api:{route}', kwargs={
+            key: ctx[value] for key, value in kwargs.items()}) + query
+
+
+def save_json(key, field):
+    def save(ctx, response):
+        ctx[key] = response.json()[field]
+    return save
+
+
+def get_cases():
+    """Сценарий одной итерации: чтения, затем изменения с откатом."""
+    recipe = api_path('recipes-detail', pk='recipe')
+    own_recipe = api_path('recipes-detail', pk='own_recipe')
+    return [
+        Case('api-root', 'get', 'api-root', api_path('api-root'), 'reader'),
+        Case('ingredients-list', 'get', 'ingredients-list',
+             api_path('ingredients-list'), 'anon'),
+        Case('ingredients-list?name', 'get', 'ingredients-list',
+             api_path('ingredients-list', '?name=мука'), 'anon'),
+        Case('ingredients-detail', 'get', 'ingredients-detail',
+             api_path('ingredients-detail', pk='ingredient'), 'anon'),
+        Case('tags-list', 'get', 'tags-list', api_path('tags-list'), 'anon'),
+        Case('tags-detail', 'get', 'tags-detail',
+             api_path('tags-detail', pk='tag'), 'anon'),
+        Case('recipes-list anon', 'get', 'recipes-list',
+             api_path('recipes-list'), 'anon'),
+        Case('recipes-list', 'get', 'recipes-list',
+             api_path('recipes-list'), 'reader'),
+        Case('recipes-list?page', 'get', 'recipes-list',
+             api_path('recipes-list', '?page=100&limit=10'), 'reader'),
+        Case('recipes-list?tags', 'get', 'recipes-list',
+             lambda ctx: api_path('recipes-list')(ctx)
+             + f'?tags={ctx["tag_slug"]}', 'reader'),
+        Case('recipes-list?author', 'get', 'recipes-list',
+             lambda ctx: api_path('recipes-list')(ctx)
+             + f'?author={ctx["author"]}', 'reader'),
+        Case('recipes-list?is_favorited', 'get', 'recipes-list',
+             api_path('recipes-list', '?is_favorited=1'), 'reader'),
+        Case('recipes-list?is_in_shopping_cart', 'get', 'recipes-list',
+             api_path('recipes-list', '?is_in_shopping_cart=1'), 'reader'),
+        Case('recipes-detail', 'get', 'recipes-detail', recipe, 'reader'),
+        Case('recipes-nutrition', 'get', 'recipes-nutrition',
+             api_path('recipes-nutrition', pk='recipe'), 'reader'),
+        Case('recipes-recommendations', 'get', 'recipes-recommendations',
+             api_path('recipes-recommendations', pk='recipe'), 'reader'),
+        Case('recipes-recommended', 'get', 'recipes-recommended',
+             api_path('recipes-recommended'), 'reader'),
+        Case('recipes-get-link', 'get', 'recipes-get-link',
+             api_path('recipes-get-link', pk='recipe'), 'reader'),
+        Case('short-link', 'get', None,
+             lambda ctx: f'/s/{ctx["short_link"]}', 'anon'),
+        Case('recipes-download-shopping-cart', 'get',
+             'recipes-download-shopping-cart',
+             api_path('recipes-download-shopping-cart'), 'reader'),
+        Case('users-list', 'get', 'users-list',
+             api_path('users-list'), 'anon'),
+        Case('users-detail', 'get', 'users-detail',
+             api_path('users-detail', id='author'), 'reader'),
+        Case('users-me', 'get', 'users-me', api_path('users-me'), 'reader'),
+        Case('users-subscriptions', 'get', 'users-subscriptions',
+             api_path('users-subscriptions', '?recipes_limit=3'), 'reader'),
+
+        Case('recipes-create', 'post', 'recipes-list',
+             api_path('recipes-list'), 'writer',
+             lambda ctx: {
+                 'name': 'Benchmark', 'text': 'Benchmark', 'image': IMAGE,
+                 'cooking_time': 10, 'tags': [ctx['tag']],
+                 'ingredients': [{'id': ctx['ingredient'], 'amount': 10}]},
+             save_json('own_recipe', 'id')),
+        Case('recipes-update', 'patch', 'recipes-detail', own_recipe,
+             'writer',
+             lambda ctx: {
+                 'name': 'Benchmark 2', 'text': 'Benchmark',
+                 'cooking_time': 20, 'tags': [ctx['tag']],
+                 'ingredients': [{'id': ctx['ingredient'], 'amount': 20}]}),
+        Case('recipes-favorite', 'post', 'recipes-favorite',
+             api_path('recipes-favorite', pk='own_recipe'), 'writer'),
+        Case('recipes-favorite delete', 'delete', 'recipes-favorite',
+             api_path('recipes-favorite', pk='own_recipe'), 'writer'),
+        Case('recipes-shopping-cart', 'post', 'recipes-shopping-cart',
+             api_path('recipes-shopping-cart', pk='own_recipe'), 'writer'),
+        Case('recipes-shopping-cart delete', 'delete',
+             'recipes-shopping-cart',
+             api_path('recipes-shopping-cart', pk='own_recipe'), 'writer'),
+        Case('recipes-delete', 'delete', 'recipes-detail', own_recipe,
+             'writer'),
+        Case('users-subscribe', 'post', 'users-subscribe',
+             api_path('users-subscribe', id='author'), 'writer'),
+        Case('users-subscribe delete', 'delete', 'users-subscribe',
+             api_path('users-subscribe', id='author'), 'writer'),
+        Case('users-avatar', 'put', 'users-avatar',
+             api_path('users-avatar', id='writer'), 'writer',
+             lambda ctx: {'avatar': IMAGE}),
+        Case('users-avatar delete', 'delete', 'users-avatar',
+             api_path('users-avatar', id='writer'), 'writer'),
+        Case('users-set-password', 'post', 'users-set-password',
+             api_path('users-set-password'), 'writer',
+             lambda ctx: {
+                 'current_password': PASSWORD,
+                 'new_password': NEW_PASSWORD}),
+        Case('users-set-password back', 'post', 'users-set-password',
+             api_path('users-set-password'), 'writer',
+             lambda ctx: {
+                 'current_password': NEW_PASSWORD,
+                 'new_password': PASSWORD}),
+
+        Case('users-create', 'post', 'users-list',
+             api_path('users-list'), 'anon',
+             lambda ctx: {
+                 'email': f'new{ctx["iteration"]}@{BENCHMARK_EMAIL_DOMAIN}',
+                 'username': f'benchmark_new{ctx["iteration"]}',
+                 'first_name': 'Benchmark', 'last_name': 'Benchmark',
+                 'password': PASSWORD}),
+        Case('login', 'post', 'login', api_path('login'), 'anon',
+             lambda ctx: {
+                 'email': f'new{ctx["iteration"]}@{BENCHMARK_EMAIL_DOMAIN}',
+                 'password': PASSWORD},
+             save_json('new_token', 'auth_token')),
+        Case('logout', 'post', 'logout', api_path('logout'), 'new_user'),
+        Case('token_obtain_pair', 'post', 'token_obtain_pair',
+             api_path('token_obtain_pair'), 'anon',
+             lambda ctx: {
+                 'email': f'new{ctx["iteration"]}@{BENCHMARK_EMAIL_DOMAIN}',
+                 'password': PASSWORD},
+             save_json('refresh', 'refresh')),
+        Case('token_refresh', 'post', 'token_refresh',
+             api_path('token_refresh'), 'anon',
+             lambda ctx: {'refresh': ctx['refresh']}),
+    ]
+
+
+def get_api_routes():
+    """Имена всех маршрутов из api/urls.py."""
+    resolver = get_resolver()
+    api = next(
+        pattern for pattern in resolver.url_patterns
+        if isinstance(pattern, URLResolver) and pattern.namespace == 'api')
+    names = set()
+    stack = list(api.url_patterns)
+    while stack:
+        pattern = stack.pop()
+        if isinstance(pattern, URLResolver):
+            stack += pattern.url_patterns
+        elif pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run every API route with the DRF test client against seeded data "
+        "(see seed_data), save latency and query counts as JSON and "
+        "compare them with a previous run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--output', help='Write results to this JSON file')
+        parser.add_argument(
+            '--baseline', help='Compare with results from this JSON file')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed relative latency growth against the baseline')
+        parser.add_argument(
+            '--min-difference', type=float, default=1,
+            help='Latency growth in ms ignored as noise')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError('--iterations must be at least 2.')
+        cases = get_cases()
+        uncovered = get_api_routes() - SKIPPED_ROUTES - {
+            case.route for case in cases}
+        if uncovered:
+            self.stderr.write(f'Not covered: {", ".join(sorted(uncovered))}')
+
+        ctx = self.setup()
+        try:
+            for iteration in range(options['warmup']):
+                self.run_iteration(cases, ctx, f'warmup{iteration}')
+            timings, queries, statuses = (
+                defaultdict(list), defaultdict(int), {})
+            for iteration in range(options['iterations']):
+                for name, elapsed, count, status in self.run_iteration(
+                        cases, ctx, iteration):
+                    timings[name].append(elapsed)
+                    queries[name] = max(queries[name], count)
+                    statuses[name] = status
+        finally:
+            self.teardown()
+
+        results = {
+            'meta': {
+                'created': datetime.now(timezone.utc).isoformat(),
+                'iterations': options['iterations'],
+                'database': connection.vendor,
+                'async_views': settings.ASYNC_VIEWS,
+                'python': platform.python_version(),
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+            },
+            'results': {
+                case.name: {
+                    'status': statuses[case.name],
+                    'queries': queries[case.name],
+                    **get_latency_stats(timings[case.name]),
+                } for case in cases},
+        }
+        self.print_results(results['results'])
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)['results']
+            regressions = self.compare(
+                baseline, results['results'], options['tolerance'],
+                options['min_difference'])
+            if regressions:
+                raise CommandError(
+                    f'{len(regressions)} regressions:\n'
+                    + '\n'.join(regressions))
+            self.stdout.write('No regressions against the baseline.')
+
+    def setup(self):
+        reader = User.objects.filter(
+            email__endswith='@' + SEED_EMAIL_DOMAIN,
+            shopping_cart__isnull=False).order_by('pk').first()
+        recipe = Recipe.objects.order_by('-pub_date').first()
+        tag = Tag.objects.order_by('pk').first()
+        if reader is None or recipe is None or tag is None:
+            raise CommandError('Run "manage.py seed_data" first.')
+        self.teardown()
+        writer = User.objects.create_user(
+            email=f'writer@{BENCHMARK_EMAIL_DOMAIN}',
+            username='benchmark_writer', first_name='Benchmark',
+            last_name='Benchmark', password=PASSWORD)
+        self.clients = {'anon': APIClient()}
+        for name, user in (('reader', reader), ('writer', writer)):
+            token, _ = Token.objects.get_or_create(user=user)
+            self.clients[name] = APIClient()
+            self.clients[name].credentials(
+                HTTP_AUTHORIZATION=f'Token {token.key}')
+        return {
+            'reader': reader.pk,
+            'writer': writer.pk,
+            'author': recipe.author_id,
+            'recipe': recipe.pk,
+            'short_link': recipe.short_link,
+            'ingredient': recipe.ingredients.values_list(
+                'pk', flat=True).first(),
+            'tag': tag.pk,
+            'tag_slug': tag.slug,
+        }
+
+    def teardown(self):
+        User.objects.filter(
+            email__endswith='@' + BENCHMARK_EMAIL_DOMAIN).delete()
+
+    def run_iteration(self, cases, ctx, iteration):
+        ctx['iteration'] = iteration
+        results = []
+        for case in cases:
+            counter = QueryCounter()
+            response, elapsed = self.run_case(case, ctx, counter)
+            results.append(
+                (case.name, elapsed, counter.count, response.status_code))
+        return results
+
+    def run_case(self, case, ctx, wrapper):
+        """Выполняет запрос сценария, передавая запросы к БД в wrapper
+        (execute_wrapper всех соединений)."""
+        if case.client == 'new_user':
+            client = APIClient()
+            client.credentials(
+                HTTP_AUTHORIZATION=f'Token {ctx["new_token"]}')
+        else:
+            client = self.clients[case.client]
+        data = case.data(ctx) if case.data else None
+        with contextlib.ExitStack() as stack:
+            for db in connections.all():
+                stack.enter_context(db.execute_wrapper(wrapper))
+            started = time.perf_counter()
+            response = getattr(client, case.method)(
+                case.path(ctx), data, format='json')
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{case.name}: {response.status_code} '
+                f'{response.content[:200]!r}')
+        if case.save:
+            case.save(ctx, response)
+        return response, elapsed
+
+    def print_results(self, results):
+        self.stdout.write(
+            f'{"route":<36}{"status":>7}{"queries":>8}'
+            f'{"p50 ms":>9}{"p95 ms":>9}{"max ms":>9}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<36}{result["status"]:>7}{result["queries"]:>8}'
+                f'{result["p50"]:>9.2f}{result["p95"]:>9.2f}'
+                f'{result["max"]:>9.2f}')
+
+    def compare(self, baseline, results, tolerance, min_difference):
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if result['queries'] > before['queries']:
+                regressions.append(
+                    f'{name}: queries {before["queries"]} -> '
+                    f'{result["queries"]}')
+            for stat in ('p50', 'p95'):
+                if (result[stat] > before[stat] * (1 + tolerance)
+                        and result[stat] - before[stat] > min_difference):
+                    regressions.append(
+                        f'{name}: {stat} {before[stat]:.2f} -> '
+                        f'{result[stat]:.2f} ms')
+        return regressions
@@ -0,0 +1,202 @@
+import time
+
+import numpy as np
+from api.constants import (RECOMMENDATIONS_CART_WEIGHT,
+                           RECOMMENDATIONS_POPULAR, RECOMMENDATIONS_TOP_K)
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from recipes.models import (Favorite, RecommendationsBuild, ShoppingCart,
+                            SimilarRecipes)
+from scipy import sparse
+
+# Доля изменившихся рецептов, после которой выгоднее полный пересчёт.
+FULL_REBUILD_SHARE = 0.5
+
+SOURCES = ((Favorite, 1.0), (ShoppingCart, RECOMMENDATIONS_CART_WEIGHT))
+
+
+def mix(values):
+    """Хеш splitmix64 для массива uint64."""
+    z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def set_hashes(owners, members, sources, size):
+    """Хеш набора (member, source) для каждого owner, не зависит от порядка.
+
+    Сложение по модулю 2**64 - переполнение uint64 здесь намеренное.
+    """
+    hashes = np.zeros(size, dtype=np.uint64)
+    np.add.at(hashes, owners, mix(members * 2 + sources))
+    return hashes
+
+
+def changed_ids(ids, hashes, old_ids, old_hashes):
+    """id, у которых хеш изменился или которых раньше не было."""
+    if not len(old_ids):
+        return ids
+    positions = np.minimum(np.searchsorted(old_ids, ids), len(old_ids) - 1)
+    same = (old_ids[positions] == ids) & (old_hashes[positions] == hashes)
+    return ids[~same]
+
+
+def from_bytes(data, dtype):
+    return np.frombuffer(bytes(data), dtype=dtype)
+
+
+class Command(BaseCommand):
+    help = (
+        "Build 'favorited together' recommendations: a sparse "
+        "recipe co-occurrence matrix over favorites and shopping carts, "
+        "cosine-normalised, with the top-K neighbours of every recipe "
+        "stored in SimilarRecipes. By default only rows affected by "
+        "changes since the previous run are recomputed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Recompute every recipe instead of changed ones only')
+        parser.add_argument(
+            '--top-k', type=int, default=RECOMMENDATIONS_TOP_K)
+        parser.add_argument(
+            '--block-size', type=int, default=2000,
+            help='Recipes per block of the co-occurrence product')
+
+    def handle(self, *args, **options):
+        started_at = timezone.now()
+        started = time.perf_counter()
+        users, recipes, weights, sources = self.load_interactions()
+        user_ids, user_index = np.unique(users, return_inverse=True)
+        recipe_ids, recipe_index = np.unique(recipes, return_inverse=True)
+        self.stdout.write(
+            f'{len(users)} interactions, {len(user_ids)} users, '
+            f'{len(recipe_ids)} recipes')
+
+        matrix = sparse.csr_matrix(
+            (weights, (user_index, recipe_index)),
+            shape=(len(user_ids), len(recipe_ids)), dtype=np.float32)
+        norms = np.sqrt(np.asarray(
+            matrix.multiply(matrix).sum(axis=0)).ravel())
+        user_hashes = set_hashes(
+            user_index, recipes, sources, len(user_ids))
+        recipe_hashes = set_hashes(
+            recipe_index, users, sources, len(recipe_ids))
+
+        transposed = matrix.T.tocsr()
+        previous = None if options['full'] else (
+            RecommendationsBuild.objects.first())
+        affected, removed = self.get_affected(
+            previous, matrix, transposed, user_ids, user_hashes, recipe_ids,
+            recipe_hashes)
+        full = affected is None
+        if full:
+            affected = np.arange(len(recipe_ids))
+        self.stdout.write(
+            f'{"full" if full else "incremental"} build: '
+            f'{len(affected)} recipes to recompute')
+
+        for start in range(0, len(affected), options['block_size']):
+            block = affected[start:start + options['block_size']]
+            removed += self.save_block(
+                block, transposed, matrix, norms, recipe_ids,
+                options['top_k'])
+
+        with transaction.atomic():
+            if full:
+                SimilarRecipes.objects.filter(
+                    updated_at__lt=started_at).delete()
+            else:
+                SimilarRecipes.objects.filter(recipe_id__in=removed).delete()
+            popular = recipe_ids[np.argsort(
+                -np.asarray(matrix.sum(axis=0)).ravel(),
+                kind='stable')[:RECOMMENDATIONS_POPULAR]]
+            RecommendationsBuild.objects.all().delete()
+            RecommendationsBuild.objects.create(
+                user_ids=user_ids.astype('<i8').tobytes(),
+                user_hashes=user_hashes.astype('<u8').tobytes(),
+                recipe_ids=recipe_ids.astype('<i8').tobytes(),
+                recipe_hashes=recipe_hashes.astype('<u8').tobytes(),
+                popular_recipe_ids=popular.astype('<i8').tobytes())
+        self.stdout.write(f'Done in {time.perf_counter() - started:.1f} s')
+
+    def load_interactions(self):
+        users, recipes, weights, sources = [], [], [], []
+        for source, (model, weight) in enumerate(SOURCES):
+            pairs = np.fromiter(
+                model.objects.values_list('user_id', 'recipe_id').iterator(
+                    chunk_size=10000),
+                dtype=np.dtype((np.int64, 2)))
+            pairs = pairs.reshape(-1, 2)
+            users.append(pairs[:, 0])
+            recipes.append(pairs[:, 1])
+            weights.append(np.full(len(pairs), weight, dtype=np.float32))
+            sources.append(np.full(len(pairs), source, dtype=np.int64))
+        return tuple(map(np.concatenate, (users, recipes, weights, sources)))
+
+    def get_affected(self, previous, matrix, transposed, user_ids,
+                     user_hashes, recipe_ids, recipe_hashes):
+        """Индексы рецептов, чьи строки могли измениться.
+
+        Оценка пары зависит от общих пользователей и от норм обоих
+        рецептов. Поэтому пересчитываются рецепты с изменившимся набором
+        пользователей и все рецепты их пользователей, а также рецепты
+        пользователей с изменившимся набором рецептов (так учитываются
+        удалённые рецепты). Возвращает None, если выгоднее пересчитать
+        всё, и id рецептов, пропавших из данных.
+        """
+        if previous is None:
+            return None, []
+        old_recipe_ids = from_bytes(previous.recipe_ids, '<i8')
+        dirty_recipes = np.searchsorted(recipe_ids, changed_ids(
+            recipe_ids, recipe_hashes, old_recipe_ids,
+            from_bytes(previous.recipe_hashes, '<u8')))
+        dirty_users = np.union1d(
+            np.searchsorted(user_ids, changed_ids(
+                user_ids, user_hashes, from_bytes(previous.user_ids, '<i8'),
+                from_bytes(previous.user_hashes, '<u8'))),
+            transposed[dirty_recipes].indices)
+        affected = np.union1d(dirty_recipes, matrix[dirty_users].indices)
+        if len(affected) > FULL_REBUILD_SHARE * len(recipe_ids):
+            return None, []
+        removed = np.setdiff1d(old_recipe_ids, recipe_ids)
+        return affected, removed.tolist()
+
+    def save_block(self, block, transposed, matrix, norms, recipe_ids,
+                   top_k):
+        """Считает соседей для блока рецептов и возвращает рецепты без них.
+
+        Произведение блока строк на матрицу даёт число общих
+        пользователей, деление на нормы - косинусную близость. Лучшие
+        top_k в каждой строке выбираются одной сортировкой.
+        """
+        product = (transposed[block] @ matrix).tocoo()
+        rows, cols = product.row, product.col
+        keep = cols != block[rows]
+        rows, cols = rows[keep], cols[keep]
+        scores = product.data[keep] / (norms[block][rows] * norms[cols])
+
+        order = np.lexsort((cols, -scores, rows))
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        starts = np.searchsorted(rows, np.arange(len(block)))
+        keep = np.arange(len(rows)) - starts[rows] < top_k
+        rows, cols, scores = rows[keep], cols[keep], scores[keep]
+
+        bounds = np.searchsorted(rows, np.arange(len(block) + 1))
+        objects, empty = [], []
+        for position, recipe in enumerate(recipe_ids[block].tolist()):
+            start, stop = bounds[position], bounds[position + 1]
+            if start == stop:
+                empty.append(recipe)
+                continue
+            objects.append(SimilarRecipes(
+                recipe_id=recipe,
+                recipe_ids=recipe_ids[cols[start:stop]].astype(
+                    '<i8').tobytes(),
+                scores=scores[start:stop].astype('<f4').tobytes()))
+        SimilarRecipes.objects.bulk_create(
+            objects, update_conflicts=True, unique_fields=['recipe'],
+            update_fields=['recipe_ids', 'scores', 'updated_at'])
+        return empty
@@ -0,0 +1,64 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+
+from .benchmark_suite import QueryCounter
+
+User = get_user_model()
+
+ADMIN_EMAIL = 'admin-check@benchmark.example.com'
+
+# Запросов на список объектов: сессия, пользователь, подсчёт и выборка
+# строк, фильтры. От числа строк на странице не зависит.
+QUERY_BUDGET = 8
+
+
+class Command(BaseCommand):
+    help = (
+        "Open the changelist of every model in the admin as a superuser "
+        "and fail if a page takes more than a fixed number of queries, "
+        "i.e. if the number of queries grows with the number of rows on "
+        "the page. Run it on seeded data "
+        "(see seed_data); the superuser is created in a transaction that "
+        "is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget', type=int, default=QUERY_BUDGET,
+            help='Allowed queries per changelist')
+
+    def handle(self, *args, **options):
+        failed = []
+        with transaction.atomic():
+            client = Client()
+            client.force_login(User.objects.create_superuser(
+                email=ADMIN_EMAIL, username='admin_check',
+                first_name='Admin', last_name='Check',
+                password=None))
+            for name, url in self.get_pages():
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    status = client.get(url).status_code
+                problems = []
+                if status != 200:
+                    problems.append(f'status {status}')
+                if counter.count > options['budget']:
+                    problems.append('over budget')
+                self.stdout.write(
+                    f'{name}: {counter.count} queries'
+                    + (f' ({", ".join(problems)})' if problems else ''))
+                if problems:
+                    failed.append(name)
+            transaction.set_rollback(True)
+        if failed:
+            raise CommandError(
+                f'{len(failed)} admin pages failed: ' + ', '.join(failed))
+
+    def get_pages(self):
+        for model in admin.site._registry:
+            opts = model._meta
+            yield opts.label, reverse(
+                f'admin:{opts.app_label}_{opts.model_name}_changelist')
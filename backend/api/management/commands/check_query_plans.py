@@ -0,0 +1,156 @@
+import re
+from collections import namedtuple
+
+from api.filters import IngredientFilter, RecipeFilter
+from api.utils import get_shopping_cart_ingredients
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, Subscription, Tag)
+from rest_framework.test import APIRequestFactory
+
+User = get_user_model()
+
+PAGE_SIZE = 6
+
+# Таблицы, которые растут вместе с числом пользователей и рецептов.
+# Справочники тегов и ингредиентов малы, их полный просмотр допустим.
+LARGE_TABLES = (
+    'recipes_favorite',
+    'recipes_ingredientrecipe',
+    'recipes_recipe',
+    'recipes_recipe_tags',
+    'recipes_shoppingcart',
+    'recipes_subscription',
+    'users_user',
+)
+
+# Полный просмотр таблицы: PostgreSQL и SQLite.
+FULL_SCAN = re.compile(r'Seq Scan on (\w+)|\bSCAN (\w+)\b(?! USING)')
+# Сортировка вместо чтения по индексу в нужном порядке.
+SORT = re.compile(r'^\s*(->\s*)?Sort\b|USE TEMP B-TREE FOR ORDER BY', re.M)
+
+# ordered - строки должны идти из индекса в нужном порядке, без
+# сортировки; tables - таблицы, которые нельзя читать целиком.
+Pattern = namedtuple(
+    'Pattern', ('name', 'queryset', 'ordered', 'tables'),
+    defaults=(False, LARGE_TABLES))
+
+
+def filter_recipes(user, **params):
+    """Рецепты так, как их отбирает RecipeFilter в списке рецептов."""
+    request = APIRequestFactory().get('/api/recipes/', params)
+    request.user = user
+    return RecipeFilter(
+        params, queryset=Recipe.objects.all(), request=request).qs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN for every query pattern of the API views and filters "
+        "and fail if a pattern reads a whole table or sorts rows that "
+        "should come from an index in order. Run it on seeded data (see "
+        "seed_data). On PostgreSQL sequential scans are disabled for the "
+        "check, so the plans show whether a usable index exists at all; "
+        "--natural keeps the planner's own choice.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--natural', action='store_true',
+            help="Don't disable sequential scans on PostgreSQL")
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Print the plan of every pattern')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(
+            favorite__isnull=False, shopping_cart__isnull=False).first()
+        recipe = Recipe.objects.first()
+        if user is None or recipe is None:
+            raise CommandError(
+                'No recipes with favorites and shopping carts, run '
+                'seed_data first')
+        failed = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql' and not options['natural']:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for pattern in self.get_patterns(user, recipe):
+                plan = pattern.queryset.explain()
+                problems = self.check_plan(plan, pattern)
+                status = '; '.join(problems) if problems else 'ok'
+                self.stdout.write(f'{pattern.name}: {status}')
+                if options['verbose_plans'] or problems:
+                    self.stdout.write(plan)
+                if problems:
+                    failed.append(pattern.name)
+        if failed:
+            raise CommandError(
+                f'{len(failed)} query patterns without a suitable index: '
+                + ', '.join(failed))
+
+    def check_plan(self, plan, pattern):
+        scanned = {
+            table_a or table_b
+            for table_a, table_b in FULL_SCAN.findall(plan)}
+        problems = [
+            f'full scan of {table}' for table in sorted(scanned)
+            if table in pattern.tables]
+        if pattern.ordered and SORT.search(plan):
+            problems.append('sort')
+        return problems
+
+    def get_patterns(self, user, recipe):
+        """Запросы API, построенные тем же кодом, что во вьюсетах и
+        фильтрах.
+        """
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        recipe_ids = list(
+            Recipe.objects.values_list('pk', flat=True)[:PAGE_SIZE])
+        page = slice(0, PAGE_SIZE)
+        author = recipe.author_id
+        # Поиск по подстроке индексируется только триграммами PostgreSQL.
+        search_tables = LARGE_TABLES
+        if connection.vendor == 'postgresql':
+            search_tables += ('recipes_ingredient',)
+        return (
+            Pattern('recipe list', Recipe.objects.all()[page], ordered=True),
+            Pattern('recipe list by author',
+                    filter_recipes(user, author=author)[page], ordered=True),
+            Pattern('recipe list by tag',
+                    filter_recipes(user, tags=tag.slug)[page]),
+            Pattern('recipe list favorites',
+                    filter_recipes(user, is_favorited=1)[page]),
+            Pattern('recipe list shopping cart',
+                    filter_recipes(user, is_in_shopping_cart=1)[page]),
+            Pattern('recipe detail', Recipe.objects.filter(pk=recipe.pk)),
+            Pattern('recipe short link',
+                    Recipe.objects.filter(short_link=recipe.short_link)),
+            Pattern('recipe ingredients',
+                    IngredientRecipe.objects.filter(
+                        recipe__in=recipe_ids).select_related('ingredient')),
+            Pattern('recipe tags',
+                    Recipe.tags.through.objects.filter(
+                        recipe__in=recipe_ids).select_related('tag')),
+            Pattern('is favorited',
+                    Favorite.objects.filter(user=user, recipe=recipe)),
+            Pattern('is in shopping cart',
+                    ShoppingCart.objects.filter(user=user, recipe=recipe)),
+            Pattern('is subscribed',
+                    Subscription.objects.filter(
+                        user=user, subscribed_to=author)),
+            Pattern('subscribers',
+                    Subscription.objects.filter(subscribed_to=author)),
+            Pattern('subscriptions',
+                    User.objects.filter(subscription__user=user)[page]),
+            Pattern('author recipes',
+                    Recipe.objects.filter(author=author)[page], ordered=True),
+            Pattern('shopping cart', get_shopping_cart_ingredients(user)),
+            Pattern('ingredient search',
+                    IngredientFilter(
+                        {'name': ingredient.name[:3]},
+                        queryset=Ingredient.objects.all()).qs,
+                    tables=search_tables),
+        )
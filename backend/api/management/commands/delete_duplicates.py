@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+from recipes.models import Favorite, ShoppingCart
+
+MODELS = (Favorite, ShoppingCart)
+
+
+def find_duplicates(model):
+    """Пары (пользователь, рецепт), записанные больше одного раза, и
+    первая запись каждой пары, которая остаётся."""
+    return model.objects.values('user', 'recipe').annotate(
+        count=Count('pk'), first=Min('pk')).filter(count__gt=1).order_by(
+        'user', 'recipe')
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete repeated (user, recipe) rows from favorites and shopping "
+        "carts, keeping the oldest row of each pair, and list every "
+        "deleted row. Run it before the migration that adds the unique "
+        "constraints (recipes 0007) if that migration reports "
+        "duplicates.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only list the rows that would be deleted')
+
+    def handle(self, *args, **options):
+        total = 0
+        with transaction.atomic():
+            for model in MODELS:
+                for row in find_duplicates(model):
+                    extra = model.objects.filter(
+                        user=row['user'], recipe=row['recipe']).exclude(
+                        pk=row['first'])
+                    ids = sorted(extra.values_list('pk', flat=True))
+                    self.stdout.write(
+                        f'{model.__name__} user={row["user"]} '
+                        f'recipe={row["recipe"]}: keep {row["first"]}, '
+                        f'delete {", ".join(map(str, ids))}')
+                    if not options['dry_run']:
+                        extra.delete()
+                    total += len(ids)
+        self.stdout.write(
+            f'{"Would delete" if options["dry_run"] else "Deleted"} '
+            f'{total} duplicate rows.')
@@ -0,0 +1,54 @@
+from pathlib import Path
+
+from backend.profiling import SUFFIX, read_profiles, sign
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SIGNATURE_TTL = 5 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge the sampled stacks that every worker process has written "
+        "to PROFILE_DIR into one collapsed-stack file per endpoint "
+        "(input for flamegraph.pl or speedscope) and reset them. With "
+        "--sign print an X-Profile header value that makes the server "
+        "profile one path.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='.',
+            help='Directory for <endpoint>.collapsed files')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Do not reset the collected stacks')
+        parser.add_argument(
+            '--sign', metavar='PATH',
+            help='Print a signed X-Profile header value for PATH and exit')
+        parser.add_argument(
+            '--ttl', type=int, default=SIGNATURE_TTL,
+            help='Seconds the signed header stays valid')
+
+    def handle(self, *args, **options):
+        if options['sign']:
+            if not settings.PROFILE_SECRET:
+                raise CommandError('PROFILE_SECRET is not set.')
+            self.stdout.write(
+                f'X-Profile: {sign(options["sign"], options["ttl"])}')
+            return
+        profiles = read_profiles(reset=not options['keep'])
+        if not profiles:
+            self.stdout.write(f'No profiles in {settings.PROFILE_DIR}.')
+            return
+        output = Path(options['output'])
+        output.mkdir(parents=True, exist_ok=True)
+        for endpoint, stacks in sorted(profiles.items()):
+            path = output / (endpoint + SUFFIX)
+            with open(path, 'w') as file:
+                file.writelines(
+                    f'{stack} {count}\n'
+                    for stack, count in stacks.most_common())
+            samples = sum(stacks.values())
+            self.stdout.write(
+                f'{endpoint}: {samples} samples '
+                f'(~{samples * settings.PROFILE_INTERVAL:.2f} s) -> {path}')
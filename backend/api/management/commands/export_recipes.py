@@ -0,0 +1,34 @@
+import sys
+
+from api.constants import RECIPE_IO_BATCH_SIZE
+from api.recipe_io import export_recipes
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Export all recipes as JSON Lines in the format of import_recipes. "
+        "Recipes are read in batches, so memory use does not depend on "
+        "their number.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', help='Write to this file instead of stdout')
+        parser.add_argument(
+            '--image-base-url',
+            help='Export images as URLs with this prefix instead of paths')
+        parser.add_argument(
+            '--batch-size', type=int, default=RECIPE_IO_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        base_url = options['image_base_url']
+        image_url = None
+        if base_url:
+            image_url = (
+                lambda name: base_url.rstrip('/') + '/' + name.lstrip('/'))
+        lines = export_recipes(image_url, options['batch_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as file:
+                file.writelines(lines)
+        else:
+            sys.stdout.buffer.writelines(lines)
@@ -0,0 +1,52 @@
+import json
+import sys
+from pathlib import Path
+
+from api.constants import RECIPE_IO_BATCH_SIZE
+from api.recipe_io import RecipeImporter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Import recipes from a JSON Lines file (one recipe per line, see "
+        "api.recipe_io). Ingredients are matched by name and measurement "
+        "unit, tags by slug, authors by email. Valid lines are written in "
+        "batches, invalid ones are skipped and reported.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'jsonl_file', help="Path to the JSON Lines file, '-' for stdin")
+        parser.add_argument(
+            '--author', help='Email of the author of recipes without one')
+        parser.add_argument(
+            '--images-dir',
+            help='Directory with images referenced by relative paths')
+        parser.add_argument(
+            '--batch-size', type=int, default=RECIPE_IO_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        author = None
+        if options['author']:
+            author = User.objects.filter(email=options['author']).first()
+            if author is None:
+                raise CommandError(f'No user {options["author"]}')
+        images_dir = options['images_dir']
+        importer = RecipeImporter(
+            default_author=author,
+            images_dir=Path(images_dir) if images_dir else None,
+            batch_size=options['batch_size'])
+        if options['jsonl_file'] == '-':
+            report = importer.run(sys.stdin.buffer)
+        else:
+            with open(options['jsonl_file'], 'rb') as file:
+                report = importer.run(file)
+        for error in report['errors']:
+            self.stderr.write(f'line {error["line"]}: {error["error"]}')
+        self.stdout.write(json.dumps(
+            {'created': report['created'], 'failed': report['failed']}))
+        if report['failed']:
+            raise CommandError(f'{report["failed"]} lines were not imported')
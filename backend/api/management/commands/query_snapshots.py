@@ -0,0 +1,257 @@
+import difflib
+import hashlib
+import json
+import re
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import connection
+from recipes.models import Recipe
+
+from api.mixins import get_match_endpoint
+
+from .benchmark_suite import Command as BenchmarkCommand
+from .benchmark_suite import SKIPPED_ROUTES, get_api_routes, get_cases
+
+User = get_user_model()
+
+SNAPSHOT_DIR = Path(__file__).resolve().parents[2] / 'query_snapshots'
+
+# Списки с пагинацией: число запросов не должно зависеть от limit.
+PAGINATED_ROUTES = {'recipes-list', 'users-list', 'users-subscriptions'}
+PAGE_SIZES = (1, 5)
+# Эндпоинты, которым разрешён рост числа запросов со страницей, и
+# причина. Пополнять только вместе с задачей на исправление.
+PAGE_GROWTH_ALLOWED = {}
+# Запас бюджета QUERY_BUDGETS сверх запросов при прогретых кешах: промах
+# кеша токена и отношений пользователя.
+BUDGET_MARGIN = 4
+PAGE_PARAMS = re.compile(r'[?&](limit|page)=')
+
+WHITESPACE = re.compile(r'\s+')
+SAVEPOINT = re.compile(r'"?s\d+_x\d+"?')
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+VALUES_LIST = re.compile(r'VALUES (\([^()]*\))(?:, \1)+')
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+\b')
+
+
+def normalize(sql):
+    """Отпечаток запроса: SQL без значений, длины списков IN и числа
+    строк в INSERT."""
+    sql = WHITESPACE.sub(' ', sql).strip()
+    sql = SAVEPOINT.sub('?', sql)
+    sql = IN_LIST.sub('IN (...)', sql)
+    sql = VALUES_LIST.sub(r'VALUES \1', sql)
+    sql = STRING.sub('?', sql)
+    return NUMBER.sub('?', sql)
+
+
+def get_fingerprint(query):
+    return hashlib.sha1(query.encode()).hexdigest()[:12]
+
+
+def with_limit(path, limit):
+    return lambda ctx: (
+        path(ctx) + ('&' if '?' in path(ctx) else '?') + f'limit={limit}')
+
+
+class QueryRecorder:
+    """Нормализованный SQL запросов к БД по порядку выполнения."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(normalize(sql))
+        return execute(sql, params, many, context)
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Run every API route with the DRF test client against seeded data "
+        "(see seed_data) and compare the SQL of each request, normalized "
+        "to query fingerprints, with the committed snapshot. Fail on new "
+        "queries, on query counts that grow with the page size and on "
+        "QUERY_BUDGETS that do not match the measured counts, and report "
+        "duplicate queries within a request. --update rewrites the "
+        "snapshot after an intentional change.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--update', action='store_true',
+            help='Record the current queries as the new snapshot')
+        parser.add_argument(
+            '--snapshot',
+            help='Snapshot file (default: api/query_snapshots/<vendor>.json)')
+        parser.add_argument(
+            '--report', help='Also write the diff report to this file')
+
+    def handle(self, *args, **options):
+        path = Path(options['snapshot'] or SNAPSHOT_DIR / (
+            connection.vendor + '.json'))
+        cases = get_cases()
+        uncovered = get_api_routes() - SKIPPED_ROUTES - {
+            case.route for case in cases}
+        ctx = self.setup()
+        try:
+            # Первый проход прогревает кеши, записывается второй.
+            self.record(cases, ctx, 'warmup')
+            current = self.record(cases, ctx, 'snapshot')
+        finally:
+            self.teardown()
+        meta = {
+            'database': connection.vendor,
+            'async_views': settings.ASYNC_VIEWS,
+            'users': User.objects.count(),
+            'recipes': Recipe.objects.count(),
+        }
+        if options['update']:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w') as file:
+                json.dump(
+                    {'meta': meta, 'cases': current}, file,
+                    ensure_ascii=False, indent=2)
+                file.write('\n')
+            for line in self.check_page_growth(current)[0]:
+                self.stderr.write(line)
+            for line in self.check_budgets(current)[0]:
+                self.stderr.write(line)
+            self.stdout.write(
+                f'Recorded {len(current)} cases to {path}.')
+            return
+        if not path.exists():
+            raise CommandError(
+                f'No snapshot {path}, record one with --update.')
+        with open(path) as file:
+            snapshot = json.load(file)
+        if snapshot['meta'] != meta:
+            self.stderr.write(
+                f'Snapshot was recorded with {snapshot["meta"]}, '
+                f'current run: {meta}. Query counts of pages may differ.')
+        lines, failed = self.compare(snapshot['cases'], current)
+        for check in (self.check_page_growth, self.check_budgets):
+            check_lines, check_failed = check(current)
+            lines += check_lines
+            failed += [name for name in check_failed if name not in failed]
+        if uncovered:
+            lines.append(f'Not covered: {", ".join(sorted(uncovered))}')
+        report = '\n'.join(lines)
+        self.stdout.write(report)
+        if options['report']:
+            with open(options['report'], 'w') as file:
+                file.write(report + '\n')
+        if failed:
+            raise CommandError(
+                f'{len(failed)} cases failed against {path}: '
+                + ', '.join(failed)
+                + '. Record intended new queries with --update.')
+        self.stdout.write('Queries match the snapshot.')
+
+    def record(self, cases, ctx, iteration):
+        ctx['iteration'] = iteration
+        results = {}
+        for case in cases:
+            recorder = QueryRecorder()
+            response, _ = self.run_case(case, ctx, recorder)
+            match = response.resolver_match
+            results[case.name] = {
+                'status': response.status_code,
+                'endpoint': match and get_match_endpoint(match, case.method),
+                'queries': recorder.queries,
+            }
+            if (case.method == 'get' and case.route in PAGINATED_ROUTES
+                    and not PAGE_PARAMS.search(case.path(ctx))):
+                counts = []
+                for limit in PAGE_SIZES:
+                    recorder = QueryRecorder()
+                    self.run_case(
+                        case._replace(path=with_limit(case.path, limit)),
+                        ctx, recorder)
+                    counts.append(len(recorder.queries))
+                results[case.name]['page_growth'] = counts[-1] - counts[0]
+        return results
+
+    def compare(self, snapshot, current):
+        """Отчёт о расхождениях и список случаев с регрессиями."""
+        lines = []
+        failed = []
+        for name, result in current.items():
+            before = snapshot.get(name)
+            if before is None:
+                lines.append(f'{name}: not in the snapshot')
+                failed.append(name)
+                continue
+            added = Counter(result['queries']) - Counter(before['queries'])
+            removed = Counter(before['queries']) - Counter(result['queries'])
+            problems = []
+            if added:
+                problems.append(f'{sum(added.values())} new queries')
+            if removed:
+                problems.append(f'{sum(removed.values())} queries fewer')
+            duplicates = {
+                query: count
+                for query, count in Counter(result['queries']).items()
+                if count > 1}
+            if not problems and not duplicates:
+                continue
+            lines.append(f'{name}: ' + (', '.join(problems) or 'ok'))
+            for query, count in duplicates.items():
+                lines.append(
+                    f'  duplicate x{count} [{get_fingerprint(query)}] '
+                    f'{query[:120]}')
+            if added or removed:
+                lines += [
+                    '  ' + line.rstrip('\n') for line in difflib.unified_diff(
+                        before['queries'], result['queries'],
+                        f'snapshot/{name}', f'current/{name}', lineterm='')]
+            if added:
+                failed.append(name)
+        return lines, failed
+
+    def check_page_growth(self, current):
+        """Списки, где число запросов растёт с размером страницы."""
+        lines = []
+        failed = []
+        for name, result in current.items():
+            growth = result.get('page_growth')
+            if not growth:
+                continue
+            reason = PAGE_GROWTH_ALLOWED.get(result['endpoint'])
+            lines.append(
+                f'{name}: queries grow with the page size: +{growth} for '
+                f'limit {PAGE_SIZES[0]} -> {PAGE_SIZES[-1]}'
+                + (f' (allowed: {reason})' if reason else ''))
+            if not reason:
+                failed.append(name)
+        return lines, failed
+
+    def check_budgets(self, current):
+        """Бюджеты QUERY_BUDGETS, которые не совпадают со снимком.
+
+        Бюджет не меньше запросов эндпоинта при прогретых кешах и не
+        больше их на BUDGET_MARGIN.
+        """
+        counts = {}
+        for name, result in current.items():
+            endpoint = result['endpoint']
+            if endpoint in settings.QUERY_BUDGETS:
+                counts.setdefault(endpoint, []).append(
+                    (len(result['queries']), name))
+        lines = []
+        failed = []
+        for endpoint, budget in sorted(settings.QUERY_BUDGETS.items()):
+            if endpoint not in counts:
+                lines.append(f'QUERY_BUDGETS[{endpoint!r}]: no case')
+                continue
+            count, name = max(counts[endpoint])
+            if not count <= budget <= count + BUDGET_MARGIN:
+                lines.append(
+                    f'QUERY_BUDGETS[{endpoint!r}] = {budget}, but {name} '
+                    f'runs {count} queries; set it to '
+                    f'{count + BUDGET_MARGIN}')
+                failed.append(name)
+        return lines, failed
@@ -0,0 +1,355 @@
+import csv
+import io
+import itertools
+import multiprocessing
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from string import ascii_letters, digits
+
+import django
+from api.cache import bump_version
+from api.catalog import ingredient_catalog, tag_catalog
+from api.conditional import PROFILES_VERSION, RECIPES_VERSION
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, Subscription, Tag)
+
+User = get_user_model()
+
+RecipeTag = Recipe.tags.through
+
+SEED_EMAIL_DOMAIN = 'seed.example.com'
+
+TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+    ('Десерт', 'dessert'),
+    ('Выпечка', 'baking'),
+    ('Суп', 'soup'),
+    ('Салат', 'salad'),
+    ('Напитки', 'drinks'),
+)
+
+FIRST_NAMES = (
+    'Анна', 'Иван', 'Мария', 'Пётр', 'Елена', 'Сергей', 'Ольга', 'Дмитрий',
+    'Наталья', 'Алексей', 'Татьяна', 'Михаил')
+
+LAST_NAMES = (
+    'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров',
+    'Соколов', 'Михайлов', 'Новиков', 'Фёдоров')
+
+DISHES = (
+    'Салат', 'Суп', 'Пирог', 'Запеканка', 'Рагу', 'Паста', 'Омлет',
+    'Каша', 'Соус', 'Смузи')
+
+IMAGE = 'images/recipes/seed.jpg'
+
+COLUMNS = {
+    User: (
+        'id', 'password', 'is_superuser', 'is_staff', 'is_active',
+        'date_joined', 'username', 'email', 'first_name', 'last_name',
+        'avatar'),
+    Recipe: (
+        'id', 'author_id', 'name', 'image', 'text', 'cooking_time',
+        'short_link', 'pub_date', 'updated_at'),
+    IngredientRecipe: ('recipe_id', 'ingredient_id', 'amount'),
+    RecipeTag: ('recipe_id', 'tag_id'),
+    Favorite: ('user_id', 'recipe_id'),
+    ShoppingCart: ('user_id', 'recipe_id'),
+    Subscription: ('user_id', 'subscribed_to_id'),
+}
+
+# Короткие ссылки: номер рецепта переставляется внутри всех 62**5
+# вариантов, поэтому ссылки уникальны без согласования между процессами.
+SHORT_LINK_ALPHABET = ascii_letters + digits
+SHORT_LINK_SPACE = len(SHORT_LINK_ALPHABET) ** 5
+SHORT_LINK_MULTIPLIER = 3 ** 18
+SHORT_LINK_OFFSET = 123_456_789
+
+# Размер задачи не зависит от числа процессов, поэтому данные
+# совпадают при любом --processes.
+CHUNK_SIZE = 10_000
+
+BATCH_SIZE = 5000
+
+context = {}
+
+
+def popular(rng, base, count):
+    """Случайный id, чаще из начала: популярные рецепты и авторы."""
+    return base + int(count * rng.random() ** 3)
+
+
+def sample_popular(rng, base, count, size, exclude=None):
+    chosen = set()
+    for _ in range(size * 2 if count else 0):
+        if len(chosen) >= size:
+            break
+        item = popular(rng, base, count)
+        if item != exclude:
+            chosen.add(item)
+    return sorted(chosen)
+
+
+def get_short_link(number, count, used):
+    while True:
+        code = (number * SHORT_LINK_MULTIPLIER
+                + SHORT_LINK_OFFSET) % SHORT_LINK_SPACE
+        short_link = ''
+        for _ in range(5):
+            code, index = divmod(code, len(SHORT_LINK_ALPHABET))
+            short_link += SHORT_LINK_ALPHABET[index]
+        if short_link not in used:
+            return short_link
+        number += count
+
+
+def generate_users(rng, start, stop):
+    for number in range(start, stop):
+        yield User, (
+            context['user_base'] + number, context['password'], False,
+            False, True, context['now'], f'user{number}',
+            f'user{number}@{SEED_EMAIL_DOMAIN}', rng.choice(FIRST_NAMES),
+            rng.choice(LAST_NAMES), '')
+
+
+def generate_recipes(rng, start, stop):
+    ingredients = context['ingredients']
+    count = context['recipes']
+    for number in range(start, stop):
+        recipe_id = context['recipe_base'] + number
+        chosen = rng.sample(ingredients, rng.randint(3, 10))
+        created = context['now'] - timedelta(minutes=count - number)
+        yield Recipe, (
+            recipe_id,
+            popular(rng, context['user_base'], context['users']),
+            f'{rng.choice(DISHES)} ({chosen[0][1]})', IMAGE,
+            ' '.join(f'Добавить: {name}.' for _, name in chosen),
+            rng.randint(5, 180),
+            get_short_link(number, count, context['used_links']),
+            created, created)
+        for ingredient_id, _ in chosen:
+            yield IngredientRecipe, (
+                recipe_id, ingredient_id, rng.randint(1, 500))
+        for tag_id in rng.sample(context['tags'], rng.randint(1, 3)):
+            yield RecipeTag, (recipe_id, tag_id)
+
+
+def generate_relations(rng, start, stop):
+    users, recipes = context['users'], context['recipes']
+    user_base, recipe_base = context['user_base'], context['recipe_base']
+    for number in range(start, stop):
+        user_id = user_base + number
+        for model, average in ((Favorite, context['favorites']),
+                               (ShoppingCart, context['carts'])):
+            for recipe_id in sample_popular(
+                    rng, recipe_base, recipes, rng.randint(0, average * 2)):
+                yield model, (user_id, recipe_id)
+        for author_id in sample_popular(
+                rng, user_base, users,
+                rng.randint(0, context['subscriptions'] * 2),
+                exclude=user_id):
+            yield Subscription, (user_id, author_id)
+
+
+# Этапы выполняются по очереди из-за внешних ключей, порции внутри
+# этапа - параллельно.
+PHASES = {
+    'users': (generate_users, 'users'),
+    'recipes': (generate_recipes, 'recipes'),
+    'relations': (generate_relations, 'users'),
+}
+
+
+def copy_value(value):
+    if type(value) is int:
+        return str(value)
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace(
+        '\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(model, rows):
+    """Загружает строки через COPY FROM STDIN (PostgreSQL)."""
+    data = io.StringIO()
+    for row in rows:
+        data.write('\t'.join(map(copy_value, row)))
+        data.write('\n')
+    data.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {model._meta.db_table} ({", ".join(COLUMNS[model])}) '
+            f'FROM STDIN', data)
+
+
+def insert_rows(model, rows):
+    """Загружает строки пачками INSERT (кроме PostgreSQL).
+
+    bulk_create не подходит: он перезаписывает pub_date и updated_at
+    текущим временем.
+    """
+    fields = [model._meta.get_field(name) for name in COLUMNS[model]]
+    sql = (
+        f'INSERT INTO {model._meta.db_table} '
+        f'({", ".join(field.column for field in fields)}) '
+        f'VALUES ({", ".join(["%s"] * len(fields))})')
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while batch := list(itertools.islice(rows, BATCH_SIZE)):
+            cursor.executemany(sql, [
+                [field.get_db_prep_save(value, connection)
+                 for field, value in zip(fields, row)]
+                for row in batch])
+
+
+def run_task(task):
+    """Генерирует и загружает одну порцию строк."""
+    phase, start, stop = task
+    generate, _ = PHASES[phase]
+    rng = random.Random(f'{context["seed"]}:{phase}:{start}')
+    tables = {}
+    for model, row in generate(rng, start, stop):
+        tables.setdefault(model, []).append(row)
+    load = copy_rows if connection.vendor == 'postgresql' else insert_rows
+    with transaction.atomic():
+        for model, rows in tables.items():
+            load(model, rows)
+    return Counter({
+        model._meta.db_table: len(rows) for model, rows in tables.items()})
+
+
+def init_worker(worker_context):
+    django.setup()
+    context.update(worker_context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill an empty database with reproducible synthetic data for "
+        "benchmarks: users, recipes with real ingredients, tags, "
+        "favorites, shopping carts and subscriptions. Rows are generated "
+        "in parallel processes and loaded with COPY on PostgreSQL or "
+        "batched INSERTs (cursor.executemany) elsewhere. The same --seed "
+        "always produces the same data, whatever the number of "
+        "processes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--recipes', type=int, default=1_000_000)
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Average number of favorites per user')
+        parser.add_argument(
+            '--carts', type=int, default=3,
+            help='Average number of shopping cart recipes per user')
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Average number of subscriptions per user')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--processes', type=int, default=multiprocessing.cpu_count(),
+            help='Worker processes, PostgreSQL only')
+        parser.add_argument(
+            '--ingredients',
+            default=str(settings.BASE_DIR / 'data' / 'ingredients.csv'))
+        parser.add_argument(
+            '--password', default='password',
+            help='Password of every generated user')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(
+                email__endswith='@' + SEED_EMAIL_DOMAIN).exists():
+            raise CommandError(
+                'The database already contains generated data, '
+                'run "manage.py flush" first.')
+        self.create_catalogs(options['ingredients'])
+        worker_context = {
+            'seed': options['seed'],
+            'users': options['users'],
+            'recipes': options['recipes'],
+            'favorites': options['favorites'],
+            'carts': options['carts'],
+            'subscriptions': options['subscriptions'],
+            'password': make_password(options['password']),
+            'now': datetime.now(timezone.utc),
+            'user_base': (User.objects.aggregate(
+                max_id=Max('id'))['max_id'] or 0) + 1,
+            'recipe_base': (Recipe.objects.aggregate(
+                max_id=Max('id'))['max_id'] or 0) + 1,
+            'ingredients': list(
+                Ingredient.objects.order_by('pk').values_list('pk', 'name')),
+            'tags': list(
+                Tag.objects.order_by('pk').values_list('pk', flat=True)),
+            'used_links': set(
+                Recipe.objects.values_list('short_link', flat=True)),
+        }
+        processes = (
+            options['processes'] if connection.vendor == 'postgresql'
+            else 1)
+        # Дочерние процессы не должны унаследовать открытые соединения.
+        connections.close_all()
+
+        if processes > 1:
+            with multiprocessing.Pool(
+                    processes, initializer=init_worker,
+                    initargs=(worker_context,)) as pool:
+                self.run_phases(worker_context, pool.imap_unordered)
+        else:
+            context.update(worker_context)
+            self.run_phases(worker_context, map)
+
+        self.reset_sequences()
+        ingredient_catalog.invalidate()
+        tag_catalog.invalidate()
+        bump_version(PROFILES_VERSION)
+        bump_version(RECIPES_VERSION)
+
+    def run_phases(self, worker_context, map_tasks):
+        for phase, (_, size) in PHASES.items():
+            started = time.perf_counter()
+            count = worker_context[size]
+            tasks = [
+                (phase, start, min(start + CHUNK_SIZE, count))
+                for start in range(0, count, CHUNK_SIZE)]
+            counts = sum(map_tasks(run_task, tasks), Counter())
+            elapsed = time.perf_counter() - started
+            total = sum(counts.values())
+            self.stdout.write(
+                f'{phase}: {total} rows in {elapsed:.1f} s, '
+                f'{total / elapsed:.0f} rows/s ('
+                + ', '.join(
+                    f'{table} {count}'
+                    for table, count in sorted(counts.items()))
+                + ')')
+
+    def create_catalogs(self, path):
+        with open(path, encoding='utf-8') as file:
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=measurement_unit)
+                 for name, measurement_unit in csv.reader(file)),
+                batch_size=BATCH_SIZE, ignore_conflicts=True)
+        Tag.objects.bulk_create(
+            (Tag(name=name, slug=slug) for name, slug in TAGS),
+            ignore_conflicts=True)
+
+    def reset_sequences(self):
+        """Сдвигает последовательности id после вставки явных id."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
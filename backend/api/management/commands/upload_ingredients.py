@@ -1,11 +1,17 @@
 import json
 
+from api.nutrition import NUTRITION_FIELDS
 from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
+from recipes.models import Ingredient, IngredientNutrition
+
+BATCH_SIZE = 1000
 
 
 class Command(BaseCommand):
-    help = "Upload ingredients to the database from a JSON file"
+    help = (
+        "Upload ingredients to the database from a JSON file. Optional "
+        "keys calories, proteins, fats, carbohydrates and price (per 100 g "
+        "or 100 ml, or per piece) are stored as nutrition data.")
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -16,7 +22,28 @@ class Command(BaseCommand):
         with open(json_file_path, 'r') as file:
             ingredients = json.load(file)
 
-        for ingredient in ingredients:
-            Ingredient.objects.create(
+        Ingredient.objects.bulk_create(
+            (Ingredient(
                 name=ingredient['name'],
                 measurement_unit=ingredient['measurement_unit'])
+             for ingredient in ingredients),
+            batch_size=BATCH_SIZE, ignore_conflicts=True)
+        self.upload_nutrition(ingredients)
+
+    def upload_nutrition(self, ingredients):
+        nutrition = {
+            (ingredient['name'], ingredient['measurement_unit']): {
+                field: ingredient.get(field) for field in NUTRITION_FIELDS}
+            for ingredient in ingredients
+            if any(field in ingredient for field in NUTRITION_FIELDS)}
+        if not nutrition:
+            return
+        ids = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit').iterator()}
+        IngredientNutrition.objects.bulk_create(
+            (IngredientNutrition(ingredient_id=ids[key], **values)
+             for key, values in nutrition.items()),
+            batch_size=BATCH_SIZE, update_conflicts=True,
+            unique_fields=['ingredient'], update_fields=NUTRITION_FIELDS)
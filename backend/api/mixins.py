@@ -0,0 +1,35 @@
+from backend.metrics import set_endpoint, timed_serializer_class
+
+
+class MetricsMixin:
+    """Подписывает метрики запроса действием вьюсета.
+
+    Эндпоинт называется как ИмяВьюсета.действие, например
+    RecipeViewSet.list; эти же имена используются в QUERY_BUDGETS.
+    Сериализаторы вьюсета замеряют время своей работы.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        set_endpoint(get_endpoint(type(self), getattr(self, 'action', None)))
+        super().initial(request, *args, **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = timed_serializer_class(
+            self.get_serializer_class())
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
+
+
+def get_endpoint(view_class, action=None):
+    if action is None:
+        return view_class.__name__
+    return f'{view_class.__name__}.{action}'
+
+
+def get_match_endpoint(match, method):
+    """Эндпоинт по результату resolve: действие вьюсета или имя маршрута."""
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.view_name
+    actions = getattr(match.func, 'actions', None) or {}
+    return get_endpoint(view_class, actions.get(method.lower()))
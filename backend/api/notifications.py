@@ -0,0 +1,218 @@
+"""
+Уведомления о новых рецептах авторов, на которых подписан пользователь.
+
+RecipeViewSet.perform_create после коммита публикует событие, брокер
+процесса раздаёт его подключениям SSE (api.async_views.recipe_events)
+тех пользователей, которые подписаны на автора. С NOTIFICATIONS_BACKEND
+= 'redis' событие сначала уходит в канал Redis, и каждый процесс
+раздаёт его своим подключениям, иначе события видят только
+подключения процесса, создавшего рецепт.
+
+Id события - id рецепта, поэтому клиент, переподключившийся с
+Last-Event-ID, получает пропущенные рецепты из БД независимо от того,
+какой процесс его обслуживает.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+import orjson
+from backend.metrics import PREFIX
+from django.conf import settings
+from django.db.models import Max
+from recipes.models import Recipe, Subscription
+
+from .cache import get_version
+from .conditional import RELATIONS_VERSION
+from .constants import NOTIFICATIONS_BACKLOG_SIZE, NOTIFICATIONS_QUEUE_SIZE
+from .serializers import RecipePreviewSerializer
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'notifications:recipes'
+RELAY_RETRY_DELAY = 1
+
+Event = namedtuple('Event', ('id', 'author_id', 'data'))
+
+
+def get_event(recipe, request):
+    return Event(recipe.pk, recipe.author_id, {
+        **RecipePreviewSerializer(recipe, context={'request': request}).data,
+        'author': {'id': recipe.author_id,
+                   'username': recipe.author.username},
+    })
+
+
+def get_following_version(user_id):
+    return get_version(RELATIONS_VERSION.format(user_id))
+
+
+def get_following(user_id):
+    """Версия подписок пользователя и авторы, на которых он подписан."""
+    return get_following_version(user_id), set(
+        Subscription.objects.filter(user_id=user_id).values_list(
+            'subscribed_to_id', flat=True))
+
+
+def get_last_id():
+    return Recipe.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+
+
+def get_backlog(request, authors, last_id):
+    """Рецепты авторов с id больше last_id, которые клиент пропустил.
+
+    Отдаются последние NOTIFICATIONS_BACKLOG_SIZE по возрастанию id.
+    """
+    recipes = list(Recipe.objects.filter(
+        author_id__in=authors, pk__gt=last_id).select_related(
+        'author').order_by('-pk')[:NOTIFICATIONS_BACKLOG_SIZE])
+    return [get_event(recipe, request) for recipe in reversed(recipes)]
+
+
+def format_event(event):
+    return b'id: %d\nevent: recipe\ndata: %s\n\n' % (
+        event.id, orjson.dumps(event.data))
+
+
+class Listener:
+    """Подключение SSE: очередь событий в цикле событий подключения.
+
+    Если клиент не успевает читать и очередь переполнилась, подключение
+    закрывается: клиент переподключится с Last-Event-ID и получит
+    пропущенное из БД.
+    """
+
+    def __init__(self, loop, user_id, authors):
+        self.loop = loop
+        self.user_id = user_id
+        self.authors = frozenset(authors)
+        self.queue = asyncio.Queue(NOTIFICATIONS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event):
+        if self.overflowed:
+            return
+        if self.queue.full():
+            self.overflowed = True
+            broker.dropped += 1
+            return
+        self.queue.put_nowait(event)
+
+
+class Broker:
+    """Раздаёт события подключениям процесса по авторам."""
+
+    def __init__(self):
+        self._by_author = defaultdict(set)
+        self._listeners = set()
+        self._lock = threading.Lock()
+        self._relay = None
+        self._redis = None
+        self.dropped = 0
+
+    @property
+    def connections(self):
+        return len(self._listeners)
+
+    def add(self, listener):
+        with self._lock:
+            self._listeners.add(listener)
+            self._index(listener)
+            if (settings.NOTIFICATIONS_BACKEND == 'redis'
+                    and self._relay is None):
+                self._relay = threading.Thread(
+                    target=self.relay, name='notifications-relay',
+                    daemon=True)
+                self._relay.start()
+
+    def discard(self, listener):
+        with self._lock:
+            self._listeners.discard(listener)
+            self._unindex(listener)
+
+    def follow(self, listener, authors):
+        """Обновляет авторов подключения после изменения подписок."""
+        with self._lock:
+            self._unindex(listener)
+            listener.authors = frozenset(authors)
+            self._index(listener)
+
+    def _index(self, listener):
+        for author_id in listener.authors:
+            self._by_author[author_id].add(listener)
+
+    def _unindex(self, listener):
+        for author_id in listener.authors:
+            listeners = self._by_author.get(author_id)
+            if listeners is None:
+                continue
+            listeners.discard(listener)
+            if not listeners:
+                del self._by_author[author_id]
+
+    def fan_out(self, event):
+        """Передаёт событие подключениям процесса из любого потока."""
+        with self._lock:
+            listeners = list(self._by_author.get(event.author_id, ()))
+        for listener in listeners:
+            try:
+                listener.loop.call_soon_threadsafe(listener.put, event)
+            except RuntimeError:
+                # Цикл событий уже закрыт, подключение уходит.
+                pass
+
+    def publish(self, event):
+        if settings.NOTIFICATIONS_BACKEND == 'redis':
+            try:
+                self.get_redis().publish(
+                    CHANNEL, orjson.dumps(tuple(event)))
+                return
+            except redis.RedisError:
+                logger.exception('Failed to publish notification %s', event.id)
+        self.fan_out(event)
+
+    def get_redis(self):
+        if self._redis is None:
+            self._redis = redis.Redis.from_url(settings.REDIS_URL)
+        return self._redis
+
+    def relay(self):
+        """Принимает события всех процессов из канала Redis.
+
+        События, опубликованные, пока канал недоступен, подключения
+        не получат до переподключения клиента.
+        """
+        while True:
+            try:
+                pubsub = self.get_redis().pubsub(
+                    ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                for message in pubsub.listen():
+                    self.fan_out(Event(*orjson.loads(message['data'])))
+            except redis.RedisError:
+                logger.exception('Notification relay disconnected')
+                time.sleep(RELAY_RETRY_DELAY)
+
+
+broker = Broker()
+
+
+def render_notification_stats():
+    lines = []
+    for key, help_text, kind, value in (
+            ('notification_connections', 'Открытые подключения SSE.',
+             'gauge', broker.connections),
+            ('notification_dropped_total',
+             'Подключения SSE, закрытые из-за переполненной очереди.',
+             'counter', broker.dropped)):
+        name = PREFIX + key
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}',
+                  f'{name} {value}']
+    return lines
@@ -0,0 +1,60 @@
+"""
+Пищевая ценность и стоимость рецептов.
+
+Итоги считаются по IngredientNutrition в канонических единицах
+(api.units) и кешируются на рецепт. Ключ кеша включает дату изменения
+рецепта и версии справочника ингредиентов и пищевой ценности, поэтому
+явно сбрасывать итоги не нужно.
+"""
+import numpy as np
+from django.core.cache import cache
+from recipes.models import IngredientRecipe
+
+from .cache import get_versions
+from .catalog import ingredient_catalog
+from .constants import RECIPE_TOTALS_CACHE_TIMEOUT
+from .units import BASE_AMOUNTS, format_amount, get_factors
+
+NUTRITION_VERSION = 'nutrition'
+NUTRITION_FIELDS = ('calories', 'proteins', 'fats', 'carbohydrates', 'price')
+TOTALS_KEY = 'recipe_totals:{}:{}:{}:{}'
+
+
+def compute_recipe_totals(recipe_id):
+    """Суммирует пищевую ценность и цену ингредиентов рецепта.
+
+    Поле равно None, если ни для одного ингредиента оно не задано;
+    complete показывает, что заданы все поля всех ингредиентов.
+    """
+    lines = list(IngredientRecipe.objects.filter(
+        recipe_id=recipe_id).values_list(
+        'amount', 'ingredient__measurement_unit',
+        *(f'ingredient__nutrition__{field}' for field in NUTRITION_FIELDS)))
+    if not lines:
+        return {**dict.fromkeys(NUTRITION_FIELDS), 'complete': False}
+    units, factors = get_factors(line[1] for line in lines)
+    bases = np.fromiter(
+        (BASE_AMOUNTS.get(unit, 1) for unit in units),
+        dtype=np.float64, count=len(units))
+    amounts = np.fromiter(
+        (line[0] for line in lines), dtype=np.float64, count=len(lines))
+    values = np.array([line[2:] for line in lines], dtype=np.float64)
+    known = ~np.isnan(values)
+    totals = np.nansum(values * (amounts * factors / bases)[:, None], axis=0)
+    return {
+        **{field: float(format_amount(total)) if is_known else None
+           for field, total, is_known in zip(
+               NUTRITION_FIELDS, totals.tolist(), known.any(axis=0))},
+        'complete': bool(known.all()),
+    }
+
+
+def get_recipe_totals(recipe):
+    versions = get_versions(NUTRITION_VERSION, ingredient_catalog.version_name)
+    key = TOTALS_KEY.format(
+        recipe.pk, recipe.updated_at.timestamp(), *versions)
+    totals = cache.get(key)
+    if totals is None:
+        totals = compute_recipe_totals(recipe.pk)
+        cache.set(key, totals, RECIPE_TOTALS_CACHE_TIMEOUT)
+    return totals
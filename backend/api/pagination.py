@@ -1,8 +1,9 @@
 from rest_framework.pagination import PageNumberPagination
 
-from .constants import PAGE_SIZE
+from .constants import MAX_PAGE_SIZE, PAGE_SIZE
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
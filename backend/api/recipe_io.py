@@ -0,0 +1,356 @@
+"""
+Импорт и экспорт рецептов в формате JSON Lines: одна строка - один
+рецепт.
+
+    {"name": "Омлет", "text": "...", "cooking_time": 10,
+     "author": "user@example.com", "tags": ["breakfast"],
+     "ingredients": [{"name": "яйца", "measurement_unit": "шт",
+                      "amount": 3}],
+     "image": "images/recipes/omelette.jpg"}
+
+Ингредиенты ищутся по названию и единице измерения, теги - по slug,
+автор - по email (без автора рецепт получает автора по умолчанию).
+Изображение - путь в хранилище, URL http(s), который скачивается в
+файл, data:image;base64 или, только при импорте командой, путь к файлу
+внутри каталога с изображениями.
+
+Импорт читает строки по одной. Справочники ингредиентов и тегов
+загружаются в словари один раз, поэтому проверка строки не обращается
+к БД. Проверенные рецепты пишутся пачками: одна транзакция на пачку,
+bulk_create для рецептов, ингредиентов и тегов. Строки с ошибками
+пропускаются и попадают в отчёт.
+
+Экспорт читает рецепты пачками по первичному ключу, поэтому память не
+зависит от числа рецептов.
+"""
+import base64
+import binascii
+import io
+import json
+import random
+import uuid
+from string import ascii_letters, digits
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, transaction
+from PIL import Image, UnidentifiedImageError
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+
+from .cache import bump_version
+from .conditional import RECIPES_VERSION
+from .constants import (NAME_RECIPE_MAX_LENGTH, RECIPE_IMPORT_IMAGE_MAX_SIZE,
+                        RECIPE_IMPORT_IMAGE_TIMEOUT, RECIPE_IMPORT_MAX_ERRORS,
+                        RECIPE_IO_BATCH_SIZE, SHORT_LINK_MAX_LENGTH)
+
+User = get_user_model()
+
+RecipeTag = Recipe.tags.through
+
+CONTENT_TYPE = 'application/x-ndjson'
+
+# Верхняя граница PositiveSmallIntegerField.
+MAX_SMALL_INTEGER = 32767
+
+
+class LineError(ValueError):
+    """Строка не может быть импортирована."""
+
+
+def get_integer(record, field):
+    value = record.get(field)
+    if (isinstance(value, bool) or not isinstance(value, int)
+            or not 1 <= value <= MAX_SMALL_INTEGER):
+        raise LineError(
+            f'{field}: нужно целое число от 1 до {MAX_SMALL_INTEGER}.')
+    return value
+
+
+def get_string(record, field, max_length=None):
+    value = record.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise LineError(f'{field}: нужна непустая строка.')
+    if max_length is not None and len(value) > max_length:
+        raise LineError(f'{field}: не больше {max_length} символов.')
+    return value
+
+
+def generate_short_links(count):
+    """count свободных коротких ссылок, проверенных одним запросом."""
+    links = set()
+    while len(links) < count:
+        candidates = {
+            ''.join(random.choices(
+                ascii_letters + digits, k=SHORT_LINK_MAX_LENGTH))
+            for _ in range(count - len(links))} - links
+        links |= candidates - set(Recipe.objects.filter(
+            short_link__in=candidates).values_list('short_link', flat=True))
+    return list(links)
+
+
+class RecipeImporter:
+    """Импорт рецептов из строк JSON Lines.
+
+    default_author - автор рецептов без поля author; images_dir -
+    каталог, из которого можно брать изображения по относительному пути
+    (None запрещает локальные файлы).
+    """
+
+    def __init__(self, default_author=None, images_dir=None,
+                 batch_size=RECIPE_IO_BATCH_SIZE):
+        self.default_author = default_author
+        self.images_dir = images_dir
+        self.batch_size = batch_size
+        self.ingredients = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit').iterator()}
+        self.tags = dict(Tag.objects.values_list('slug', 'pk'))
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, lines):
+        """Импортирует рецепты из итератора строк (str или bytes)."""
+        batch = []
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                batch.append((number, self.parse(line)))
+            except LineError as error:
+                self.add_error(number, error)
+            if len(batch) >= self.batch_size:
+                self.save(batch)
+                batch = []
+        if batch:
+            self.save(batch)
+        if self.created:
+            bump_version(RECIPES_VERSION)
+        return self.report()
+
+    def report(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+    def add_error(self, number, error):
+        self.failed += 1
+        if len(self.errors) < RECIPE_IMPORT_MAX_ERRORS:
+            self.errors.append({'line': number, 'error': str(error)})
+
+    def parse(self, line):
+        """Проверяет строку и заменяет названия на первичные ключи."""
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise LineError('Строка не является JSON.')
+        if not isinstance(record, dict):
+            raise LineError('Нужен объект JSON.')
+        tags = record.get('tags')
+        ingredients = record.get('ingredients')
+        if not isinstance(tags, list) or not tags:
+            raise LineError('tags: нужен непустой список slug тегов.')
+        if not isinstance(ingredients, list) or not ingredients:
+            raise LineError('ingredients: нужен непустой список.')
+        author = record.get('author')
+        if author is None and self.default_author is None:
+            raise LineError('author: не указан автор рецепта.')
+        tag_ids = []
+        for slug in tags:
+            if slug not in self.tags:
+                raise LineError(f'tags: тега {slug!r} нет в базе.')
+            tag_ids.append(self.tags[slug])
+        amounts = {}
+        for ingredient in ingredients:
+            if not isinstance(ingredient, dict):
+                raise LineError('ingredients: нужен список объектов.')
+            key = (ingredient.get('name'), ingredient.get('measurement_unit'))
+            if key not in self.ingredients:
+                raise LineError(
+                    f'ingredients: ингредиента {key[0]!r} ({key[1]!r}) нет '
+                    f'в базе.')
+            amounts[self.ingredients[key]] = get_integer(ingredient, 'amount')
+        if len(set(tag_ids)) != len(tag_ids):
+            raise LineError('tags: повтор тега недопустим.')
+        if len(amounts) != len(ingredients):
+            raise LineError('ingredients: повтор ингредиента недопустим.')
+        return {
+            'name': get_string(record, 'name', NAME_RECIPE_MAX_LENGTH),
+            'text': get_string(record, 'text'),
+            'cooking_time': get_integer(record, 'cooking_time'),
+            'image': get_string(record, 'image'),
+            'author': None if author is None else get_string(
+                record, 'author'),
+            'tags': tag_ids,
+            'ingredients': amounts,
+        }
+
+    def get_authors(self, batch):
+        emails = {
+            record['author'] for _, record in batch
+            if record['author'] is not None}
+        return dict(User.objects.filter(email__in=emails).values_list(
+            'email', 'pk'))
+
+    def save(self, batch):
+        """Записывает пачку проверенных рецептов одной транзакцией."""
+        authors = self.get_authors(batch)
+        recipes, records, stored = [], [], []
+        for number, record in batch:
+            try:
+                if record['author'] is None:
+                    author_id = self.default_author.pk
+                elif record['author'] in authors:
+                    author_id = authors[record['author']]
+                else:
+                    raise LineError(
+                        f'author: пользователя {record["author"]} нет в '
+                        f'базе.')
+                image, is_new = self.get_image(record['image'])
+            except LineError as error:
+                self.add_error(number, error)
+                continue
+            if is_new:
+                stored.append(image)
+            recipes.append(Recipe(
+                author_id=author_id, name=record['name'],
+                text=record['text'], cooking_time=record['cooking_time'],
+                image=image))
+            records.append((number, record))
+        if not recipes:
+            return
+        for recipe, short_link in zip(
+                recipes, generate_short_links(len(recipes))):
+            recipe.short_link = short_link
+        try:
+            with transaction.atomic():
+                Recipe.objects.bulk_create(recipes)
+                IngredientRecipe.objects.bulk_create(
+                    IngredientRecipe(
+                        recipe_id=recipe.pk, ingredient_id=ingredient_id,
+                        amount=amount)
+                    for recipe, (_, record) in zip(recipes, records)
+                    for ingredient_id, amount in record[
+                        'ingredients'].items())
+                RecipeTag.objects.bulk_create(
+                    RecipeTag(recipe_id=recipe.pk, tag_id=tag_id)
+                    for recipe, (_, record) in zip(recipes, records)
+                    for tag_id in record['tags'])
+        except DatabaseError as error:
+            for name in stored:
+                default_storage.delete(name)
+            for number, _ in records:
+                self.add_error(number, f'Ошибка записи пачки: {error}')
+            return
+        self.created += len(recipes)
+
+    def get_image(self, value):
+        """Возвращает имя файла изображения в хранилище и признак того,
+        что файл сохранён при импорте."""
+        if value.startswith('data:image'):
+            try:
+                content = base64.b64decode(
+                    value.partition(';base64,')[2], validate=True)
+            except binascii.Error:
+                raise LineError('image: неверные данные base64.')
+        elif value.startswith(('http://', 'https://')):
+            content = self.download(value)
+        elif self.exists_in_storage(value):
+            return value, False
+        elif self.images_dir is not None:
+            content = self.read_local(value)
+        else:
+            raise LineError(f'image: файла {value} нет в хранилище.')
+        return self.store(content), True
+
+    def exists_in_storage(self, name):
+        try:
+            return default_storage.exists(name)
+        except SuspiciousFileOperation:
+            return False
+
+    def read_local(self, name):
+        images_dir = self.images_dir.resolve()
+        path = (images_dir / name).resolve()
+        if images_dir not in path.parents or not path.is_file():
+            raise LineError(f'image: файла {name} нет в {images_dir}.')
+        if path.stat().st_size > RECIPE_IMPORT_IMAGE_MAX_SIZE:
+            raise LineError('image: файл слишком большой.')
+        return path.read_bytes()
+
+    def download(self, url):
+        try:
+            with requests.get(
+                    url, stream=True,
+                    timeout=RECIPE_IMPORT_IMAGE_TIMEOUT) as response:
+                response.raise_for_status()
+                content = bytearray()
+                for chunk in response.iter_content(64 * 1024):
+                    content += chunk
+                    if len(content) > RECIPE_IMPORT_IMAGE_MAX_SIZE:
+                        raise LineError('image: файл слишком большой.')
+        except requests.RequestException as error:
+            raise LineError(f'image: не удалось скачать {url}: {error}')
+        return bytes(content)
+
+    def store(self, content):
+        """Проверяет изображение и сохраняет его под новым именем."""
+        try:
+            with Image.open(io.BytesIO(content)) as image:
+                image_format = image.format
+                image.verify()
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            raise LineError('image: файл не является изображением.')
+        extension = {'JPEG': 'jpg'}.get(image_format, image_format.lower())
+        name = Recipe._meta.get_field('image').generate_filename(
+            None, f'{uuid.uuid4().hex}.{extension}')
+        return default_storage.save(name, ContentFile(content))
+
+
+def export_recipes(image_url=None, batch_size=RECIPE_IO_BATCH_SIZE):
+    """Строки JSON Lines со всеми рецептами в порядке первичного ключа.
+
+    image_url - функция, которая превращает имя файла изображения в
+    ссылку; без неё в строку пишется путь в хранилище.
+    """
+    last_pk = 0
+    while True:
+        recipes = list(Recipe.objects.filter(pk__gt=last_pk).order_by(
+            'pk').values(
+            'pk', 'name', 'text', 'cooking_time', 'image',
+            'author__email')[:batch_size])
+        if not recipes:
+            return
+        last_pk = recipes[-1]['pk']
+        ids = [recipe['pk'] for recipe in recipes]
+        ingredients = {pk: [] for pk in ids}
+        for recipe_id, name, measurement_unit, amount in (
+                IngredientRecipe.objects.filter(recipe__in=ids).order_by(
+                    'pk').values_list(
+                    'recipe_id', 'ingredient__name',
+                    'ingredient__measurement_unit', 'amount')):
+            ingredients[recipe_id].append({
+                'name': name, 'measurement_unit': measurement_unit,
+                'amount': amount})
+        tags = {pk: [] for pk in ids}
+        for recipe_id, slug in RecipeTag.objects.filter(
+                recipe__in=ids).order_by('pk').values_list(
+                'recipe_id', 'tag__slug'):
+            tags[recipe_id].append(slug)
+        for recipe in recipes:
+            image = recipe['image']
+            yield json.dumps({
+                'name': recipe['name'],
+                'text': recipe['text'],
+                'cooking_time': recipe['cooking_time'],
+                'author': recipe['author__email'],
+                'tags': tags[recipe['pk']],
+                'ingredients': ingredients[recipe['pk']],
+                'image': image_url(image) if image_url else image,
+            }, ensure_ascii=False).encode() + b'\n'
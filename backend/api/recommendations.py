@@ -0,0 +1,79 @@
+"""
+Выдача рекомендаций из таблиц, рассчитанных build_recommendations.
+
+Похожие рецепты хранятся упакованными массивами, поэтому рекомендации
+читаются несколькими запросами по первичному ключу без обращения к
+Favorite и ShoppingCart целиком.
+"""
+import heapq
+from array import array
+from collections import defaultdict
+
+from recipes.models import (Favorite, Recipe, RecommendationsBuild,
+                            ShoppingCart, SimilarRecipes)
+
+from .constants import RECOMMENDATIONS_SEEDS, RECOMMENDATIONS_TOP_K
+
+
+def unpack_ids(data):
+    ids = array('q')
+    ids.frombytes(data)
+    return ids
+
+
+def unpack_scores(data):
+    scores = array('f')
+    scores.frombytes(data)
+    return scores
+
+
+def get_limit(request, default=RECOMMENDATIONS_TOP_K):
+    """Число рекомендаций из параметра limit, не больше рассчитанного."""
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        return default
+    return min(max(limit, 1), RECOMMENDATIONS_TOP_K)
+
+
+def get_similar_recipe_ids(recipe_id, limit):
+    data = SimilarRecipes.objects.filter(
+        recipe_id=recipe_id).values_list('recipe_ids', flat=True).first()
+    return list(unpack_ids(data)[:limit]) if data else []
+
+
+def get_recommended_recipe_ids(user, limit):
+    """Рекомендации по последним рецептам из избранного и покупок.
+
+    Оценки похожих рецептов суммируются, уже добавленные рецепты
+    пропускаются. Если данных мало, список дополняется популярными.
+    """
+    seen = set()
+    seeds = []
+    for model in (Favorite, ShoppingCart):
+        recipe_ids = list(model.objects.filter(user=user).order_by(
+            '-id').values_list('recipe_id', flat=True))
+        seen.update(recipe_ids)
+        seeds += recipe_ids[:RECOMMENDATIONS_SEEDS]
+    scores = defaultdict(float)
+    for recipe_ids, recipe_scores in SimilarRecipes.objects.filter(
+            recipe_id__in=seeds).values_list('recipe_ids', 'scores'):
+        for recipe_id, score in zip(
+                unpack_ids(recipe_ids), unpack_scores(recipe_scores)):
+            if recipe_id not in seen:
+                scores[recipe_id] += score
+    recommended = heapq.nlargest(limit, scores, key=scores.get)
+    if len(recommended) < limit:
+        popular = RecommendationsBuild.objects.values_list(
+            'popular_recipe_ids', flat=True).first()
+        if popular:
+            seen.update(recommended)
+            recommended += [
+                recipe_id for recipe_id in unpack_ids(popular)
+                if recipe_id not in seen][:limit - len(recommended)]
+    return recommended
+
+
+def get_recipes_in_order(recipe_ids):
+    recipes = Recipe.objects.in_bulk(recipe_ids)
+    return [recipes[pk] for pk in recipe_ids if pk in recipes]
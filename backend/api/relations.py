@@ -0,0 +1,169 @@
+"""
+Отношения пользователя: избранное, список покупок и подписки.
+
+Поля is_favorited, is_in_shopping_cart, is_subscribed и фильтры по
+избранному и списку покупок берут id из кеша, а не из БД. Для
+пользователя хранятся отсортированные массивы id (array('q')),
+принадлежность проверяется двоичным поиском. Массивы лежат в кеше
+процесса и в общем кеше под ключом с версией RELATIONS_VERSION
+пользователя, которую api.signals сдвигает при любом изменении
+отношений, поэтому явно сбрасывать кеш не нужно.
+
+Версия читается до загрузки из БД: данные в кеше не старше своей
+версии. Пользователь, у которого отношений больше
+RELATIONS_CACHE_MAX_IDS, отмечается в кеше как слишком большой, и
+проверки для него идут в БД.
+"""
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from backend.metrics import PREFIX
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from recipes.models import Favorite, ShoppingCart, Subscription
+
+from .cache import LocalCache, get_version
+
+RELATIONS_VERSION = 'relations:{}'
+RELATIONS_KEY = 'relation_ids:{}:{}'
+TYPECODE = 'q'
+OVERSIZED = b''
+
+local_cache = LocalCache(
+    settings.RELATIONS_CACHE_LOCAL_TIMEOUT,
+    settings.RELATIONS_CACHE_LOCAL_MAX_SIZE)
+
+lookups = Counter()
+
+
+def contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+class Relations:
+    """Отсортированные id рецептов в избранном и в списке покупок и id
+    авторов, на которых подписан пользователь."""
+    __slots__ = ('favorites', 'shopping_cart', 'following')
+
+    def __init__(self, favorites, shopping_cart, following):
+        self.favorites = favorites
+        self.shopping_cart = shopping_cart
+        self.following = following
+
+    @classmethod
+    def from_bytes(cls, parts):
+        arrays = []
+        for part in parts:
+            ids = array(TYPECODE)
+            ids.frombytes(part)
+            arrays.append(ids)
+        return cls(*arrays)
+
+    def to_bytes(self):
+        return tuple(ids.tobytes() for ids in self.arrays)
+
+    @property
+    def arrays(self):
+        return self.favorites, self.shopping_cart, self.following
+
+    @property
+    def nbytes(self):
+        return sum(len(ids) * ids.itemsize for ids in self.arrays)
+
+    def is_favorited(self, recipe_id):
+        return contains(self.favorites, recipe_id)
+
+    def is_in_shopping_cart(self, recipe_id):
+        return contains(self.shopping_cart, recipe_id)
+
+    def is_subscribed(self, author_id):
+        return contains(self.following, author_id)
+
+
+def load_relations(user_id):
+    """Читает отношения из основной БД, None - если их больше лимита.
+
+    Реплика может отставать от версии, поэтому она не используется.
+    """
+    limit = settings.RELATIONS_CACHE_MAX_IDS
+    arrays = []
+    for model, field in (
+            (Favorite, 'recipe_id'), (ShoppingCart, 'recipe_id'),
+            (Subscription, 'subscribed_to_id')):
+        queryset = model.objects.using(router.db_for_write(model)).filter(
+            user_id=user_id).order_by(field).values_list(field, flat=True)
+        ids = array(TYPECODE, queryset[:limit + 1])
+        limit -= len(ids)
+        if limit < 0:
+            return None
+        arrays.append(ids)
+    return Relations(*arrays)
+
+
+def get_relations(user):
+    """Отношения пользователя из кеша процесса, общего кеша или БД.
+
+    Возвращает None для анонимного пользователя, для пользователя со
+    слишком большим числом отношений и внутри транзакции: её изменения
+    ещё не сдвинули версию.
+    """
+    if not user.is_authenticated or transaction.get_connection(
+            router.db_for_write(Favorite)).in_atomic_block:
+        return None
+    key = RELATIONS_KEY.format(
+        user.pk, get_version(RELATIONS_VERSION.format(user.pk)))
+    relations = local_cache.get(key)
+    if relations is not None:
+        lookups['local'] += 1
+        return relations or None
+    parts = cache.get(key)
+    if parts is not None:
+        lookups['shared'] += 1
+        relations = (
+            OVERSIZED if parts == OVERSIZED else Relations.from_bytes(parts))
+    else:
+        lookups['db'] += 1
+        relations = load_relations(user.pk) or OVERSIZED
+        cache.set(
+            key, relations and relations.to_bytes(),
+            settings.RELATIONS_CACHE_TIMEOUT)
+    local_cache.set(key, relations)
+    return relations or None
+
+
+def get_request_relations(request):
+    """Отношения текущего пользователя, один раз на запрос."""
+    try:
+        return request._relations
+    except AttributeError:
+        request._relations = get_relations(request.user)
+        return request._relations
+
+
+def render_relations_stats():
+    cached = [
+        relations for relations in local_cache.values()
+        if relations != OVERSIZED]
+    sizes = [relations.nbytes for relations in cached]
+    lines = []
+    for key, help_text, value in (
+            ('relations_cache_users',
+             'Пользователи в кеше отношений процесса.', len(cached)),
+            ('relations_cache_bytes',
+             'Размер id в кеше отношений процесса.', sum(sizes)),
+            ('relations_cache_max_user_bytes',
+             'Самый большой набор id пользователя в кеше процесса.',
+             max(sizes, default=0))):
+        name = PREFIX + key
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge',
+                  f'{name} {value}']
+    name = PREFIX + 'relations_cache_lookups_total'
+    lines += [f'# HELP {name} Чтения отношений по источнику.',
+              f'# TYPE {name} counter']
+    lines += [
+        f'{name}{{source="{source}"}} {lookups[source]}'
+        for source in ('local', 'shared', 'db')]
+    return lines
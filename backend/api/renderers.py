@@ -0,0 +1,49 @@
+"""
+Рендерер JSON на orjson.
+
+Вывод совпадает с JSONRenderer DRF байт в байт: компактные
+разделители, кириллица без экранирования (UNICODE_JSON), экранирование
+U+2028 и U+2029, даты, Decimal и прочие типы - через тот же
+JSONEncoder DRF. Различаются только числа с плавающей точкой вне
+диапазона 1e-4 <= |x| < 1e16 (orjson пишет их без "+" и ведущих нулей
+в экспоненте) и NaN/Infinity, которые orjson выводит как null. В данных
+API таких значений нет.
+
+Если orjson не установлен или запрошен формат, который orjson не
+поддерживает (отступы, ensure_ascii), используется JSONRenderer.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer с кодированием через orjson."""
+
+    if orjson is not None:
+        options = (
+            orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact
+                or self.get_indent(
+                    accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=self.options)
+        except orjson.JSONEncodeError:
+            # Например, целые больше 64 бит.
+            return super().render(data, accepted_media_type, renderer_context)
+        return content.replace(LINE_SEPARATOR, b'\\u2028').replace(
+            PARAGRAPH_SEPARATOR, b'\\u2029')
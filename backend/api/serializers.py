@@ -3,12 +3,20 @@ import base64
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.files.base import ContentFile
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Lower
 from djoser.serializers import UserCreateSerializer as CreateSerializer
 from djoser.serializers import UserSerializer as Serializer
+from jobs.models import Job
 from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
                             ShoppingCart, Subscription, Tag)
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+from rest_framework.validators import UniqueValidator
+
+from .constants import EMAIL_TAKEN, RECIPES_LIMIT_MAX, USERNAME_TAKEN
+from .relations import get_request_relations
 
 User = get_user_model()
 
@@ -32,6 +40,13 @@ class StatusFieldsMixin(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
+        relations = get_request_relations(request)
+        if relations is not None:
+            if model == Subscription:
+                return relations.is_subscribed(obj.pk)
+            if model == Favorite:
+                return relations.is_favorited(obj.pk)
+            return relations.is_in_shopping_cart(obj.pk)
         if model == Subscription:
             return request.user.subscribed_to.filter(
                 subscribed_to=obj).exists()
@@ -46,29 +61,47 @@ class UserCreateSerializer(CreateSerializer):
         fields = (
             'email', 'id', 'username', 'first_name', 'last_name', 'password')
 
+    def build_standard_field(self, field_name, model_field):
+        """Убирает UniqueValidator с полей: занятость имени и email
+        проверяется в validate одним запросом."""
+        field_class, field_kwargs = super().build_standard_field(
+            field_name, model_field)
+        if 'validators' in field_kwargs:
+            field_kwargs['validators'] = [
+                validator for validator in field_kwargs['validators']
+                if not isinstance(validator, UniqueValidator)]
+        return field_class, field_kwargs
+
     def validate(self, data):
         if data['email'] == data['username']:
             raise serializers.ValidationError(
                 'Имя пользователя не может совпадать '
                 'с адресом электронной почты!')
+        self.validate_unique(data)
+        return data
 
-        try:
-            user = User.objects.get(username=data['username'])
-            if user:
-                raise serializers.ValidationError(
-                    'Имя пользователя уже занято!')
-        except ObjectDoesNotExist:
-            pass
+    def validate_unique(self, data):
+        """Проверяет, свободны ли имя и email, без учёта регистра."""
+        taken = list(User.objects.alias(
+            username_lower=Lower('username'), email_lower=Lower('email'),
+        ).filter(
+            Q(username_lower=Lower(Value(data['username'])))
+            | Q(email_lower=Lower(Value(data['email'])))
+        ).values_list('username', 'email')[:2])
+        for username, email in taken:
+            if username.lower() == data['username'].lower():
+                raise serializers.ValidationError(USERNAME_TAKEN)
+        if taken:
+            raise serializers.ValidationError(EMAIL_TAKEN)
 
+    def create(self, validated_data):
+        """Если имя или email заняли между проверкой и вставкой,
+        нарушение ограничения отдаётся той же ошибкой валидации."""
         try:
-            user = User.objects.get(email=data['email'])
-            if user:
-                raise serializers.ValidationError(
-                    'Email уже используется!')
-        except ObjectDoesNotExist:
-            pass
-
-        return data
+            return self.perform_create(validated_data)
+        except IntegrityError:
+            self.validate_unique(validated_data)
+            self.fail('cannot_create_user')
 
 
 class UserSerializer(Serializer, StatusFieldsMixin):
@@ -315,10 +348,24 @@ class ShoppingCartSerializer(UniqueRecipeMixin):
         model = ShoppingCart
 
 
+def get_recipes_limit(request):
+    """Сколько рецептов автора показать в подписках (recipes_limit)."""
+    try:
+        limit = int(request.query_params.get(
+            'recipes_limit', RECIPES_LIMIT_MAX))
+    except ValueError:
+        limit = RECIPES_LIMIT_MAX
+    return min(max(limit, 1), RECIPES_LIMIT_MAX)
+
+
 class UserRecipesSerializer(UserSerializer):
-    """Сериализатор для модели User и его рецептов."""
+    """Сериализатор для модели User и его рецептов.
+
+    Список подписок заранее выбирает рецепты (limited_recipes) и
+    считает их (recipes_count), для одного автора они читаются здесь.
+    """
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source="recipes.count")
+    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -327,14 +374,17 @@ class UserRecipesSerializer(UserSerializer):
             'is_subscribed', 'recipes', 'recipes_count', 'avatar')
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()[
+                :get_recipes_limit(self.context.get('request'))]
         serializer = RecipePreviewSerializer(recipes, many=True)
         return serializer.data
 
+    def get_recipes_count(self, obj):
+        count = getattr(obj, 'recipes_count', None)
+        return obj.recipes.count() if count is None else count
+
 
 class SubscriptionSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Subscription."""
@@ -363,3 +413,23 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             context=self.context
         )
         return serializer.data
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Сериализатор фоновой задачи."""
+
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = (
+            'id', 'name', 'status', 'attempts', 'created_at', 'started_at',
+            'finished_at', 'result', 'download')
+        read_only_fields = fields
+
+    def get_download(self, obj):
+        if obj.status != Job.DONE or not obj.filename:
+            return None
+        return reverse(
+            'api:jobs-download', args=(obj.pk,),
+            request=self.context.get('request'))
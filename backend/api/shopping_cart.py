@@ -0,0 +1,153 @@
+"""
+Файлы списка покупок: текст, HTML для печати и PDF.
+
+Текст и HTML рендерятся построчно генераторами, которые можно сразу
+отдавать StreamingHttpResponse. PDF рисуется на холсте reportlab без
+промежуточной разметки, но холст держит весь документ в памяти до
+save(). Для фоновых задач файл всё равно собирается целиком: он
+хранится в кеше и в Job.content (BinaryField). Память на файл порядка
+его размера - десятки килобайт даже для списка из всех ингредиентов.
+Готовые файлы кешируются по хешу содержимого списка, поэтому
+одинаковые списки не рендерятся повторно.
+"""
+import hashlib
+import html
+import io
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .constants import SHOPPING_CART_FILE_CACHE_TIMEOUT
+from .units import aggregate_ingredients
+from .utils import SHOPPING_CART_FILENAME, render_shopping_cart_line
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.utils import simpleSplit
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+except ImportError:
+    canvas = None
+
+FILE_CACHE_KEY = 'shopping_cart_file:{}:{}'
+TITLE = 'Список покупок'
+
+PDF_FONT_NAME = 'ShoppingCartFont'
+PDF_FONT_SIZE = 12
+PDF_TITLE_SIZE = 16
+PDF_LEADING = 16
+PDF_MARGIN = 50
+
+HTML_HEAD = f'''<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>{TITLE}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; width: 100%; }}
+td {{ border-bottom: 1px solid #ccc; padding: 0.3em 0.5em; }}
+td.amount {{ text-align: right; white-space: nowrap; }}
+td.check {{ width: 1.5em; }}
+@media print {{ body {{ margin: 0; }} }}
+</style>
+</head>
+<body>
+<h1>{TITLE}</h1>
+<table>
+'''
+HTML_TAIL = '</table>\n</body>\n</html>\n'
+
+FileFormat = namedtuple('FileFormat', ('content_type', 'render'))
+
+
+def get_digest(ingredients):
+    """Хеш агрегированного списка покупок."""
+    digest = hashlib.sha256()
+    for ingredient in ingredients:
+        digest.update(render_shopping_cart_line(ingredient).encode())
+    return digest.hexdigest()
+
+
+def iter_text(ingredients):
+    for ingredient in ingredients:
+        yield render_shopping_cart_line(ingredient).encode()
+
+
+def iter_html(ingredients):
+    yield HTML_HEAD.encode()
+    for ingredient in ingredients:
+        name = html.escape(ingredient['ingredient__name'])
+        unit = html.escape(ingredient['ingredient__measurement_unit'])
+        yield (
+            f'<tr><td class="check">&#9744;</td><td>{name}</td>'
+            f'<td class="amount">{ingredient["amount_sum"]} {unit}</td>'
+            f'</tr>\n').encode()
+    yield HTML_TAIL.encode()
+
+
+def register_pdf_font():
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_CART_PDF_FONT))
+
+
+def iter_pdf(ingredients):
+    """PDF со списком покупок.
+
+    Страницы рисуются по мере обхода списка, но reportlab собирает
+    документ в памяти и отдаёт его одним куском после save(). Шрифт с
+    кириллицей берётся из SHOPPING_CART_PDF_FONT.
+    """
+    register_pdf_font()
+    output = io.BytesIO()
+    width, height = A4
+    text_width = width - 2 * PDF_MARGIN
+    pdf = canvas.Canvas(output, pagesize=A4, pageCompression=1)
+    pdf.setTitle(TITLE)
+    pdf.setFont(PDF_FONT_NAME, PDF_TITLE_SIZE)
+    pdf.drawString(PDF_MARGIN, height - PDF_MARGIN, TITLE)
+    pdf.setFont(PDF_FONT_NAME, PDF_FONT_SIZE)
+    y = height - PDF_MARGIN - 2 * PDF_LEADING
+    for ingredient in ingredients:
+        line = render_shopping_cart_line(ingredient).rstrip('\n')
+        for part in simpleSplit(
+                f'☐ {line}', PDF_FONT_NAME, PDF_FONT_SIZE, text_width):
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                pdf.setFont(PDF_FONT_NAME, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            pdf.drawString(PDF_MARGIN, y, part)
+            y -= PDF_LEADING
+    pdf.save()
+    yield output.getvalue()
+
+
+FILE_FORMATS = {
+    'txt': FileFormat('text/plain; charset=utf-8', iter_text),
+    'html': FileFormat('text/html; charset=utf-8', iter_html),
+}
+if canvas is not None:
+    FILE_FORMATS['pdf'] = FileFormat('application/pdf', iter_pdf)
+
+
+def get_filename(file_format):
+    return f'{SHOPPING_CART_FILENAME.rsplit(".", 1)[0]}.{file_format}'
+
+
+def render_file(ingredients, file_format):
+    """Возвращает содержимое, тип и имя файла списка покупок.
+
+    Файл берётся из кеша, если такой же список уже рендерился. Содержимое
+    собирается в bytes целиком: его кладут в кеш и в Job.content.
+    """
+    ingredients = aggregate_ingredients(ingredients)
+    file = FILE_FORMATS[file_format]
+    key = FILE_CACHE_KEY.format(file_format, get_digest(ingredients))
+    content = cache.get(key)
+    if content is None:
+        content = b''.join(file.render(ingredients))
+        cache.set(key, content, SHOPPING_CART_FILE_CACHE_TIMEOUT)
+    return content, file.content_type, get_filename(file_format)
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from outbox.models import OutboxEvent
+from outbox.subscribers import subscriber
+from recipes.models import (Favorite, Ingredient, IngredientNutrition,
+                            Recipe, ShoppingCart, Subscription, Tag)
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user
+from .cache import bump_version
+from .catalog import ingredient_catalog, tag_catalog
+from .conditional import PROFILES_VERSION, RECIPES_VERSION, RELATIONS_VERSION
+from .nutrition import NUTRITION_VERSION
+
+User = get_user_model()
+
+
+@subscriber(Ingredient)
+def invalidate_ingredient_catalog(event):
+    ingredient_catalog.invalidate()
+
+
+@subscriber(IngredientNutrition)
+def bump_nutrition_version(event):
+    bump_version(NUTRITION_VERSION)
+
+
+@subscriber(Tag)
+def invalidate_tag_catalog(event):
+    tag_catalog.invalidate()
+
+
+@subscriber(Favorite, ShoppingCart, Subscription)
+def bump_relations_version(event):
+    for user_id in event.values('user_id'):
+        bump_version(RELATIONS_VERSION.format(user_id))
+
+
+@subscriber(User)
+def bump_profiles_version(event):
+    for user_id in event.values('pk'):
+        invalidate_user(user_id)
+    bump_version(PROFILES_VERSION)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token_cache(instance, **kwargs):
+    # После удаления Django обнуляет первичный ключ - ключ токена.
+    key = instance.key
+    transaction.on_commit(lambda: invalidate_token(key))
+
+
+@subscriber(Recipe)
+def bump_recipes_version(event):
+    if event.action == OutboxEvent.DELETED:
+        bump_version(RECIPES_VERSION)
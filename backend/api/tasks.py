@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.cache import cache
+from jobs.models import Job
+from jobs.queue import JobFile, task
+
+from .shopping_cart import get_digest, render_file
+from .units import aggregate_ingredients
+from .utils import get_shopping_cart_ingredients
+
+SHOPPING_CART_JOB_KEY = 'shopping_cart_job:{}:{}:{}'
+
+
+@task(name='shopping_cart', priority=10)
+def render_shopping_cart_file(user_id, file_format='txt'):
+    """Готовит файл списка покупок пользователя."""
+    return JobFile(*render_file(
+        get_shopping_cart_ingredients(user_id), file_format))
+
+
+def enqueue_shopping_cart_file(user, file_format):
+    """Возвращает задачу подготовки файла списка покупок.
+
+    Задачи переиспользуются по хешу содержимого списка, а не по версии
+    отношений пользователя: она не меняется, когда автор правит
+    ингредиенты рецепта из списка. Пока содержимое то же, повторный
+    запрос возвращает уже созданную задачу, а не ставит новую.
+    """
+    digest = get_digest(aggregate_ingredients(
+        get_shopping_cart_ingredients(user.pk)))
+    key = SHOPPING_CART_JOB_KEY.format(user.pk, file_format, digest)
+    job_id = cache.get(key)
+    job = job_id and Job.objects.filter(pk=job_id, user=user).exclude(
+        status=Job.FAILED).defer('content').first()
+    if not job:
+        job = render_shopping_cart_file.enqueue(
+            user=user, user_id=user.pk, file_format=file_format)
+        cache.set(key, job.pk, settings.JOBS_RESULT_TTL)
+    return job
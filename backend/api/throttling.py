@@ -0,0 +1,236 @@
+"""
+Ограничение частоты и числа одновременных запросов.
+
+Частота ограничивается корзиной токенов: у клиента есть запас из N
+запросов, который пополняется со скоростью N за период ставки
+('30/min'), поэтому короткие всплески проходят, а средняя частота не
+превышает ставку. Клиент - пользователь или IP для анонимов.
+UserRateThrottle считает все запросы клиента (ставки user и anon),
+EndpointRateThrottle - запросы к отдельным эндпоинтам со своей ставкой
+(throttle_scopes вьюсета). Ставки задаются в DEFAULT_THROTTLE_RATES,
+пустая ставка снимает ограничение.
+
+Корзины хранятся в общем кеше (THROTTLE_BACKEND = 'cache') или в памяти
+процесса ('local'). Обновление корзины в кеше не атомарно: при гонке
+клиент может получить несколько лишних запросов.
+
+Число одновременных запросов к дорогим эндпоинтам ограничивает
+AdmissionMixin по CONCURRENCY_LIMITS: при превышении общего лимита
+процесса или занятом пуле соединений он отвечает 503, при превышении
+лимита клиента - 429, оба с Retry-After.
+"""
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework import exceptions, status
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+from .mixins import get_endpoint
+
+BUCKET_KEY = 'throttle:{}:{}'
+
+
+class ServiceUnavailable(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер перегружен, повторите запрос позже.'
+    default_code = 'service_unavailable'
+
+    def __init__(self, detail=None, code=None, wait=None):
+        super().__init__(detail, code)
+        self.wait = wait or settings.OVERLOAD_RETRY_AFTER
+
+
+def take_token(state, capacity, rate, now):
+    """Забирает токен из корзины.
+
+    Возвращает новое состояние корзины и сколько секунд ждать токена
+    (0, если токен взят).
+    """
+    tokens = capacity
+    if state is not None:
+        tokens, updated = state
+        tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) / rate
+
+
+class LocalBuckets:
+    """Корзины в памяти процесса, самые давние вытесняются."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        with self._lock:
+            state, wait = take_token(
+                self._buckets.get(key), capacity, rate, time.monotonic())
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBuckets:
+    """Корзины в общем кеше, общие для всех процессов."""
+
+    def take(self, key, capacity, rate):
+        state, wait = take_token(cache.get(key), capacity, rate, time.time())
+        # Корзина наполняется за capacity / rate секунд, после этого
+        # запись не отличается от отсутствующей.
+        cache.set(key, state, math.ceil(capacity / rate) + 1)
+        return wait
+
+
+local_buckets = LocalBuckets(settings.THROTTLE_LOCAL_MAX_SIZE)
+cache_buckets = CacheBuckets()
+
+
+def get_buckets():
+    if settings.THROTTLE_BACKEND == 'local':
+        return local_buckets
+    return cache_buckets
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Ограничение частоты корзиной токенов по ставке из get_scope."""
+
+    def get_scope(self, request, view):
+        raise NotImplementedError
+
+    def get_client(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        self.delay = 0
+        if getattr(request._request, 'throttle_checked', False):
+            # Уже проверен асинхронным представлением (api.async_views).
+            return True
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if not rate:
+            return True
+        capacity, duration = SimpleRateThrottle.parse_rate(self, rate)
+        self.delay = get_buckets().take(
+            BUCKET_KEY.format(scope, self.get_client(request)),
+            capacity, capacity / duration)
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+class UserRateThrottle(TokenBucketThrottle):
+    """Все запросы клиента: ставка user или anon."""
+
+    def get_scope(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return 'user'
+        return 'anon'
+
+
+class EndpointRateThrottle(TokenBucketThrottle):
+    """Запросы к действию вьюсета со ставкой из throttle_scopes."""
+
+    def get_scope(self, request, view):
+        return getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None))
+
+
+def database_saturated(alias='default'):
+    """Все соединения пула заняты и есть очередь ожидающих.
+
+    Без пула (DB_POOL) насыщение не определяется.
+    """
+    pool = getattr(connections[alias], 'pool', None)
+    if pool is None:
+        return False
+    stats = pool.stats()
+    return stats['waiting'] > 0 and stats['in_use'] >= stats['max_size']
+
+
+class ConcurrencyLimiter:
+    """Счётчики выполняющихся запросов процесса по эндпоинтам и
+    клиентам."""
+
+    def __init__(self):
+        self._active = Counter()
+        self._lock = threading.Lock()
+
+    def acquire(self, endpoint, client, limit, client_limit):
+        with self._lock:
+            if self._active[endpoint] >= limit:
+                raise ServiceUnavailable()
+            if self._active[endpoint, client] >= client_limit:
+                raise exceptions.Throttled(settings.OVERLOAD_RETRY_AFTER)
+            self._active[endpoint] += 1
+            self._active[endpoint, client] += 1
+
+    def release(self, endpoint, client):
+        with self._lock:
+            for key in (endpoint, (endpoint, client)):
+                self._active[key] -= 1
+                if not self._active[key]:
+                    del self._active[key]
+
+
+concurrency_limiter = ConcurrencyLimiter()
+
+
+class AdmissionMixin:
+    """Не пускает запрос к дорогому действию при перегрузке.
+
+    Лимиты берутся из CONCURRENCY_LIMITS по имени эндпоинта
+    (ИмяВьюсета.действие): (запросов на процесс, запросов клиента).
+    Проверка идёт после аутентификации и ограничения частоты.
+    """
+    _admitted = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        endpoint = get_endpoint(type(self), getattr(self, 'action', None))
+        limits = settings.CONCURRENCY_LIMITS.get(endpoint)
+        if limits is None:
+            return
+        if database_saturated():
+            raise ServiceUnavailable()
+        client = UserRateThrottle().get_client(request)
+        concurrency_limiter.acquire(endpoint, client, *limits)
+        self._admitted = (endpoint, client)
+
+    def dispatch(self, request, *args, **kwargs):
+        """Освобождает место после ответа, в том числе после исключения,
+        которое DRF не превратил в ответ. Потоковый ответ держит место,
+        пока сервер не закроет его после отдачи тела."""
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        except BaseException:
+            self.release_admission()
+            raise
+        if self._admitted is not None and response.streaming:
+            admitted, self._admitted = self._admitted, None
+            response._resource_closers.append(
+                lambda: concurrency_limiter.release(*admitted))
+        else:
+            self.release_admission()
+        return response
+
+    def release_admission(self):
+        if self._admitted is not None:
+            concurrency_limiter.release(*self._admitted)
+            self._admitted = None
@@ -0,0 +1,113 @@
+"""
+Приведение единиц измерения ингредиентов к каноническим.
+
+Одна и та же единица в справочнике встречается в разных написаниях
+("ч. л.", "ч.л.", "чайная ложка"), а кратные единицы (кг, л) несовместимы
+с базовыми при простом суммировании. Таблица UNITS переводит написание
+единицы в каноническую единицу и множитель, а списки покупок
+суммируются уже в канонических единицах.
+"""
+import functools
+
+import numpy as np
+
+GRAM = 'г'
+MILLILITER = 'мл'
+PIECE = 'шт.'
+
+# Количество канонических единиц, на которое заданы пищевая ценность
+# и цена ингредиента. Для неизмеримых единиц (щепотка, банка) - одна.
+BASE_AMOUNTS = {GRAM: 100, MILLILITER: 100}
+
+# Написания приводятся к виду normalize_unit: нижний регистр, без
+# пробелов и точек.
+UNITS = {
+    'г': (GRAM, 1),
+    'гр': (GRAM, 1),
+    'грамм': (GRAM, 1),
+    'g': (GRAM, 1),
+    'мг': (GRAM, 0.001),
+    'кг': (GRAM, 1000),
+    'килограмм': (GRAM, 1000),
+    'kg': (GRAM, 1000),
+    'мл': (MILLILITER, 1),
+    'миллилитр': (MILLILITER, 1),
+    'ml': (MILLILITER, 1),
+    'л': (MILLILITER, 1000),
+    'литр': (MILLILITER, 1000),
+    'l': (MILLILITER, 1000),
+    'капля': (MILLILITER, 0.05),
+    'чл': (MILLILITER, 5),
+    'чайнаяложка': (MILLILITER, 5),
+    'десл': (MILLILITER, 10),
+    'десертнаяложка': (MILLILITER, 10),
+    'стл': (MILLILITER, 15),
+    'столоваяложка': (MILLILITER, 15),
+    'стакан': (MILLILITER, 200),
+    'шт': (PIECE, 1),
+    'штука': (PIECE, 1),
+    'pcs': (PIECE, 1),
+}
+
+AMOUNT_PRECISION = 2
+
+
+def normalize_unit(unit):
+    return ''.join(
+        unit.lower().replace('ё', 'е').replace('.', ' ').split())
+
+
+@functools.lru_cache(maxsize=None)
+def get_conversion(unit):
+    """Каноническая единица и множитель для единицы измерения.
+
+    Неизвестные единицы остаются как есть, но их написания тоже
+    сводятся к одному виду.
+    """
+    return UNITS.get(normalize_unit(unit), (' '.join(unit.split()), 1))
+
+
+def get_factors(units):
+    """Канонические единицы и массив множителей для списка единиц."""
+    conversions = [get_conversion(unit) for unit in units]
+    return (
+        [unit for unit, _ in conversions],
+        np.fromiter((factor for _, factor in conversions),
+                    dtype=np.float64, count=len(conversions)))
+
+
+def format_amount(amount):
+    """Количество без лишних нулей: 150, 0.25."""
+    return f'{round(amount, AMOUNT_PRECISION):.{AMOUNT_PRECISION}f}'.rstrip(
+        '0').rstrip('.')
+
+
+def aggregate_ingredients(ingredients):
+    """Суммирует строки списка покупок в канонических единицах.
+
+    Принимает и возвращает словари с ключами ingredient__name,
+    ingredient__measurement_unit и amount_sum. Строки одного
+    ингредиента в разных единицах ("мука, кг" и "мука, г")
+    складываются в одну.
+    """
+    ingredients = list(ingredients)
+    if not ingredients:
+        return []
+    units, factors = get_factors(
+        ingredient['ingredient__measurement_unit']
+        for ingredient in ingredients)
+    groups = {}
+    index = np.fromiter(
+        (groups.setdefault((ingredient['ingredient__name'], unit),
+                           len(groups))
+         for ingredient, unit in zip(ingredients, units)),
+        dtype=np.intp, count=len(ingredients))
+    amounts = np.fromiter(
+        (ingredient['amount_sum'] for ingredient in ingredients),
+        dtype=np.float64, count=len(ingredients))
+    totals = np.bincount(index, weights=amounts * factors,
+                         minlength=len(groups))
+    return [
+        {'ingredient__name': name, 'ingredient__measurement_unit': unit,
+         'amount_sum': format_amount(total)}
+        for (name, unit), total in zip(groups, totals.tolist())]
@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (TokenObtainPairView,
                                             TokenRefreshView)
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from . import async_views
+from .views import (IngredientViewSet, JobViewSet, RecipeViewSet, TagViewSet,
+                    UserViewSet)
 
 router = DefaultRouter()
 
@@ -11,6 +14,7 @@ router.register(r'ingredients', IngredientViewSet, basename='ingredients')
 router.register(r'tags', TagViewSet, basename='tags')
 router.register(r'recipes', RecipeViewSet, basename='recipes')
 router.register(r'users', UserViewSet, basename='users')
+router.register(r'jobs', JobViewSet, basename='jobs')
 
 app_name = 'api'
 
@@ -22,3 +26,13 @@ urlpatterns = [
          name='token_refresh'),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASYNC_VIEWS:
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list),
+        path('recipes/events/', async_views.recipe_events),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+        path('recipes/download_shopping_cart/',
+             async_views.download_shopping_cart),
+        path('ingredients/', async_views.ingredient_list),
+    ] + urlpatterns
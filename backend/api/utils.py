@@ -1,8 +1,14 @@
 import random
 from string import ascii_letters, digits
 
+from django.db.models import Sum
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect
-from recipes.models import Recipe
+from recipes.models import IngredientRecipe, Recipe
+
+from .units import aggregate_ingredients
+
+SHOPPING_CART_FILENAME = 'shopping_cart.txt'
 
 
 def get_short_link(model):
@@ -13,8 +19,77 @@ def get_short_link(model):
     return short_link
 
 
+def read_queryset():
+    """Рецепты со всем, что нужно RecipeReadSerializer."""
+    return Recipe.objects.select_related('author').prefetch_related(
+        'tags', 'ingredients_in_recipe__ingredient')
+
+
+def get_shopping_cart_ingredients(user):
+    """Суммирует ингредиенты рецептов из списка покупок пользователя."""
+    return IngredientRecipe.objects.filter(
+        recipe__shopping_cart__user=user).values(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(amount_sum=Sum('amount'))
+
+
+def render_shopping_cart_line(ingredient):
+    name = ingredient['ingredient__name']
+    measurement_unit = ingredient['ingredient__measurement_unit']
+    amount = ingredient['amount_sum']
+    return f'{name} ({measurement_unit}) - {amount}\n'
+
+
+def render_shopping_cart(ingredients):
+    """Текст списка покупок.
+
+    Количества приводятся к каноническим единицам (api.units).
+    """
+    return ''.join(
+        render_shopping_cart_line(ingredient)
+        for ingredient in aggregate_ingredients(ingredients))
+
+
+def shopping_cart_response(ingredients):
+    """Отдаёт список покупок текстовым файлом."""
+    response = HttpResponse(
+        render_shopping_cart(ingredients), content_type='text/plain')
+    response['Content-Disposition'] = (
+        f'attachment; filename="{SHOPPING_CART_FILENAME}"')
+    return response
+
+
 def recipe_redirection(request, short_link):
     recipe = get_object_or_404(Recipe, short_link=short_link)
     recipe_id = recipe.id
     return redirect(
         request.build_absolute_uri('/') + f'recipes/{recipe_id}/')
+
+
+def choose_encoding(accept_encoding, available):
+    """Выбирает кодирование ответа по заголовку Accept-Encoding.
+
+    Из доступных кодирований берётся то, которое клиент принимает
+    с наибольшим весом; при равных весах - первое в available.
+    """
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if coding:
+            weights[coding] = weight
+    best, best_weight = 'identity', 0.0
+    for coding in available:
+        if coding == 'identity':
+            continue
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
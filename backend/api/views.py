@@ -1,40 +1,66 @@
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as ViewSet
-from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                            ShoppingCart, Subscription, Tag)
-from rest_framework import permissions, status, viewsets
+from jobs.models import Job
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            Subscription, Tag)
+from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
+from .catalog import ingredient_catalog, tag_catalog
+from .conditional import conditional_response
 from .filters import IngredientFilter, RecipeFilter
+from .mixins import MetricsMixin
+from .notifications import broker, get_event
+from .nutrition import get_recipe_totals
 from .pagination import CustomPagination
 from .permissions import IsAuthorOrReadOnly
+from .recipe_io import CONTENT_TYPE, RecipeImporter, export_recipes
+from .recommendations import (get_limit, get_recipes_in_order,
+                              get_recommended_recipe_ids,
+                              get_similar_recipe_ids)
 from .serializers import (AvatarSerializer, FavoriteSerializer,
-                          IngredientSerializer, RecipeCreateSerializer,
-                          RecipeReadSerializer, ShoppingCartSerializer,
-                          SubscriptionSerializer, TagSerializer,
-                          UserRecipesSerializer, UserSerializer)
-from .utils import get_short_link
+                          IngredientSerializer, JobSerializer,
+                          RecipeCreateSerializer,
+                          RecipePreviewSerializer, RecipeReadSerializer,
+                          ShoppingCartSerializer, SubscriptionSerializer,
+                          TagSerializer, UserRecipesSerializer,
+                          UserSerializer, get_recipes_limit)
+from .shopping_cart import FILE_FORMATS, iter_html
+from .tasks import enqueue_shopping_cart_file
+from .throttling import AdmissionMixin
+from .units import aggregate_ingredients
+from .utils import (get_shopping_cart_ingredients, get_short_link,
+                    read_queryset, shopping_cart_response)
 
 User = get_user_model()
 
 
-class UserViewSet(ViewSet):
+class UserViewSet(MetricsMixin, AdmissionMixin, ViewSet):
     """Вьюсет модели User."""
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     pagination_class = CustomPagination
+    throttle_scopes = {'subscriptions': 'subscriptions'}
 
     def get_queryset(self):
         if self.action == 'subscriptions':
-            queryset = User.objects.filter(
-                subscription__user=self.request.user)
-            return queryset
+            return User.objects.filter(
+                subscription__user=self.request.user).annotate(
+                recipes_count=Count('recipes')).prefetch_related(Prefetch(
+                    'recipes', to_attr='limited_recipes',
+                    queryset=Recipe.objects.order_by('-pub_date')[
+                        :get_recipes_limit(self.request)])).order_by('pk')
         return super().get_queryset()
 
     def get_serializer_class(self):
@@ -104,7 +130,7 @@ class UserViewSet(ViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(MetricsMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для модели Ingredient."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -112,15 +138,25 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return ingredient_catalog.response(request)
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(MetricsMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для модели Tag."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (permissions.AllowAny,)
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return tag_catalog.response(request)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(MetricsMixin, AdmissionMixin, viewsets.ModelViewSet):
     """Вьюсет для модели Recipe."""
     queryset = Recipe.objects.all()
     serializer_class = RecipeCreateSerializer
@@ -129,10 +165,42 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = CustomPagination
+    throttle_scopes = {
+        'download_shopping_cart': 'shopping_cart',
+        'enqueue_shopping_cart': 'shopping_cart',
+    }
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            return read_queryset()
+        return super().get_queryset()
 
     def perform_create(self, serializer):
-        serializer.save(
+        recipe = serializer.save(
             author=self.request.user, short_link=get_short_link(Recipe))
+        event = get_event(recipe, self.request)
+        transaction.on_commit(lambda: broker.publish(event))
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            page = list(queryset)
+            return conditional_response(
+                request, page,
+                lambda: Response(self.get_serializer(page, many=True).data),
+                len(page))
+        return conditional_response(
+            request, page,
+            lambda: self.get_paginated_response(
+                self.get_serializer(page, many=True).data),
+            self.paginator.page.paginator.count)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return conditional_response(
+            request, (instance,),
+            lambda: Response(self.get_serializer(instance).data))
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -141,6 +209,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return FavoriteSerializer
         if self.action == 'shopping_cart':
             return ShoppingCartSerializer
+        if self.action in ('recommendations', 'recommended'):
+            return RecipePreviewSerializer
+        if self.action == 'enqueue_shopping_cart':
+            return JobSerializer
         return RecipeCreateSerializer
 
     @action(
@@ -200,18 +272,119 @@ class RecipeViewSet(viewsets.ModelViewSet):
         detail=False, methods=['get'],
         permission_classes=(permissions.IsAuthenticated,))
     def download_shopping_cart(self, request):
-        """Скачивание Списка покупок."""
-        indredients = IngredientRecipe.objects.filter(
-            recipe__shopping_cart__user=request.user).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount_sum=Sum('amount'))
-        shopping_cart = ''
-        for ingredient in indredients:
-            name = ingredient['ingredient__name']
-            measurement_unit = ingredient['ingredient__measurement_unit']
-            amount = ingredient['amount_sum']
-            shopping_cart += f'{name} ({measurement_unit}) - {amount}\n'
-        response = HttpResponse(shopping_cart, content_type='text/plain')
-        response[
-            'Content-Disposition'] = 'attachment; filename="shopping_cart.txt"'
+        """Скачивание Списка покупок.
+
+        С параметром file_format=html список отдаётся страницей для
+        печати, которая рендерится по мере отправки.
+        """
+        ingredients = get_shopping_cart_ingredients(request.user)
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format == 'txt':
+            return shopping_cart_response(ingredients)
+        if file_format != 'html':
+            raise ValidationError({'file_format': [
+                'Здесь доступны форматы txt и html, '
+                'остальные - через POST.']})
+        return StreamingHttpResponse(
+            iter_html(aggregate_ingredients(ingredients)),
+            content_type=FILE_FORMATS['html'].content_type)
+
+    @download_shopping_cart.mapping.post
+    def enqueue_shopping_cart(self, request):
+        """Ставит подготовку файла списка покупок в очередь задач.
+
+        Формат (txt, html или pdf) передаётся в file_format. Если файл
+        для текущего списка уже готов, ответ 200 с готовой задачей.
+        """
+        file_format = request.data.get(
+            'file_format', request.query_params.get('file_format', 'txt'))
+        if file_format not in FILE_FORMATS:
+            raise ValidationError({'file_format': [
+                f'Допустимые форматы: {", ".join(FILE_FORMATS)}.']})
+        job = enqueue_shopping_cart_file(request.user, file_format)
+        return Response(
+            self.get_serializer(job).data,
+            status=(status.HTTP_200_OK if job.status == Job.DONE
+                    else status.HTTP_202_ACCEPTED),
+            headers={'Location': reverse(
+                'api:jobs-detail', args=(job.pk,), request=request)})
+
+    @action(
+        detail=True, methods=['get'],
+        permission_classes=(permissions.AllowAny,))
+    def nutrition(self, request, **kwargs):
+        """Пищевая ценность и стоимость рецепта."""
+        return Response(get_recipe_totals(self.get_object()))
+
+    @action(
+        detail=True, methods=['get'],
+        permission_classes=(permissions.AllowAny,))
+    def recommendations(self, request, **kwargs):
+        """Рецепты, которые добавляют в избранное вместе с этим."""
+        recipes = get_recipes_in_order(get_similar_recipe_ids(
+            self.get_object().pk, get_limit(request)))
+        return Response(self.get_serializer(recipes, many=True).data)
+
+    @action(
+        detail=False, methods=['get'],
+        permission_classes=(permissions.IsAuthenticated,))
+    def recommended(self, request):
+        """Рекомендации для текущего пользователя."""
+        recipes = get_recipes_in_order(get_recommended_recipe_ids(
+            request.user, get_limit(request)))
+        return Response(self.get_serializer(recipes, many=True).data)
+
+    @action(
+        detail=False, methods=['get'],
+        permission_classes=(permissions.IsAdminUser,), url_path='export')
+    def export_recipes(self, request):
+        """Выгрузка всех рецептов в JSON Lines (api.recipe_io)."""
+        response = StreamingHttpResponse(
+            export_recipes(lambda name: request.build_absolute_uri(
+                default_storage.url(name))),
+            content_type=CONTENT_TYPE)
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.jsonl"')
+        return response
+
+    @action(
+        detail=False, methods=['post'],
+        permission_classes=(permissions.IsAdminUser,), url_path='import')
+    def import_recipes(self, request):
+        """Загрузка рецептов из JSON Lines.
+
+        Файл передаётся в поле file формы или телом запроса. Рецепты без
+        автора получает текущий пользователь. В ответе - число
+        загруженных рецептов и ошибки по номерам строк.
+        """
+        if request.content_type.startswith('multipart/form-data'):
+            if 'file' not in request.FILES:
+                raise ValidationError({'file': ['Нужен файл JSON Lines.']})
+            lines = request.FILES['file']
+        else:
+            lines = request.stream or ()
+        report = RecipeImporter(default_author=request.user).run(lines)
+        return Response(report, status=(
+            status.HTTP_201_CREATED if report['created']
+            else status.HTTP_400_BAD_REQUEST))
+
+
+class JobViewSet(MetricsMixin, mixins.RetrieveModelMixin,
+                 viewsets.GenericViewSet):
+    """Статус и результат фоновых задач текущего пользователя."""
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user).defer('content')
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, **kwargs):
+        """Скачивание файла, подготовленного задачей."""
+        job = get_object_or_404(
+            Job.objects.filter(user=request.user, status=Job.DONE).exclude(
+                filename=''), pk=kwargs['pk'])
+        response = HttpResponse(
+            bytes(job.content), content_type=job.content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{job.filename}"')
         return response
@@ -0,0 +1,83 @@
+"""
+Общие настройки админки для больших таблиц.
+
+Список объектов в админке считает строки дважды: для пагинатора и для
+«всего N» рядом с поиском. На больших таблицах PostgreSQL каждый COUNT
+читает всю таблицу, поэтому без фильтров число строк берётся из
+статистики планировщика, а полный подсчёт отключён.
+"""
+from django.contrib.admin import ModelAdmin
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+
+# До этого числа строк подсчёт точный: он быстрый, а оценка у
+# маленьких таблиц бывает сильно неточной.
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimate_count(model, using):
+    """Оценка числа строк таблицы по статистике PostgreSQL или None."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 - таблицу ещё не анализировали.
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+def count_related(model, field):
+    """Число строк model, ссылающихся через field на объект списка.
+
+    Подзапрос вычисляется только для строк страницы и идёт по индексу
+    field, в отличие от Count через JOIN, который группирует всю таблицу.
+    """
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(count=Count('pk')).values('count')), 0)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который для всей таблицы без фильтров берёт оценку
+    числа строк вместо COUNT."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where and not queryset.query.distinct:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
+
+
+class DeferringChangeList(ChangeList):
+    """Список объектов без полей из list_defer админки."""
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer(
+            *self.model_admin.list_defer)
+
+
+class LargeTableAdmin(ModelAdmin):
+    """Админка для таблиц, которые растут вместе с числом пользователей
+    и рецептов.
+
+    list_defer - поля, которые не читаются в списке объектов (например,
+    длинный текст), но нужны в форме.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_defer = ()
+
+    def get_changelist(self, request, **kwargs):
+        return DeferringChangeList
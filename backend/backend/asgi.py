@@ -7,10 +7,54 @@ For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
+import asyncio
 import os
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+EVENT_STREAM = b'text/event-stream'
+
+
+class DisconnectMiddleware:
+    """Отмечает отключение клиента во время потока SSE.
+
+    Django 4.2 не читает receive после тела запроса, а сервер молча
+    отбрасывает данные для закрытого соединения, поэтому бесконечный
+    поток (api.async_views.recipe_events) не узнал бы об отключении.
+    После начала ответа text/event-stream middleware ждёт
+    http.disconnect и устанавливает scope['disconnected'].
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        disconnected = scope['disconnected'] = asyncio.Event()
+        watcher = None
+
+        async def watch():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        async def send_watching(message):
+            nonlocal watcher
+            if message['type'] == 'http.response.start' and any(
+                    name.lower() == b'content-type'
+                    and value.startswith(EVENT_STREAM)
+                    for name, value in message['headers']):
+                watcher = asyncio.ensure_future(watch())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_watching)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+
+application = DisconnectMiddleware(get_asgi_application())
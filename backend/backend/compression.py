@@ -0,0 +1,77 @@
+"""
+Сжатие ответов: gzip и, если установлены, brotli и zstd.
+
+Для каждого кодирования есть сжатие целиком (compress) и потоковое
+(compressobj), которое сжимает части ответа по мере их появления.
+"""
+import gzip
+import zlib
+from collections import namedtuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Уровни подобраны для сжатия на лету: заметно быстрее максимальных при
+# почти том же размере на JSON.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+Encoder = namedtuple('Encoder', ('compress', 'compressobj'))
+
+
+class BrotliCompressor:
+    """Потоковый brotli с интерфейсом zlib.compressobj."""
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def gzip_compressobj():
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+# В порядке предпочтения при равных весах в Accept-Encoding.
+ENCODERS = {}
+if brotli is not None:
+    ENCODERS['br'] = Encoder(
+        lambda data: brotli.compress(data, quality=BROTLI_QUALITY),
+        BrotliCompressor)
+if zstandard is not None:
+    ENCODERS['zstd'] = Encoder(
+        lambda data: zstandard.ZstdCompressor(ZSTD_LEVEL).compress(data),
+        lambda: zstandard.ZstdCompressor(ZSTD_LEVEL).compressobj())
+ENCODERS['gzip'] = Encoder(
+    lambda data: gzip.compress(data, GZIP_LEVEL, mtime=0),
+    gzip_compressobj)
+
+
+def compress_stream(content, encoding):
+    compressor = ENCODERS[encoding].compressobj()
+    for chunk in content:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def acompress_stream(content, encoding):
+    compressor = ENCODERS[encoding].compressobj()
+    async for chunk in content:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,304 @@
+"""
+Метрики запросов в памяти процесса.
+
+Для каждого эндпоинта (действия вьюсета) собираются гистограммы
+времени ответа, времени в БД, числа запросов к БД, числа повторяющихся
+запросов и времени сериализации. Перцентили считаются по гистограммам
+на стороне Prometheus (histogram_quantile). Каждый воркер хранит свои
+метрики, поэтому при нескольких воркерах их нужно собирать с каждого.
+"""
+import contextlib
+import hmac
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .postgresql_pool.base import get_pool_stats
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'foodgram_'
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+POOL_COUNTERS = (
+    'connections_created', 'connections_closed', 'checkouts', 'waits',
+    'timeouts', 'health_checks_failed', 'wait_seconds')
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """Эндпоинт выполнил больше запросов к БД, чем разрешено."""
+
+
+class RequestProfile:
+    """Данные об одном запросе."""
+
+    def __init__(self):
+        self.endpoint = None
+        self.duration = 0.0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.statements = Counter()
+        self._serializing = False
+
+    @property
+    def queries(self):
+        return sum(self.statements.values())
+
+    @property
+    def duplicates(self):
+        return self.queries - len(self.statements)
+
+    def add_query(self, sql, params, duration):
+        self.db_time += duration
+        self.statements[sql, repr(params)] += 1
+
+
+def record_query(execute, sql, params, many, context):
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, params, time.perf_counter() - start)
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+def install_query_recorders():
+    """Подключает учёт запросов к уже открытым соединениям потока."""
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(connection)
+
+
+def set_endpoint(endpoint):
+    profile = current_profile.get()
+    if profile is not None:
+        profile.endpoint = endpoint
+
+
+@contextlib.contextmanager
+def measure_serialization():
+    """Учитывает время сериализации в текущем запросе.
+
+    Вложенные замеры не суммируются повторно.
+    """
+    profile = current_profile.get()
+    if profile is None or profile._serializing:
+        yield
+        return
+    profile._serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.serialization_time += time.perf_counter() - start
+        profile._serializing = False
+
+
+timed_serializers = {}
+
+
+def timed_serializer_class(serializer_class):
+    """Возвращает подкласс сериализатора с замером to_representation."""
+    timed = timed_serializers.get(serializer_class)
+    if timed is None:
+        def to_representation(self, instance):
+            with measure_serialization():
+                return super(timed, self).to_representation(instance)
+
+        timed = timed_serializers[serializer_class] = type(
+            serializer_class.__name__, (serializer_class,), {
+                '__module__': serializer_class.__module__,
+                '__qualname__': serializer_class.__qualname__,
+                'to_representation': to_representation})
+    return timed
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield format_value(bound), cumulative
+        yield '+Inf', self.count
+
+
+HISTOGRAMS = (
+    ('request_duration_seconds', 'Время обработки запроса.',
+     DURATION_BUCKETS, 'duration'),
+    ('db_duration_seconds', 'Время выполнения запросов к БД.',
+     DURATION_BUCKETS, 'db_time'),
+    ('db_queries', 'Число запросов к БД.', COUNT_BUCKETS, 'queries'),
+    ('db_duplicate_queries', 'Число повторных одинаковых запросов к БД.',
+     COUNT_BUCKETS, 'duplicates'),
+    ('serialization_duration_seconds', 'Время сериализации.',
+     DURATION_BUCKETS, 'serialization_time'),
+)
+
+
+class Registry:
+    """Метрики процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.collectors = []
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {
+                name: defaultdict(lambda buckets=buckets: Histogram(buckets))
+                for name, _, buckets, _ in HISTOGRAMS}
+            self.requests = Counter()
+            self.budget_exceeded = Counter()
+
+    def observe(self, profile, method, status_code):
+        with self._lock:
+            for name, _, _, attr in HISTOGRAMS:
+                self.histograms[name][profile.endpoint].observe(
+                    getattr(profile, attr))
+            self.requests[
+                profile.endpoint, method, f'{status_code // 100}xx'] += 1
+
+    def add_collector(self, collector):
+        """Добавляет функцию, которая возвращает строки метрик."""
+        self.collectors.append(collector)
+
+    def budget_exceeded_for(self, endpoint):
+        with self._lock:
+            self.budget_exceeded[endpoint] += 1
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        lines = []
+        with self._lock:
+            for key, help_text, _, _ in HISTOGRAMS:
+                name = PREFIX + key
+                lines += [f'# HELP {name} {help_text}',
+                          f'# TYPE {name} histogram']
+                for endpoint, histogram in sorted(
+                        self.histograms[key].items()):
+                    labels = f'endpoint="{escape(endpoint)}"'
+                    lines += [
+                        f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+                        for bound, count in histogram.samples()]
+                    lines += [
+                        f'{name}_sum{{{labels}}} '
+                        f'{format_value(histogram.sum)}',
+                        f'{name}_count{{{labels}}} {histogram.count}']
+            name = PREFIX + 'requests_total'
+            lines += [f'# HELP {name} Число запросов.',
+                      f'# TYPE {name} counter']
+            lines += [
+                f'{name}{{endpoint="{escape(endpoint)}",method="{method}",'
+                f'status="{status}"}} {count}'
+                for (endpoint, method, status), count in sorted(
+                    self.requests.items())]
+            name = PREFIX + 'query_budget_exceeded_total'
+            lines += [f'# HELP {name} Превышения бюджета запросов к БД.',
+                      f'# TYPE {name} counter']
+            lines += [
+                f'{name}{{endpoint="{escape(endpoint)}"}} {count}'
+                for endpoint, count in sorted(self.budget_exceeded.items())]
+        lines += render_pool_stats()
+        for collector in self.collectors:
+            lines += collector()
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_pool_stats():
+    stats = get_pool_stats()
+    if not stats:
+        return []
+    lines = []
+    for key in next(iter(stats.values())):
+        counter = key in POOL_COUNTERS
+        name = f'{PREFIX}db_pool_{key}' + ('_total' if counter else '')
+        lines.append(f'# TYPE {name} {"counter" if counter else "gauge"}')
+        lines += [
+            f'{name}{{alias="{alias}"}} {format_value(values[key])}'
+            for alias, values in sorted(stats.items())]
+    return lines
+
+
+def check_query_budget(profile):
+    """Сообщает о превышении бюджета запросов из QUERY_BUDGETS."""
+    budget = settings.QUERY_BUDGETS.get(profile.endpoint)
+    if budget is None or profile.queries <= budget:
+        return
+    registry.budget_exceeded_for(profile.endpoint)
+    message = (
+        f'{profile.endpoint}: {profile.queries} запросов к БД '
+        f'при бюджете {budget} (повторных: {profile.duplicates})')
+    if settings.QUERY_BUDGET_MODE == 'raise':
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def has_metrics_access(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        auth = request.META.get('HTTP_AUTHORIZATION', '').split()
+        if (len(auth) == 2 and auth[0].lower() == 'bearer'
+                and hmac.compare_digest(auth[1], token)):
+            return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+def metrics_view(request):
+    """Отдаёт метрики по токену METRICS_TOKEN или администратору."""
+    if not has_metrics_access(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,212 @@
+import hashlib
+import random
+import time
+
+from api.mixins import get_match_endpoint
+from api.utils import choose_encoding
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from rest_framework.permissions import SAFE_METHODS
+
+from .compression import ENCODERS, acompress_stream, compress_stream
+from .metrics import (RequestProfile, check_query_budget, current_profile,
+                      install_query_recorders, registry)
+from .profiling import is_signed, sampler, save_profile
+from .routers import use_primary
+
+STICKY_KEY = 'db:primary:{}'
+COMPRESSED_KEY = 'compressed:{}:{}'
+COMPRESSIBLE_TYPES = (
+    'application/javascript',
+    'application/json',
+    'application/x-ndjson',
+    'application/xml',
+    'image/svg+xml',
+    'text/css',
+    'text/csv',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+    'text/xml',
+)
+
+
+def get_client_key(request):
+    """Идентифицирует клиента по токену или сессии без обращения к БД."""
+    credentials = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    if not credentials:
+        return None
+    return STICKY_KEY.format(
+        hashlib.sha256(credentials.encode()).hexdigest())
+
+
+class ReplicaRoutingMiddleware:
+    """Направляет чтения безопасных запросов в реплики.
+
+    После успешного изменяющего запроса клиент на
+    REPLICA_STICKY_SECONDS закрепляется за основной базой, чтобы сразу
+    видеть свои изменения, даже если реплика отстаёт.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+        client_key = get_client_key(request)
+        is_safe = request.method in SAFE_METHODS
+        primary = (
+            not is_safe
+            or request.path.startswith(settings.REPLICA_EXCLUDED_PATHS)
+            or (client_key is not None and cache.get(client_key)))
+        token = use_primary.set(bool(primary))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        if not is_safe and client_key and response.status_code < 400:
+            cache.set(client_key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+
+class MetricsMiddleware:
+    """Собирает метрики запроса: время, запросы к БД и сериализацию.
+
+    Эндпоинт подписывается действием вьюсета (api.mixins.MetricsMixin),
+    для остальных представлений используется имя маршрута. Должен стоять
+    первым, чтобы учитывать время всех остальных слоёв.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_query_recorders()
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        profile.duration = time.perf_counter() - start
+        if profile.endpoint is None:
+            match = request.resolver_match
+            profile.endpoint = match.view_name if match else 'unmatched'
+        registry.observe(profile, request.method, response.status_code)
+        check_query_budget(profile)
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирует выбранные запросы (backend.profiling).
+
+    Запрос профилируется с вероятностью PROFILE_SAMPLE_RATE или по
+    подписанному заголовку X-Profile. Без PROFILE_SAMPLE_RATE и
+    PROFILE_SECRET middleware отключается при запуске. Стоит сразу после
+    MetricsMiddleware, чтобы взять имя эндпоинта из метрик запроса.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILE_SAMPLE_RATE and not settings.PROFILE_SECRET:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (random.random() < settings.PROFILE_SAMPLE_RATE
+                or is_signed(request)):
+            return self.get_response(request)
+        stacks = sampler.start(ProfilingMiddleware.__call__.__code__)
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        save_profile(self.get_endpoint(request), stacks)
+        return response
+
+    def get_endpoint(self, request):
+        profile = current_profile.get()
+        if profile is not None and profile.endpoint is not None:
+            return profile.endpoint
+        match = request.resolver_match
+        if match is None:
+            return 'unmatched'
+        return get_match_endpoint(match, request.method)
+
+
+class CompressionMiddleware:
+    """Сжимает ответы gzip, brotli или zstd по заголовку Accept-Encoding.
+
+    Потоковые ответы сжимаются по частям, по мере отдачи. Ответы с ETag
+    (их содержимое повторяется от запроса к запросу) сжимаются один раз:
+    сжатый вариант хранится в кеше по хешу содержимого. Не сжимаются
+    маленькие ответы, уже сжатые (справочники), ответы с no-transform и
+    страницы с CSRF-токеном (защита от BREACH).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.is_compressible(request, response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''), ENCODERS)
+        if encoding == 'identity':
+            return response
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(
+                    response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_stream(
+                    response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            content = self.compress(response, encoding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # Сжатое представление не совпадает побайтно с исходным.
+            response['ETag'] = f'W/{etag}'
+        response['Content-Encoding'] = encoding
+        return response
+
+    def is_compressible(self, request, response):
+        # Ключ появляется, когда в ответ выводится CSRF-токен (get_token).
+        if (not 200 <= response.status_code < 300
+                or response.status_code in (204, 206)
+                or response.has_header('Content-Encoding')
+                or 'CSRF_COOKIE_NEEDS_UPDATE' in request.META
+                or 'no-transform' in response.get('Cache-Control', '')):
+            return False
+        content_type = response.get('Content-Type', '').partition(';')[0]
+        if content_type.strip().lower() not in COMPRESSIBLE_TYPES:
+            return False
+        return (response.streaming
+                or len(response.content) >= settings.COMPRESSION_MIN_SIZE)
+
+    def compress(self, response, encoding):
+        compress = ENCODERS[encoding].compress
+        if not response.has_header('ETag'):
+            return compress(response.content)
+        key = COMPRESSED_KEY.format(
+            encoding, hashlib.sha256(response.content).hexdigest())
+        content = cache.get(key)
+        if content is None:
+            content = compress(response.content)
+            if len(content) <= settings.COMPRESSION_CACHE_MAX_SIZE:
+                cache.set(key, content, settings.COMPRESSION_CACHE_TIMEOUT)
+        return content
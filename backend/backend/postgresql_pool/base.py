@@ -0,0 +1,271 @@
+"""
+Бэкенд PostgreSQL с пулом соединений внутри процесса.
+
+Django открывает новое соединение на каждый запрос при CONN_MAX_AGE = 0
+и держит по соединению на поток в остальных случаях. Этот бэкенд держит
+общий для всех потоков процесса пул соединений на каждый алиас БД:
+закрытие соединения Django возвращает его в пул.
+
+Параметры пула берутся из ключа POOL настроек базы данных:
+MAX_SIZE, TIMEOUT (сколько секунд ждать свободное соединение),
+MAX_LIFETIME (время жизни соединения в секундах) и HEALTH_CHECK_AFTER
+(через сколько секунд простоя соединение проверяется перед выдачей).
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+IDLE_TRANSACTION_STATUS = 0
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+CREATE = object()
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class Waiter:
+    """Поток, ожидающий соединение."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.connection = None
+
+
+class ConnectionPool:
+    """Пул соединений одной базы данных."""
+
+    def __init__(self, alias, max_size=10, timeout=10, max_lifetime=3600,
+                 health_check_after=30):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self.pid = os.getpid()
+        self._idle = deque()
+        self._waiters = deque()
+        self._created_at = {}
+        self._size = 0
+        self._condition = threading.Condition()
+        self.counters = dict.fromkeys((
+            'connections_created', 'connections_closed', 'checkouts',
+            'waits', 'timeouts', 'health_checks_failed'), 0)
+        self.wait_seconds = 0.0
+
+    def _forget(self, connection):
+        """Убирает соединение из учёта пула, вызывается под блокировкой."""
+        self._created_at.pop(id(connection), None)
+        self.counters['connections_closed'] += 1
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _discard(self, connection):
+        self._forget(connection)
+        self._close(connection)
+
+    def _is_expired(self, connection, now):
+        created_at = self._created_at.get(id(connection), now)
+        return now - created_at >= self.max_lifetime
+
+    @staticmethod
+    def _is_alive(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:
+            return False
+        return True
+
+    def getconn(self, connect):
+        """Выдаёт соединение из пула или создаёт новое через connect.
+
+        Если пул исчерпан, поток встаёт в очередь: освободившиеся
+        соединения передаются ожидающим в порядке очереди. Соединения,
+        простоявшие дольше health_check_after, проверяются запросом
+        уже без блокировки пула.
+        """
+        stale = []
+        with self._condition:
+            connection, check = self._take_idle(stale)
+            if connection is None and self._size >= self.max_size:
+                connection = self._wait()
+            elif connection is None:
+                self._size += 1
+                connection = CREATE
+        for old in stale:
+            self._close(old)
+        if connection is not CREATE:
+            if not check or self._is_alive(connection):
+                with self._condition:
+                    self.counters['checkouts'] += 1
+                return connection
+            # Место в пуле остаётся за потоком: вместо не прошедшего
+            # проверку соединения открывается новое.
+            with self._condition:
+                self.counters['health_checks_failed'] += 1
+                self._forget(connection)
+            self._close(connection)
+        try:
+            connection = connect()
+        except Exception:
+            with self._condition:
+                self._release_slot()
+            raise
+        with self._condition:
+            self._created_at[id(connection)] = time.monotonic()
+            self.counters['connections_created'] += 1
+            self.counters['checkouts'] += 1
+        return connection
+
+    def _take_idle(self, stale):
+        """Забирает последнее вернувшееся соединение, вызывается под
+        блокировкой.
+
+        Возвращает соединение и признак, нужна ли ему проверка, или
+        (None, False). Закрытые и устаревшие соединения убираются из пула
+        и складываются в stale, закрывать их надо уже без блокировки.
+        """
+        now = time.monotonic()
+        while self._idle and not self._waiters:
+            connection, idle_since = self._idle.pop()
+            if connection.closed or self._is_expired(connection, now):
+                self._size -= 1
+                self._forget(connection)
+                stale.append(connection)
+                continue
+            return connection, now - idle_since >= self.health_check_after
+        return None, False
+
+    def _wait(self):
+        """Ждёт соединение в очереди, вызывается под блокировкой."""
+        self.counters['waits'] += 1
+        waiter = Waiter()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        self._condition.release()
+        try:
+            waiter.event.wait(self.timeout)
+        finally:
+            self._condition.acquire()
+        self.wait_seconds += time.monotonic() - started
+        if waiter.connection is None:
+            self._waiters.remove(waiter)
+            self.counters['timeouts'] += 1
+            raise PoolTimeout(
+                f'No free connection in pool "{self.alias}" '
+                f'after {self.timeout} seconds.')
+        return waiter.connection
+
+    def _release_slot(self):
+        """Освобождает место в пуле или отдаёт его ожидающему потоку."""
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.connection = CREATE
+            waiter.event.set()
+        else:
+            self._size -= 1
+
+    def putconn(self, connection):
+        """Возвращает соединение в пул.
+
+        Соединения с незавершённой транзакцией откатываются, закрытые
+        и устаревшие соединения выбрасываются.
+        """
+        now = time.monotonic()
+        reusable = not connection.closed and not self._is_expired(
+            connection, now)
+        if reusable and (connection.info.transaction_status
+                         != IDLE_TRANSACTION_STATUS):
+            try:
+                connection.rollback()
+            except Exception:
+                reusable = False
+        with self._condition:
+            if not reusable:
+                self._discard(connection)
+                self._release_slot()
+            elif self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.connection = connection
+                waiter.event.set()
+            else:
+                self._idle.append((connection, now))
+
+    def close(self):
+        with self._condition:
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self._size -= 1
+                self._discard(connection)
+
+    def stats(self):
+        with self._condition:
+            return {
+                **self.counters,
+                'size': self._size,
+                'idle': len(self._idle),
+                'waiting': len(self._waiters),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+                'wait_seconds': self.wait_seconds,
+            }
+
+
+def get_pool(alias, options):
+    """Возвращает пул алиаса, создавая его при первом обращении.
+
+    После fork пул родительского процесса не используется.
+    """
+    pool = pools.get(alias)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with pools_lock:
+        pool = pools.get(alias)
+        if pool is None or pool.pid != os.getpid():
+            pool = pools[alias] = ConnectionPool(
+                alias,
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 10),
+                max_lifetime=options.get('MAX_LIFETIME', 3600),
+                health_check_after=options.get('HEALTH_CHECK_AFTER', 30))
+    return pool
+
+
+def get_pool_stats():
+    """Статистика всех пулов процесса по алиасам."""
+    return {alias: pool.stats() for alias, pool in pools.items()}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict.get('POOL', {}))
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = IsolationLevel(
+            options.get('isolation_level', IsolationLevel.READ_COMMITTED))
+        return self.pool.getconn(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params))
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
@@ -0,0 +1,150 @@
+"""
+Статистический профилировщик запросов.
+
+Профилируется доля PROFILE_SAMPLE_RATE запросов и запросы с заголовком
+X-Profile, подписанным PROFILE_SECRET (см. sign). Пока идёт хотя бы
+один профилируемый запрос, поток процесса раз в PROFILE_INTERVAL
+секунд снимает стеки их потоков через sys._current_frames; сам запрос
+не трассируется, поэтому замедляется только на время снятия стеков.
+
+Стеки складываются в формате collapsed (кадры через ';' и число
+выборок) по эндпоинтам, как в метриках: RecipeViewSet.list и т.д.
+Каждый процесс дописывает свои файлы в PROFILE_DIR, команда
+dump_profiles объединяет их для flamegraph.pl или speedscope.
+"""
+import hashlib
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+HEADER = 'HTTP_X_PROFILE'
+SUFFIX = '.collapsed'
+UNSAFE_CHARS = re.compile(r'[^\w.-]')
+
+
+def get_signature(path, expires):
+    return hmac.new(
+        settings.PROFILE_SECRET.encode(), f'{expires}:{path}'.encode(),
+        hashlib.sha256).hexdigest()
+
+
+def sign(path, ttl):
+    """Значение заголовка X-Profile для пути, действует ttl секунд."""
+    expires = int(time.time()) + ttl
+    return f'{expires}.{get_signature(path, expires)}'
+
+
+def is_signed(request):
+    value = request.META.get(HEADER)
+    if not value or not settings.PROFILE_SECRET:
+        return False
+    expires, _, signature = value.partition('.')
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(
+        signature, get_signature(request.path, expires))
+
+
+def collapse(frame, root):
+    """Стек от кадра root (не включая его) до frame: модуль:функция."""
+    names = []
+    while frame is not None and frame.f_code is not root:
+        names.append(
+            f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """Снимает стеки профилируемых потоков процесса.
+
+    Поток выборки запускается при первом профилируемом запросе и спит,
+    пока таких запросов нет.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._thread = None
+
+    def start(self, root):
+        """Начинает профилировать текущий поток от кадра с кодом root."""
+        stacks = Counter()
+        with self._lock:
+            self._sessions[threading.get_ident()] = root, stacks
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self.run, name='profiler', daemon=True)
+                self._thread.start()
+            self._active.set()
+        return stacks
+
+    def stop(self):
+        with self._lock:
+            self._sessions.pop(threading.get_ident(), None)
+
+    def run(self):
+        while True:
+            self._active.wait()
+            time.sleep(settings.PROFILE_INTERVAL)
+            with self._lock:
+                if not self._sessions:
+                    self._active.clear()
+                    continue
+                frames = sys._current_frames()
+                for thread_id, (root, stacks) in self._sessions.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[collapse(frame, root)] += 1
+
+
+sampler = Sampler()
+
+write_lock = threading.Lock()
+
+
+def save_profile(endpoint, stacks):
+    """Дописывает стеки запроса в файл эндпоинта этого процесса."""
+    if not stacks:
+        return
+    directory = Path(settings.PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / (
+        f'{UNSAFE_CHARS.sub("_", endpoint)}.{os.getpid()}{SUFFIX}')
+    data = ''.join(f'{stack} {count}\n' for stack, count in stacks.items())
+    with write_lock, open(path, 'a') as file:
+        file.write(data)
+
+
+def read_profiles(reset=False):
+    """Стеки всех процессов по эндпоинтам.
+
+    С reset файлы удаляются; перед чтением они переименовываются, чтобы
+    то, что процессы допишут во время чтения, попало в новые файлы.
+    """
+    profiles = {}
+    directory = Path(settings.PROFILE_DIR)
+    if not directory.is_dir():
+        return profiles
+    for path in sorted(directory.glob(f'*{SUFFIX}')):
+        endpoint = path.name[:-len(SUFFIX)].rsplit('.', 1)[0]
+        if reset:
+            taken = path.with_name(path.name + '.dump')
+            os.replace(path, taken)
+            path = taken
+        stacks = profiles.setdefault(endpoint, Counter())
+        with open(path) as file:
+            for line in file:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                stacks[stack] += int(count)
+        if reset:
+            path.unlink()
+    return profiles
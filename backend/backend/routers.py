@@ -0,0 +1,45 @@
+"""
+Маршрутизация запросов к БД между основной базой и репликами.
+
+Записи всегда идут в основную базу. Чтения идут в случайную реплику из
+REPLICA_DATABASES, если текущий запрос не закреплён за основной базой
+(см. backend.middleware.ReplicaRoutingMiddleware) и не выполняется
+внутри транзакции. Вне HTTP-запросов (команды, shell) используется
+основная база.
+
+Для локальной проверки достаточно двух баз SQLite, где вторая - копия
+первой:
+
+    DATABASES['replica_0'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES = ['replica_0']
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+use_primary = ContextVar('use_primary', default=True)
+
+PRIMARY_ONLY_APPS = ('authtoken', 'jobs', 'sessions')
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if (use_primary.get()
+                or not settings.REPLICA_DATABASES
+                or model._meta.app_label in PRIMARY_ONLY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
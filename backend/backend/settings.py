@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 
+from django.conf import global_settings
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -32,6 +33,8 @@ INSTALLED_APPS = [
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
     'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
+    'outbox.apps.OutboxConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -46,7 +49,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.middleware.MetricsMiddleware',
+    'backend.middleware.ProfilingMiddleware',
+    'backend.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'backend.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -63,10 +70,170 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+
+    # Клиенты приходят через nginx (infra/nginx.conf): адрес клиента для
+    # ограничений частоты берётся из X-Forwarded-For, который ставит
+    # nginx. Без прокси перед бэкендом нужно NUM_PROXIES=0, иначе
+    # клиент может подставить любой адрес.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
+
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.UserRateThrottle',
+        'api.throttling.EndpointRateThrottle',
+    ],
+
+    # Ставки корзин токенов (api.throttling): запас запросов и период,
+    # за который он восполняется. Пустая ставка снимает ограничение.
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.getenv('THROTTLE_RATE_ANON', '600/min'),
+        'user': os.getenv('THROTTLE_RATE_USER', '1200/min'),
+        'shopping_cart': os.getenv('THROTTLE_RATE_SHOPPING_CART', '20/min'),
+        'subscriptions': os.getenv('THROTTLE_RATE_SUBSCRIPTIONS', '120/min'),
+    },
+
+    'EXCEPTION_HANDLER': 'api.exceptions.exception_handler',
 }
 
+# Одновременные запросы к дорогим эндпоинтам (api.throttling):
+# (на процесс, от одного клиента). Сверх лимита процесса и при занятом
+# пуле соединений отвечает 503, сверх лимита клиента - 429.
+
+CONCURRENCY_LIMITS = {
+    'RecipeViewSet.list': (32, 4),
+    'RecipeViewSet.download_shopping_cart': (4, 1),
+    'UserViewSet.subscriptions': (8, 2),
+    'RecipeViewSet.import_recipes': (2, 1),
+    'RecipeViewSet.export_recipes': (2, 1),
+    'RecipeViewSet.events': (1000, 3),
+}
+
+# Через сколько секунд повторить запрос после 503 или 429 из-за
+# перегрузки (заголовок Retry-After).
+OVERLOAD_RETRY_AFTER = 5
+
+# Кеш токенов и пользователей для аутентификации (api.authentication).
+
+AUTH_CACHE_TIMEOUT = int(os.getenv('AUTH_CACHE_TIMEOUT', 300))
+
+AUTH_CACHE_LOCAL_TIMEOUT = int(os.getenv('AUTH_CACHE_LOCAL_TIMEOUT', 5))
+
+AUTH_CACHE_LOCAL_MAX_SIZE = 10000
+
+# Кеш id избранного, списка покупок и подписок пользователя
+# (api.relations). Ключи версионные, поэтому время жизни ограничивает
+# только память. Пользователь, у которого отношений больше
+# RELATIONS_CACHE_MAX_IDS, не кешируется: в кеше процесса на него
+# приходится не больше RELATIONS_CACHE_MAX_IDS * 8 байт.
+
+RELATIONS_CACHE_TIMEOUT = int(os.getenv('RELATIONS_CACHE_TIMEOUT', 60 * 60))
+
+RELATIONS_CACHE_LOCAL_TIMEOUT = int(
+    os.getenv('RELATIONS_CACHE_LOCAL_TIMEOUT', 300))
+
+RELATIONS_CACHE_LOCAL_MAX_SIZE = int(
+    os.getenv('RELATIONS_CACHE_LOCAL_MAX_SIZE', 1000))
+
+RELATIONS_CACHE_MAX_IDS = int(os.getenv('RELATIONS_CACHE_MAX_IDS', 10000))
+
+# Метрики запросов (backend.metrics), доступны по /metrics/ с токеном
+# METRICS_TOKEN в заголовке Authorization: Bearer или администратору.
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Профилирование запросов (backend.profiling): доля PROFILE_SAMPLE_RATE
+# и запросы с заголовком X-Profile, подписанным PROFILE_SECRET (команда
+# dump_profiles --sign). Стеки снимаются раз в PROFILE_INTERVAL секунд и
+# копятся в PROFILE_DIR до выгрузки командой dump_profiles.
+
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+
+PROFILE_SECRET = os.getenv('PROFILE_SECRET', '')
+
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.005))
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', BASE_DIR / 'profiles')
+
+# Максимальное число запросов к БД на эндпоинт (для страницы размера по
+# умолчанию): запросы при прогретых кешах из снимка
+# api/query_snapshots плюс 4 на промах кеша токена и отношений
+# пользователя, команда query_snapshots проверяет это. При превышении
+# пишется предупреждение в лог, а в режиме raise (для тестов)
+# выбрасывается исключение.
+
+QUERY_BUDGETS = {
+    'RecipeViewSet.list': 10,
+    'RecipeViewSet.retrieve': 8,
+    'RecipeViewSet.download_shopping_cart': 5,
+    'IngredientViewSet.list': 5,
+    'TagViewSet.list': 4,
+    'UserViewSet.me': 4,
+    'UserViewSet.subscriptions': 7,
+}
+
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'log')
+
+# Сжатие ответов (backend.middleware.CompressionMiddleware). Ответы
+# меньше COMPRESSION_MIN_SIZE байт отдаются как есть. Сжатые варианты
+# ответов с ETag хранятся в кеше, если они не больше
+# COMPRESSION_CACHE_MAX_SIZE байт.
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+
+COMPRESSION_CACHE_TIMEOUT = 60 * 60
+
+COMPRESSION_CACHE_MAX_SIZE = 2 ** 20
+
+# Фоновые задачи (jobs.queue). worker - задачи выполняет команда
+# run_jobs, thread - пул потоков веб-процесса (для разработки), sync -
+# сразу в запросе после коммита.
+
+JOBS_MODE = os.getenv('JOBS_MODE', 'worker')
+
+JOBS_THREADS = int(os.getenv('JOBS_THREADS', 2))
+
+# Через сколько секунд задачу пропавшего воркера можно запустить снова.
+JOBS_TIMEOUT = int(os.getenv('JOBS_TIMEOUT', 300))
+
+# Задержка перед первым повтором, дальше она удваивается.
+JOBS_RETRY_DELAY = 10
+
+# Сколько секунд хранятся результаты завершённых задач.
+JOBS_RESULT_TTL = int(os.getenv('JOBS_RESULT_TTL', 60 * 60 * 24))
+
+JOBS_METRICS_WINDOW = 60 * 15
+
+# Журнал событий (outbox). Пропуск в id событий считается откатом
+# транзакции через OUTBOX_GAP_TIMEOUT секунд - это время должно быть
+# больше самой долгой транзакции записи. Доставленные события хранятся
+# OUTBOX_RETENTION секунд, их можно повторить (drain_outbox
+# --replay-from).
+
+OUTBOX_GAP_TIMEOUT = int(os.getenv('OUTBOX_GAP_TIMEOUT', 60))
+
+OUTBOX_RETENTION = int(os.getenv('OUTBOX_RETENTION', 60 * 60 * 24 * 7))
+
+# Шрифт с кириллицей для PDF со списком покупок.
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
 
 TEMPLATES = [
     {
@@ -86,6 +253,13 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# Асинхронные представления для чтения (api.async_views), имеет смысл
+# включать только при запуске под ASGI-сервером.
+
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
+
+ASYNC_DB_CONCURRENCY = int(os.getenv('ASYNC_DB_CONCURRENCY', 10))
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -98,14 +272,90 @@ DATABASES = {
 }
 
 """
+# DB_POOL включает пул соединений внутри процесса (backend.postgresql_pool),
+# иначе соединения переиспользуются потоком в течение DB_CONN_MAX_AGE секунд.
+# Под ASGI каждый запрос выполняется в своём потоке, поэтому постоянные
+# соединения там отключаются: вместо них нужно использовать пул.
+
+DB_POOL = os.getenv('DB_POOL', 'False').lower() == 'true'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': (
+            'backend.postgresql_pool' if DB_POOL
+            else 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': 0 if DB_POOL or ASYNC_VIEWS else int(
+            os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': {
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'MAX_LIFETIME': float(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),
+            'HEALTH_CHECK_AFTER': float(
+                os.getenv('DB_POOL_HEALTH_CHECK_AFTER', 30)),
+        },
+    }
+}
+
+# Реплики для чтения: DB_REPLICA_HOSTS - хосты через запятую.
+# После записи клиент читает из основной базы DB_REPLICA_STICKY_SECONDS.
+
+REPLICA_DATABASES = []
+
+for index, host in enumerate(filter(None, os.getenv(
+        'DB_REPLICA_HOSTS', '').split(','))):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 10))
+
+REPLICA_EXCLUDED_PATHS = ('/admin/',)
+
+DATABASE_ROUTERS = ['backend.routers.ReplicaRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Версии закешированных данных должны быть общими для всех воркеров,
+# поэтому в production нужен общий кеш (REDIS_URL).
+
+REDIS_URL = os.getenv('REDIS_URL')
+
+# Где хранятся корзины токенов: cache - общий кеш, local - память
+# процесса (лимиты тогда действуют на каждый процесс отдельно).
+
+THROTTLE_BACKEND = os.getenv(
+    'THROTTLE_BACKEND', 'cache' if REDIS_URL else 'local')
+
+THROTTLE_LOCAL_MAX_SIZE = 100000
+
+# Уведомления о новых рецептах (api.notifications): redis - через канал
+# Redis всем процессам, local - только подключениям своего процесса.
+
+NOTIFICATIONS_BACKEND = os.getenv(
+    'NOTIFICATIONS_BACKEND', 'redis' if REDIS_URL else 'local')
+
+# Интервал heartbeat и время жизни подключения SSE в секундах.
+
+NOTIFICATIONS_HEARTBEAT = int(os.getenv('NOTIFICATIONS_HEARTBEAT', 15))
+
+NOTIFICATIONS_MAX_AGE = int(os.getenv('NOTIFICATIONS_MAX_AGE', 60 * 60))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
@@ -129,6 +379,20 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Первый хешер используется для новых паролей, остальные - для проверки
+# уже сохранённых. Для тестов и заполнения базы можно взять быстрый:
+# PASSWORD_HASHER=django.contrib.auth.hashers.MD5PasswordHasher. В
+# продакшене переменную не задают: при входе пароль перехешируется
+# первым хешером.
+
+PASSWORD_HASHER = os.getenv(
+    'PASSWORD_HASHER', global_settings.PASSWORD_HASHERS[0])
+
+PASSWORD_HASHERS = [PASSWORD_HASHER] + [
+    hasher for hasher in global_settings.PASSWORD_HASHERS
+    if hasher != PASSWORD_HASHER]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
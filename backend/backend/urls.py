@@ -1,9 +1,16 @@
+from api import async_views
 from api.utils import recipe_redirection
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('s/<str:short_link>', recipe_redirection),
+    path('metrics/', metrics_view, name='metrics'),
+    path('s/<str:short_link>', (
+        async_views.recipe_redirection if settings.ASYNC_VIEWS
+        else recipe_redirection)),
 ]
@@ -0,0 +1,26 @@
+from backend.admin import LargeTableAdmin
+from django.contrib import admin
+from django.contrib.admin import register
+
+from .models import Job
+
+
+@register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = (
+        'pk', 'name', 'status', 'priority', 'attempts', 'user',
+        'created_at', 'wait', 'duration')
+    list_filter = ('status', 'name')
+    search_fields = ('name',)
+    raw_id_fields = ('user',)
+    exclude = ('content',)
+
+    @admin.display(description='Ожидание')
+    def wait(self, obj):
+        if obj.started_at:
+            return obj.started_at - obj.created_at
+
+    @admin.display(description='Выполнение')
+    def duration(self, obj):
+        if obj.started_at and obj.finished_at:
+            return obj.finished_at - obj.started_at
@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class JobsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'jobs'
+    verbose_name = 'Фоновые задачи'
+
+    def ready(self):
+        from backend.metrics import registry
+        from django.utils.module_loading import autodiscover_modules
+
+        from .metrics import render_job_stats
+
+        autodiscover_modules('tasks')
+        registry.add_collector(render_job_stats)
@@ -0,0 +1,93 @@
+import signal
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from jobs.models import Job
+from jobs.queue import claim, purge_finished, run_job
+
+PURGE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs from the database queue. Several workers "
+        "can run at once. SIGTERM and SIGINT stop the worker after the "
+        "current job.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when there are no jobs ready to run')
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Seconds to wait when the queue is empty')
+        parser.add_argument(
+            '--max-jobs', type=int, default=0,
+            help='Exit after this many jobs (0 - no limit)')
+        parser.add_argument(
+            '--stats-interval', type=float, default=60.0,
+            help='Seconds between throughput and latency reports')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.reset_stats()
+        processed = 0
+        purged_at = 0
+        while not self.stopping:
+            close_old_connections()
+            if time.monotonic() - purged_at > PURGE_INTERVAL:
+                purge_finished()
+                purged_at = time.monotonic()
+            job = claim()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+            else:
+                self.run(job)
+                processed += 1
+                if processed == options['max_jobs']:
+                    break
+            if time.monotonic() - self.stats_started > options[
+                    'stats_interval']:
+                self.report()
+        self.report()
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def run(self, job):
+        started = time.monotonic()
+        run_job(job)
+        duration = time.monotonic() - started
+        status = job.status
+        if status == Job.QUEUED:
+            status = 'retried'
+        self.stats[status] += 1
+        self.wait += (job.started_at - job.created_at).total_seconds()
+        self.duration += duration
+        self.stdout.write(
+            f'{job.name} #{job.pk}: {status} in {duration:.3f} s')
+
+    def reset_stats(self):
+        self.stats = Counter()
+        self.wait = 0.0
+        self.duration = 0.0
+        self.stats_started = time.monotonic()
+
+    def report(self):
+        count = sum(self.stats.values())
+        if count:
+            elapsed = time.monotonic() - self.stats_started
+            self.stdout.write(
+                f'{count} jobs in {elapsed:.0f} s '
+                f'({count / elapsed:.2f} jobs/s): '
+                + ', '.join(f'{status} {number}' for status, number in sorted(
+                    self.stats.items()))
+                + f'; avg wait {self.wait / count:.3f} s, '
+                f'avg run {self.duration / count:.3f} s')
+        self.reset_stats()
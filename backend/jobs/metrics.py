@@ -0,0 +1,69 @@
+"""
+Метрики очереди задач для /metrics/.
+
+Задачи выполняются в других процессах (run_jobs), поэтому метрики
+считаются по таблице задач: размер очереди, возраст самой старой
+ожидающей задачи, а также число, среднее ожидание и среднее время
+выполнения задач, завершённых за последние JOBS_METRICS_WINDOW секунд.
+"""
+from datetime import timedelta
+
+from backend.metrics import PREFIX, escape, format_value
+from django.conf import settings
+from django.db.models import Avg, Count, DurationField, F, Min
+from django.utils import timezone
+
+from .models import Job
+
+
+def seconds(duration):
+    return 0.0 if duration is None else duration.total_seconds()
+
+
+def render_job_stats():
+    now = timezone.now()
+    lines = []
+    name = PREFIX + 'jobs'
+    lines += [f'# HELP {name} Задачи в таблице по статусам.',
+              f'# TYPE {name} gauge']
+    lines += [
+        f'{name}{{name="{escape(row["name"])}",status="{row["status"]}"}} '
+        f'{row["count"]}'
+        for row in Job.objects.order_by().values('name', 'status').annotate(
+            count=Count('pk')).order_by('name', 'status')]
+
+    oldest = Job.objects.filter(
+        status=Job.QUEUED, run_after__lte=now).aggregate(
+        oldest=Min('run_after'))['oldest']
+    age = seconds(now - oldest) if oldest else 0.0
+    name = PREFIX + 'jobs_oldest_queued_seconds'
+    lines += [f'# HELP {name} Сколько ждёт самая старая задача в очереди.',
+              f'# TYPE {name} gauge',
+              f'{name} {format_value(age)}']
+
+    finished = Job.objects.filter(
+        finished_at__gte=now - timedelta(
+            seconds=settings.JOBS_METRICS_WINDOW)).order_by().values(
+        'name', 'status').annotate(
+        count=Count('pk'),
+        wait=Avg(F('started_at') - F('created_at'),
+                 output_field=DurationField()),
+        run=Avg(F('finished_at') - F('started_at'),
+                output_field=DurationField())).order_by('name', 'status')
+    stats = (
+        ('jobs_finished_recent', 'Задачи, завершённые за окно метрик.',
+         lambda row: row['count']),
+        ('jobs_wait_seconds_avg', 'Среднее ожидание запуска задачи.',
+         lambda row: format_value(seconds(row['wait']))),
+        ('jobs_run_seconds_avg', 'Среднее время выполнения задачи.',
+         lambda row: format_value(seconds(row['run']))),
+    )
+    rows = list(finished)
+    for key, help_text, get_value in stats:
+        name = PREFIX + key
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+        lines += [
+            f'{name}{{name="{escape(row["name"])}",status="{row["status"]}"}}'
+            f' {get_value(row)}'
+            for row in rows]
+    return lines
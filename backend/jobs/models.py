@@ -0,0 +1,74 @@
+from api.constants import (JOB_CONTENT_TYPE_MAX_LENGTH,
+                           JOB_FILENAME_MAX_LENGTH, JOB_MAX_ATTEMPTS,
+                           JOB_NAME_MAX_LENGTH, JOB_STATUS_MAX_LENGTH)
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.utils import timezone
+
+User = get_user_model()
+
+
+class Job(models.Model):
+    """Фоновая задача.
+
+    Задачи выбираются воркером по убыванию приоритета и времени, с
+    которого их можно запускать. Результат хранится в result (JSON) или,
+    для файлов, в content.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        max_length=JOB_NAME_MAX_LENGTH, verbose_name='Задача')
+    kwargs = models.JSONField(default=dict, verbose_name='Аргументы')
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='jobs', verbose_name='Пользователь')
+    priority = models.SmallIntegerField(default=0, verbose_name='Приоритет')
+    status = models.CharField(
+        max_length=JOB_STATUS_MAX_LENGTH, choices=STATUSES, default=QUEUED,
+        verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(
+        default=0, verbose_name='Попытки')
+    max_attempts = models.PositiveSmallIntegerField(
+        default=JOB_MAX_ATTEMPTS, verbose_name='Максимум попыток')
+    run_after = models.DateTimeField(
+        default=timezone.now, verbose_name='Запустить после')
+    locked_until = models.DateTimeField(
+        null=True, blank=True, verbose_name='Занята до')
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name='Дата создания')
+    started_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Дата запуска')
+    finished_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Дата завершения')
+    result = models.JSONField(null=True, blank=True, verbose_name='Результат')
+    content = models.BinaryField(null=True, blank=True, verbose_name='Файл')
+    content_type = models.CharField(
+        max_length=JOB_CONTENT_TYPE_MAX_LENGTH, blank=True,
+        verbose_name='Тип файла')
+    filename = models.CharField(
+        max_length=JOB_FILENAME_MAX_LENGTH, blank=True,
+        verbose_name='Имя файла')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+
+    class Meta:
+        ordering = ('-created_at',)
+        verbose_name = 'задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(
+                fields=['status', '-priority', 'run_after'],
+                name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
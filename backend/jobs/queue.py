@@ -0,0 +1,199 @@
+"""
+Очередь фоновых задач в БД.
+
+Задача - функция, зарегистрированная декоратором task в модуле tasks
+любого приложения. enqueue сохраняет Job, а выполняет его, в
+зависимости от JOBS_MODE:
+
+- worker - отдельный процесс, команда run_jobs (по умолчанию);
+- thread - пул потоков текущего процесса, для разработки;
+- sync - сам вызывающий код сразу после коммита транзакции.
+
+Брокер не нужен: воркеры забирают задачи через SELECT ... FOR UPDATE
+SKIP LOCKED и условный UPDATE, поэтому одну задачу не выполнят двое.
+Задача, воркер которой пропал, снова становится доступной через
+JOBS_TIMEOUT секунд, а если попытки кончились - помечается ошибкой.
+"""
+import logging
+import threading
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from api.constants import JOB_MAX_ATTEMPTS
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+JobFile = namedtuple('JobFile', ('content', 'content_type', 'filename'))
+
+tasks = {}
+
+executor = None
+executor_lock = threading.Lock()
+
+
+class Task:
+    """Зарегистрированная фоновая задача."""
+
+    def __init__(self, func, name, priority, max_attempts):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def enqueue(self, user=None, priority=None, **kwargs):
+        return enqueue(self, user=user, priority=priority, **kwargs)
+
+
+def task(name=None, priority=0, max_attempts=JOB_MAX_ATTEMPTS):
+    """Регистрирует функцию как фоновую задачу.
+
+    Аргументы задачи передаются по имени и должны сериализоваться в
+    JSON. Функция возвращает JSON-совместимый результат или JobFile.
+    """
+    def decorator(func):
+        registered = Task(
+            func, name or f'{func.__module__}.{func.__name__}', priority,
+            max_attempts)
+        tasks[registered.name] = registered
+        return registered
+    return decorator
+
+
+def enqueue(task, user=None, priority=None, **kwargs):
+    job = Job.objects.create(
+        name=task.name, kwargs=kwargs, user=user,
+        priority=task.priority if priority is None else priority,
+        max_attempts=task.max_attempts)
+    if settings.JOBS_MODE == 'thread':
+        transaction.on_commit(
+            lambda: get_executor().submit(run_in_thread, job.pk))
+    elif settings.JOBS_MODE == 'sync':
+        transaction.on_commit(lambda: run_now(job))
+    return job
+
+
+def get_executor():
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                settings.JOBS_THREADS, thread_name_prefix='jobs')
+    return executor
+
+
+def run_pending(pk):
+    job = claim(pk)
+    if job is not None:
+        run_job(job)
+
+
+def run_in_thread(pk):
+    close_old_connections()
+    try:
+        run_pending(pk)
+    finally:
+        connections.close_all()
+
+
+def run_now(job):
+    run_pending(job.pk)
+    job.refresh_from_db()
+
+
+def claim(pk=None):
+    """Забирает готовую к запуску задачу с наибольшим приоритетом.
+
+    Возвращает None, если задач нет или задачу pk уже забрали.
+    Зависшие задачи, у которых попытки кончились, помечаются ошибкой, а
+    не забираются снова.
+    """
+    while True:
+        now = timezone.now()
+        expired = Q(status=Job.RUNNING, locked_until__lt=now)
+        queryset = Job.objects.filter(
+            Q(status=Job.QUEUED, run_after__lte=now)
+            | expired & Q(attempts__lt=F('max_attempts')))
+        if pk is not None:
+            queryset = queryset.filter(pk=pk)
+        with transaction.atomic():
+            failed = Job.objects.filter(
+                expired, attempts__gte=F('max_attempts'),
+            ).update(
+                status=Job.FAILED, locked_until=None, finished_at=now,
+                error=f'Воркер не завершил задачу за {settings.JOBS_TIMEOUT} '
+                      f'с, попытки кончились')
+            if failed:
+                logger.warning('Зависших задач без попыток: %s', failed)
+            job = queryset.order_by(
+                '-priority', 'run_after', 'pk').select_for_update(
+                skip_locked=True).first()
+            if job is None:
+                return None
+            fields = {
+                'status': Job.RUNNING,
+                'attempts': job.attempts + 1,
+                'started_at': now,
+                'locked_until': now + timedelta(seconds=settings.JOBS_TIMEOUT),
+            }
+            claimed = Job.objects.filter(
+                pk=job.pk, status=job.status, attempts=job.attempts,
+            ).update(**fields)
+        if claimed:
+            for field, value in fields.items():
+                setattr(job, field, value)
+            return job
+        if pk is not None:
+            return None
+
+
+def run_job(job):
+    task = tasks.get(job.name)
+    now = timezone.now()
+    fields = {'locked_until': None}
+    try:
+        if task is None:
+            raise LookupError(f'Задача {job.name} не зарегистрирована')
+        result = task(**job.kwargs)
+    except Exception:
+        logger.exception('Ошибка в задаче %s #%s', job.name, job.pk)
+        fields['error'] = traceback.format_exc()
+        if task is not None and job.attempts < job.max_attempts:
+            fields['status'] = Job.QUEUED
+            fields['run_after'] = now + timedelta(
+                seconds=settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1))
+        else:
+            fields['status'] = Job.FAILED
+            fields['finished_at'] = timezone.now()
+    else:
+        if isinstance(result, JobFile):
+            fields.update(result._asdict())
+        else:
+            fields['result'] = result
+        fields.update(status=Job.DONE, finished_at=timezone.now(), error='')
+    # Если задачу успели забрать повторно, результат этой попытки
+    # отбрасывается.
+    Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, attempts=job.attempts,
+    ).update(**fields)
+    for field, value in fields.items():
+        setattr(job, field, value)
+
+
+def purge_finished():
+    """Удаляет завершённые задачи старше JOBS_RESULT_TTL секунд."""
+    return Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED),
+        finished_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOBS_RESULT_TTL),
+    ).delete()[0]
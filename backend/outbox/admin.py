@@ -0,0 +1,17 @@
+from backend.admin import LargeTableAdmin
+from django.contrib.admin import ModelAdmin, register
+
+from .models import OutboxConsumer, OutboxEvent
+
+
+@register(OutboxEvent)
+class OutboxEventAdmin(LargeTableAdmin):
+    list_display = ('pk', 'model', 'action', 'fields', 'created_at')
+    list_filter = ('action',)
+    search_fields = ('model',)
+    ordering = ('-pk',)
+
+
+@register(OutboxConsumer)
+class OutboxConsumerAdmin(ModelAdmin):
+    list_display = ('name', 'position', 'updated_at')
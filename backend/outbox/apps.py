@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class OutboxConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'outbox'
+    verbose_name = 'Журнал событий'
+
+    def ready(self):
+        from backend.metrics import registry
+
+        from .metrics import render_outbox_stats
+        from .signals import connect
+
+        connect()
+        registry.add_collector(render_outbox_stats)
@@ -0,0 +1,125 @@
+"""
+Доставка событий постоянным подписчикам, повтор и очистка журнала.
+
+Позиция подписчика - id последнего обработанного события. События
+читаются по возрастанию id, но транзакции коммитятся не в порядке
+получения id: событие с меньшим id может появиться позже. Поэтому на
+пропуске в id доставка останавливается, пока событию после пропуска не
+исполнится OUTBOX_GAP_TIMEOUT секунд; после этого пропуск считается
+откатом транзакции.
+"""
+from datetime import timedelta
+
+from api.constants import OUTBOX_BATCH_SIZE
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import OutboxConsumer, OutboxEvent
+from .subscribers import subscribers, wants
+
+
+def get_durable():
+    return [
+        registered for registered in subscribers.values()
+        if registered.durable]
+
+
+def take_contiguous(events, position, now):
+    """События без пропусков в id после position (см. модуль)."""
+    gap_deadline = now - timedelta(seconds=settings.OUTBOX_GAP_TIMEOUT)
+    taken = []
+    expected = position + 1
+    for event in events:
+        if event.pk != expected and event.created_at > gap_deadline:
+            break
+        taken.append(event)
+        expected = event.pk + 1
+    return taken
+
+
+def drain(registered, batch_size=OUTBOX_BATCH_SIZE):
+    """Передаёт постоянному подписчику следующую пачку событий.
+
+    Обработка и сдвиг позиции идут в одной транзакции: изменения БД,
+    которые делает подписчик, применяются ровно один раз. Строка
+    позиции блокируется, поэтому одного подписчика не обслужат два
+    воркера сразу. Возвращает число доставленных событий.
+    """
+    if not OutboxConsumer.objects.filter(name=registered.name).exists():
+        # Новый подписчик получает все события, которые ещё хранятся.
+        first = OutboxEvent.objects.aggregate(first=Min('pk'))['first']
+        OutboxConsumer.objects.get_or_create(
+            name=registered.name, defaults={'position': (first or 1) - 1})
+    with transaction.atomic():
+        consumer = OutboxConsumer.objects.select_for_update(
+            skip_locked=True).filter(name=registered.name).first()
+        if consumer is None:
+            return 0
+        events = take_contiguous(
+            OutboxEvent.objects.filter(pk__gt=consumer.position).order_by(
+                'pk')[:batch_size],
+            consumer.position, timezone.now())
+        for event in events:
+            if wants(registered, event):
+                registered.handler(event)
+        if events:
+            consumer.position = events[-1].pk
+            consumer.save(update_fields=('position', 'updated_at'))
+    return len(events)
+
+
+def replay(registered, from_id, batch_size=OUTBOX_BATCH_SIZE):
+    """Повторяет события начиная с from_id.
+
+    Постоянному подписчику позиция возвращается назад, события получит
+    следующий drain. Обычному события передаются сразу. Возвращает
+    число переданных событий.
+    """
+    if registered.durable:
+        OutboxConsumer.objects.update_or_create(
+            name=registered.name, defaults={'position': from_id - 1})
+        return 0
+    delivered = 0
+    position = from_id - 1
+    while True:
+        events = list(OutboxEvent.objects.filter(pk__gt=position).order_by(
+            'pk')[:batch_size])
+        if not events:
+            return delivered
+        for event in events:
+            if wants(registered, event):
+                registered.handler(event)
+                delivered += 1
+        position = events[-1].pk
+
+
+def purge():
+    """Удаляет события старше OUTBOX_RETENTION секунд, которые уже
+    получили все постоянные подписчики."""
+    events = OutboxEvent.objects.filter(
+        created_at__lt=timezone.now() - timedelta(
+            seconds=settings.OUTBOX_RETENTION))
+    names = [registered.name for registered in get_durable()]
+    if names:
+        positions = OutboxConsumer.objects.filter(name__in=names)
+        if positions.count() < len(names):
+            # Подписчик ещё не запускался и должен получить все события.
+            return 0
+        events = events.filter(
+            pk__lte=positions.aggregate(position=Min('position'))['position'])
+    return events.delete()[0]
+
+
+def get_lag():
+    """Сколько событий осталось доставить каждому постоянному подписчику.
+
+    Считается по разнице id, поэтому с пропусками в id это оценка
+    сверху.
+    """
+    last = OutboxEvent.objects.aggregate(last=Max('pk'))['last'] or 0
+    positions = dict(OutboxConsumer.objects.values_list('name', 'position'))
+    return {
+        registered.name: max(0, last - positions.get(registered.name, 0))
+        for registered in get_durable()}
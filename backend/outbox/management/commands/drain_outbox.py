@@ -0,0 +1,91 @@
+import logging
+import signal
+import time
+
+from api.constants import OUTBOX_BATCH_SIZE
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from outbox.consumers import drain, get_durable, purge, replay
+from outbox.subscribers import subscribers
+
+logger = logging.getLogger(__name__)
+
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver outbox events to durable subscribers in order, in "
+        "batches, and purge delivered events older than OUTBOX_RETENTION. "
+        "With --replay-from, deliver events starting from the given id "
+        "again: plain subscribers get them right away, durable ones are "
+        "rewound. SIGTERM and SIGINT stop the worker after the current "
+        "batch.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--consumer', action='append', dest='consumers',
+            help='Subscriber name (repeatable); all durable ones by default')
+        parser.add_argument(
+            '--batch-size', type=int, default=OUTBOX_BATCH_SIZE)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when every subscriber has caught up')
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Seconds to wait when there are no new events')
+        parser.add_argument(
+            '--replay-from', type=int,
+            help='Deliver events from this id again and exit unless '
+                 'durable subscribers need draining')
+
+    def handle(self, *args, **options):
+        names = options['consumers']
+        unknown = set(names or ()) - set(subscribers)
+        if unknown:
+            raise CommandError(
+                f'Unknown subscribers: {", ".join(sorted(unknown))}. '
+                f'Known: {", ".join(sorted(subscribers))}')
+        if options['replay_from'] is not None:
+            selected = [subscribers[name] for name in names or subscribers]
+            for registered in selected:
+                delivered = replay(
+                    registered, options['replay_from'],
+                    options['batch_size'])
+                self.stdout.write(
+                    f'{registered.name}: rewound' if registered.durable
+                    else f'{registered.name}: {delivered} events replayed')
+            if not any(registered.durable for registered in selected):
+                return
+        durable = [
+            registered for registered in get_durable()
+            if names is None or registered.name in names]
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        purged_at = 0
+        while not self.stopping:
+            close_old_connections()
+            if time.monotonic() - purged_at > PURGE_INTERVAL:
+                purged = purge()
+                if purged:
+                    self.stdout.write(f'{purged} events purged')
+                purged_at = time.monotonic()
+            delivered = 0
+            for registered in durable:
+                try:
+                    count = drain(registered, options['batch_size'])
+                except Exception:
+                    logger.exception(
+                        'Outbox subscriber %s failed', registered.name)
+                    continue
+                if count:
+                    self.stdout.write(f'{registered.name}: {count} events')
+                delivered += count
+            if not delivered:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,14 @@
+"""Отставание постоянных подписчиков журнала событий для /metrics/."""
+from backend.metrics import PREFIX, escape
+
+from .consumers import get_lag
+
+
+def render_outbox_stats():
+    name = PREFIX + 'outbox_lag_events'
+    lines = [f'# HELP {name} Недоставленные события постоянных подписчиков.',
+             f'# TYPE {name} gauge']
+    lines += [
+        f'{name}{{consumer="{escape(consumer)}"}} {lag}'
+        for consumer, lag in sorted(get_lag().items())]
+    return lines
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.11 on 2026-10-19 09:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxConsumer',
+            fields=[
+                ('name', models.CharField(max_length=200, primary_key=True, serialize=False, verbose_name='Подписчик')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Последнее событие')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'подписчик',
+                'verbose_name_plural': 'Подписчики',
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=100, verbose_name='Модель')),
+                ('action', models.CharField(choices=[('created', 'Создание'), ('updated', 'Изменение'), ('deleted', 'Удаление')], max_length=16, verbose_name='Действие')),
+                ('data', models.JSONField(verbose_name='Объекты')),
+                ('fields', models.JSONField(blank=True, null=True, verbose_name='Изменённые поля')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'событие',
+                'verbose_name_plural': 'События',
+                'ordering': ('id',),
+            },
+        ),
+    ]
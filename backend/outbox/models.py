@@ -0,0 +1,204 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from api.constants import (OUTBOX_ACTION_MAX_LENGTH,
+                           OUTBOX_CONSUMER_MAX_LENGTH, OUTBOX_MODEL_MAX_LENGTH)
+from django.db import models, router, transaction
+from django.utils import timezone
+
+from .subscribers import dispatch, is_subscribed
+
+# Строки удалённых объектов по (модели, базе) внутри batch_deletions.
+deleted_rows = ContextVar('outbox_deleted_rows', default=None)
+
+
+def get_rows(objs):
+    """Данные событий: первичный ключ и поля outbox_fields объектов."""
+    return [
+        {'pk': obj.pk,
+         **{field: getattr(obj, field) for field in obj.outbox_fields}}
+        for obj in objs]
+
+
+class OutboxEvent(models.Model):
+    """Изменение объектов отслеживаемой модели.
+
+    Событие пишется в той же транзакции, что и изменение, и после
+    коммита передаётся подписчикам (outbox.subscribers). Одно событие
+    описывает одну операцию: сохранение или удаление объекта либо
+    массовую операцию QuerySet, поэтому в data - список строк.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTIONS = (
+        (CREATED, 'Создание'),
+        (UPDATED, 'Изменение'),
+        (DELETED, 'Удаление'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(
+        max_length=OUTBOX_MODEL_MAX_LENGTH, verbose_name='Модель')
+    action = models.CharField(
+        max_length=OUTBOX_ACTION_MAX_LENGTH, choices=ACTIONS,
+        verbose_name='Действие')
+    data = models.JSONField(verbose_name='Объекты')
+    fields = models.JSONField(
+        null=True, blank=True, verbose_name='Изменённые поля')
+    created_at = models.DateTimeField(
+        default=timezone.now, verbose_name='Дата создания')
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'событие'
+        verbose_name_plural = 'События'
+
+    def __str__(self):
+        return f'#{self.pk} {self.model} {self.action}'
+
+    @classmethod
+    def record(cls, model, action, rows, fields=None, using=None):
+        """Пишет событие в текущую транзакцию и передаёт его подписчикам
+        процесса после коммита. События моделей без подписчиков не
+        пишутся."""
+        if not rows or not is_subscribed(model):
+            return None
+        using = using or router.db_for_write(model)
+        event = cls.objects.using(using).create(
+            model=model._meta.label_lower, action=action, data=rows,
+            fields=None if fields is None else sorted(fields))
+        transaction.on_commit(lambda: dispatch((event,)), using=using)
+        return event
+
+    def values(self, field):
+        """Значения поля во всех строках события."""
+        return {row[field] for row in self.data}
+
+
+class OutboxConsumer(models.Model):
+    """Позиция постоянного подписчика в журнале событий."""
+    name = models.CharField(
+        max_length=OUTBOX_CONSUMER_MAX_LENGTH, primary_key=True,
+        verbose_name='Подписчик')
+    position = models.BigIntegerField(
+        default=0, verbose_name='Последнее событие')
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name='Дата изменения')
+
+    class Meta:
+        verbose_name = 'подписчик'
+        verbose_name_plural = 'Подписчики'
+
+    def __str__(self):
+        return f'{self.name} @ {self.position}'
+
+
+@contextmanager
+def batch_deletions():
+    """Пишет удаления внутри блока одним событием на модель.
+
+    Удаление с каскадом отправляет post_delete на каждый объект, и без
+    пакета каждый объект стал бы отдельным событием. Блок должен стоять
+    внутри транзакции удаления.
+    """
+    if deleted_rows.get() is not None:
+        yield
+        return
+    batches = defaultdict(list)
+    token = deleted_rows.set(batches)
+    try:
+        yield
+    finally:
+        deleted_rows.reset(token)
+    for (model, using), rows in batches.items():
+        OutboxEvent.record(model, OutboxEvent.DELETED, rows, using=using)
+
+
+class OutboxQuerySet(models.QuerySet):
+    """QuerySet, массовые операции которого пишут события.
+
+    Удаление отдельного события не требует: QuerySet.delete отправляет
+    post_delete на каждый объект, а его записывает outbox.signals.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            OutboxEvent.record(
+                self.model, OutboxEvent.CREATED, get_rows(objs),
+                using=self.db)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            updated = super().bulk_update(objs, fields, *args, **kwargs)
+            OutboxEvent.record(
+                self.model, OutboxEvent.UPDATED, get_rows(objs), fields,
+                using=self.db)
+        return updated
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            # Строки читаются до изменения: по ним подписчики узнают,
+            # чьи данные изменились, даже если меняются сами outbox_fields.
+            rows = list(self.values('pk', *self.model.outbox_fields))
+            updated = super().update(**kwargs)
+            OutboxEvent.record(
+                self.model, OutboxEvent.UPDATED, rows, kwargs, using=self.db)
+        return updated
+
+    update.alters_data = True
+    update.queryset_only = False
+
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False), \
+                batch_deletions():
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class OutboxModel(models.Model):
+    """Модель, изменения которой пишутся в журнал событий.
+
+    outbox_fields - поля, которые попадают в событие вместе с
+    первичным ключом (например, user_id для сброса кеша пользователя).
+    Сохранение только полей из outbox_ignored_fields (например,
+    last_login при входе) события не пишет.
+    """
+    outbox_fields = ()
+    outbox_ignored_fields = ()
+
+    objects = OutboxQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self)
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        if (update_fields is not None and self.outbox_ignored_fields
+                and set(update_fields) <= set(self.outbox_ignored_fields)):
+            return super().save(*args, **kwargs)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            OutboxEvent.record(
+                type(self),
+                OutboxEvent.CREATED if adding else OutboxEvent.UPDATED,
+                get_rows((self,)), update_fields, using=using)
+
+    save.alters_data = True
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False), \
+                batch_deletions():
+            return super().delete(using=using, keep_parents=keep_parents)
+
+    delete.alters_data = True
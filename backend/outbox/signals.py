@@ -0,0 +1,60 @@
+"""
+Удаления и изменения связей многие-ко-многим для журнала событий.
+
+Сохранение и массовые операции пишут события сами (OutboxModel и
+OutboxQuerySet). Удаление всегда проходит через Collector, который
+отправляет post_delete на каждый объект внутри своей транзакции, в том
+числе при каскадном удалении и QuerySet.delete; удаления через
+OutboxModel и OutboxQuerySet собираются в одно событие на модель
+(batch_deletions). Изменения связей
+многие-ко-многим пишутся как изменение поля модели, в которой оно
+объявлено.
+"""
+from functools import partial
+
+from django.apps import apps
+from django.db.models.signals import m2m_changed, post_delete
+
+from .models import OutboxEvent, OutboxModel, deleted_rows, get_rows
+
+
+def record_deletion(sender, instance, using, **kwargs):
+    batches = deleted_rows.get()
+    if batches is not None:
+        batches[sender, using] += get_rows((instance,))
+        return
+    OutboxEvent.record(
+        sender, OutboxEvent.DELETED, get_rows((instance,)), using=using)
+
+
+def record_m2m_change(field, sender, instance, action, reverse, model,
+                      pk_set, using, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    owner = field.model
+    if not reverse:
+        objs = (instance,)
+    elif action == 'pre_clear':
+        objs = owner._base_manager.using(using).filter(
+            **{field.name: instance})
+    else:
+        objs = owner._base_manager.using(using).filter(pk__in=pk_set)
+    OutboxEvent.record(
+        owner, OutboxEvent.UPDATED, get_rows(objs), (field.name,),
+        using=using)
+
+
+def connect():
+    for model in apps.get_models():
+        if not issubclass(model, OutboxModel):
+            continue
+        post_delete.connect(
+            record_deletion, sender=model,
+            dispatch_uid=f'outbox_delete_{model._meta.label_lower}')
+        for field in model._meta.local_many_to_many:
+            through = field.remote_field.through
+            if through._meta.auto_created:
+                m2m_changed.connect(
+                    partial(record_m2m_change, field), sender=through,
+                    weak=False,
+                    dispatch_uid=f'outbox_m2m_{through._meta.label_lower}')
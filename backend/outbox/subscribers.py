@@ -0,0 +1,68 @@
+"""
+Подписчики на события журнала (outbox.models.OutboxEvent).
+
+Подписчик - функция, которая получает событие одной из своих моделей:
+
+    @subscriber(Favorite, ShoppingCart)
+    def bump_relations_version(event):
+        ...
+
+Обычные подписчики вызываются в процессе, который изменил данные,
+сразу после коммита транзакции. Постоянные (durable=True) вызываются
+только командой drain_outbox: по порядку событий, с позицией в
+OutboxConsumer, которая сдвигается в одной транзакции с обработкой.
+События доставляются хотя бы один раз, поэтому подписчик должен
+спокойно переносить повторы (например, при replay).
+"""
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+Subscriber = namedtuple('Subscriber', ('name', 'handler', 'models', 'durable'))
+
+subscribers = {}
+
+# Модели, на события которых кто-то подписан. События остальных моделей
+# не пишутся.
+subscribed_models = set()
+
+
+def subscriber(*models, name=None, durable=False):
+    """Регистрирует функцию как подписчика на события моделей."""
+    def decorator(func):
+        registered = Subscriber(
+            name or f'{func.__module__}.{func.__name__}', func,
+            frozenset(model._meta.label_lower for model in models), durable)
+        subscribers[registered.name] = registered
+        subscribed_models.update(registered.models)
+        return func
+    return decorator
+
+
+def is_subscribed(model):
+    return model._meta.label_lower in subscribed_models
+
+
+def wants(registered, event):
+    return event.model in registered.models
+
+
+def dispatch(events):
+    """Передаёт события обычным подписчикам процесса.
+
+    Ошибка подписчика не должна ломать уже закоммиченный запрос,
+    поэтому она только пишется в лог.
+    """
+    for registered in subscribers.values():
+        if registered.durable:
+            continue
+        for event in events:
+            if not wants(registered, event):
+                continue
+            try:
+                registered.handler(event)
+            except Exception:
+                logger.exception(
+                    'Outbox subscriber %s failed on event %s',
+                    registered.name, event.pk)
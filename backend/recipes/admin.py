@@ -1,48 +1,80 @@
+from backend.admin import LargeTableAdmin, count_related
 from django.contrib import admin
 from django.contrib.admin import ModelAdmin, register
+from django.db.models.functions import Left
+from django.utils.text import Truncator
 
-from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                     ShoppingCart, Subscription, Tag)
+from .models import (Favorite, Ingredient, IngredientNutrition,
+                     IngredientRecipe, Recipe, ShoppingCart, Subscription,
+                     Tag)
+
+TEXT_PREVIEW_LENGTH = 100
 
 
 @register(Favorite)
-class FavoriteAdmin(ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+
+
+class IngredientNutritionInline(admin.StackedInline):
+    model = IngredientNutrition
 
 
 @register(Ingredient)
 class IngredientAdmin(ModelAdmin):
     list_display = ('name', 'measurement_unit')
     search_fields = ('name',)
+    inlines = (IngredientNutritionInline,)
 
 
 @register(IngredientRecipe)
-class IngredientRecipeAdmin(ModelAdmin):
+class IngredientRecipeAdmin(LargeTableAdmin):
     list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
     search_fields = ('recipe__name', 'ingredient__name')
+    autocomplete_fields = ('recipe', 'ingredient')
 
 
 class IngredientInline(admin.StackedInline):
     model = IngredientRecipe
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 @register(Recipe)
-class RecipeAdmin(ModelAdmin):
-    list_display = ('name', 'text', 'cooking_time', 'favorites')
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ('name', 'short_text', 'cooking_time', 'favorites')
     search_fields = ('name', 'tags__name')
+    autocomplete_fields = ('author',)
     inlines = (IngredientInline,)
+    # В списке читается только начало описания, на символ длиннее
+    # превью, чтобы знать, нужно ли многоточие.
+    list_defer = ('text',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            text_preview=Left('text', TEXT_PREVIEW_LENGTH + 1),
+            favorites_count=count_related(Favorite, 'recipe'))
+
+    @admin.display(description='Описание')
+    def short_text(self, obj):
+        return Truncator(obj.text_preview).chars(TEXT_PREVIEW_LENGTH)
 
-    @admin.display(description='Число добавлений в избранное')
+    @admin.display(description='Число добавлений в избранное',
+                   ordering='favorites_count')
     def favorites(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
 
 
 @register(ShoppingCart)
-class ShoppingCartAdmin(ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
 
 
 @register(Tag)
@@ -52,6 +84,8 @@ class TagAdmin(ModelAdmin):
 
 
 @register(Subscription)
-class SubscriptionAdmin(ModelAdmin):
+class SubscriptionAdmin(LargeTableAdmin):
     list_display = ('user', 'subscribed_to')
+    list_select_related = ('user', 'subscribed_to')
     search_fields = ('user__username', 'subscribed_to__username')
+    autocomplete_fields = ('user', 'subscribed_to')
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.11 on 2026-10-19 09:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationsBuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата расчёта')),
+                ('user_ids', models.BinaryField()),
+                ('user_hashes', models.BinaryField()),
+                ('recipe_ids', models.BinaryField()),
+                ('recipe_hashes', models.BinaryField()),
+                ('popular_recipe_ids', models.BinaryField()),
+            ],
+            options={
+                'verbose_name': 'расчёт рекомендаций',
+                'verbose_name_plural': 'Расчёты рекомендаций',
+                'ordering': ('-created_at',),
+                'get_latest_by': 'created_at',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarRecipes',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similar', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('recipe_ids', models.BinaryField(verbose_name='Похожие рецепты')),
+                ('scores', models.BinaryField(verbose_name='Оценки')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата расчёта')),
+            ],
+            options={
+                'verbose_name': 'похожие рецепты',
+                'verbose_name_plural': 'Похожие рецепты',
+            },
+        ),
+    ]
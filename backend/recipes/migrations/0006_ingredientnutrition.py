@@ -0,0 +1,30 @@
+# Generated by Django 4.2.11 on 2026-10-19 09:08
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_similarrecipes_recommendationsbuild'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientNutrition',
+            fields=[
+                ('ingredient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='nutrition', serialize=False, to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('calories', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Калорийность, ккал')),
+                ('proteins', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Белки, г')),
+                ('fats', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Жиры, г')),
+                ('carbohydrates', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Углеводы, г')),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Цена, руб.')),
+            ],
+            options={
+                'verbose_name': 'пищевая ценность',
+                'verbose_name_plural': 'Пищевая ценность',
+            },
+        ),
+    ]
@@ -0,0 +1,150 @@
+# Generated by Django 4.2.11 on 2026-10-19 09:23
+
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def check_duplicates(apps, schema_editor):
+    """Останавливает миграцию, если в избранном или списках покупок есть
+    повторы: раньше уникальность (user, recipe) в базе не проверялась.
+
+    Данные пользователей миграция не удаляет, повторы удаляет команда
+    delete_duplicates, которую запускают отдельно.
+    """
+    found = []
+    for model_name in ('Favorite', 'ShoppingCart'):
+        model = apps.get_model('recipes', model_name)
+        duplicates = model.objects.values('user', 'recipe').annotate(
+            count=models.Count('pk')).filter(count__gt=1).count()
+        if duplicates:
+            found.append(f'{model_name}: {duplicates}')
+    if found:
+        raise RuntimeError(
+            'Repeated (user, recipe) pairs (' + ', '.join(found) + '). '
+            'Review and delete them with '
+            '"python manage.py delete_duplicates", then migrate again.')
+
+
+TRIGRAM_INDEX = 'ingredient_name_trgm_idx'
+
+
+TRIGRAM_AVAILABLE = (
+    "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+TRIGRAM_INSTALLED = "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+
+
+def exists(connection, query):
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        return cursor.fetchone() is not None
+
+
+class OptionalTrigramExtension(TrigramExtension):
+    """Устанавливает pg_trgm, если он есть на сервере PostgreSQL.
+
+    Если расширение уже установлено, прав не нужно. Иначе нужно право
+    CREATE на базу (оно есть у владельца базы; pg_trgm - доверенное
+    расширение с PostgreSQL 13), в более старых версиях расширение
+    заранее создаёт суперпользователь: CREATE EXTENSION pg_trgm.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if (schema_editor.connection.vendor == 'postgresql'
+                and exists(schema_editor.connection, TRIGRAM_AVAILABLE)):
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+
+
+def create_trigram_index(apps, schema_editor):
+    """Индекс для поиска ингредиентов по name__icontains.
+
+    Django ищет по UPPER(name) LIKE, поэтому индекс строится по тому же
+    выражению. Создаётся только в PostgreSQL с установленным pg_trgm.
+    """
+    if (schema_editor.connection.vendor != 'postgresql'
+            or not exists(schema_editor.connection, TRIGRAM_INSTALLED)):
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON recipes_ingredient '
+        'USING gin ((UPPER(name::text)) gin_trgm_ops)')
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0006_ingredientnutrition'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite_user_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shoppingcart_user_recipe'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredientrecipe',
+            index=models.Index(fields=['recipe', 'ingredient', 'amount'], name='ingredientrecipe_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['subscribed_to', 'user'], name='subscription_reverse_idx'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientrecipe',
+            name='ingredient',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='recipes.ingredient', verbose_name='Ингредиент'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientrecipe',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ingredients_in_recipe', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='subscription',
+            name='subscribed_to',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Подписан на'),
+        ),
+        migrations.AlterField(
+            model_name='subscription',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='subscribed_to', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        OptionalTrigramExtension(),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
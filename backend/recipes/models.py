@@ -5,11 +5,12 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models
+from outbox.models import OutboxModel
 
 User = get_user_model()
 
 
-class Ingredient(models.Model):
+class Ingredient(OutboxModel):
     """Модель для ингредиента."""
     name = models.CharField(
         max_length=NAME_MAX_LENGTH, blank=False, verbose_name='Название')
@@ -26,7 +27,41 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}'
 
 
-class Tag(models.Model):
+class IngredientNutrition(OutboxModel):
+    """Пищевая ценность и цена ингредиента.
+
+    Значения указаны на 100 г или 100 мл для весовых и объёмных единиц
+    и на одну единицу для остальных (см. api.units). Любое поле можно
+    не заполнять.
+    """
+    ingredient = models.OneToOneField(
+        Ingredient, on_delete=models.CASCADE, primary_key=True,
+        related_name='nutrition', verbose_name='Ингредиент')
+    calories = models.DecimalField(
+        max_digits=8, decimal_places=2, null=True, blank=True,
+        validators=(MinValueValidator(0),), verbose_name='Калорийность, ккал')
+    proteins = models.DecimalField(
+        max_digits=8, decimal_places=2, null=True, blank=True,
+        validators=(MinValueValidator(0),), verbose_name='Белки, г')
+    fats = models.DecimalField(
+        max_digits=8, decimal_places=2, null=True, blank=True,
+        validators=(MinValueValidator(0),), verbose_name='Жиры, г')
+    carbohydrates = models.DecimalField(
+        max_digits=8, decimal_places=2, null=True, blank=True,
+        validators=(MinValueValidator(0),), verbose_name='Углеводы, г')
+    price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True,
+        validators=(MinValueValidator(0),), verbose_name='Цена, руб.')
+
+    class Meta:
+        verbose_name = 'пищевая ценность'
+        verbose_name_plural = 'Пищевая ценность'
+
+    def __str__(self):
+        return f'Пищевая ценность: {self.ingredient}'
+
+
+class Tag(OutboxModel):
     """Модель для тега."""
     name = models.CharField(
         max_length=NAME_TAG_MAX_LENGTH, unique=True, blank=False,
@@ -42,11 +77,14 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(OutboxModel):
     """Модель для рецепта."""
+    outbox_fields = ('author_id',)
+
+    # Отдельный индекс не нужен: author - первое поле recipe_author_idx.
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='recipes',
-        verbose_name='Автор рецепта')
+        db_index=False, verbose_name='Автор рецепта')
     name = models.CharField(
         max_length=NAME_RECIPE_MAX_LENGTH, blank=False,
         verbose_name='Название')
@@ -66,22 +104,32 @@ class Recipe(models.Model):
         verbose_name='Короткая ссылка')
     pub_date = models.DateTimeField(
         auto_now_add=True, verbose_name='Дата публикации')
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name='Дата изменения')
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date'], name='recipe_author_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class IngredientRecipe(models.Model):
+class IngredientRecipe(OutboxModel):
     """Промежуточная модель."""
+    outbox_fields = ('recipe_id', 'ingredient_id')
+
     ingredient = models.ForeignKey(
-        Ingredient, on_delete=models.CASCADE, verbose_name='Ингредиент')
+        Ingredient, on_delete=models.CASCADE, db_index=False,
+        verbose_name='Ингредиент')
     recipe = models.ForeignKey(
-        Recipe, on_delete=models.CASCADE,
+        Recipe, on_delete=models.CASCADE, db_index=False,
         related_name='ingredients_in_recipe', verbose_name='Рецепт')
     amount = models.PositiveSmallIntegerField(
         blank=False, validators=(MinValueValidator(1),),
@@ -94,15 +142,30 @@ class IngredientRecipe(models.Model):
             models.UniqueConstraint(
                 fields=['ingredient', 'recipe'],
                 name='unique_ingredientrecipe')]
+        # Ингредиенты рецептов и список покупок читаются только из
+        # индекса, без обращения к таблице.
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient', 'amount'],
+                name='ingredientrecipe_recipe_idx'),
+        ]
 
     def __str__(self):
         return f'Ингредиент: {self.ingredient} в рецепте: {self.recipe}'
 
 
-class BaseUserRecipeModel(models.Model):
-    """Базовый класс для ShoppingCart и Favorite."""
+class BaseUserRecipeModel(OutboxModel):
+    """Базовый класс для ShoppingCart и Favorite.
+
+    Поиск по пользователю идёт по уникальному индексу (user, recipe),
+    поэтому у user нет отдельного индекса. Meta наследников должна
+    наследовать BaseUserRecipeModel.Meta, иначе ограничение теряется.
+    """
+    outbox_fields = ('user_id', 'recipe_id')
+
     user = models.ForeignKey(
-        User, on_delete=models.CASCADE, verbose_name='Пользователь')
+        User, on_delete=models.CASCADE, db_index=False,
+        verbose_name='Пользователь')
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE, verbose_name='Рецепт')
 
@@ -110,13 +173,14 @@ class BaseUserRecipeModel(models.Model):
         abstract = True
         constraints = [
             models.UniqueConstraint(
-                fields=['user', 'recipe'], name='unique_constraint')]
+                fields=['user', 'recipe'],
+                name='unique_%(class)s_user_recipe')]
 
 
 class ShoppingCart(BaseUserRecipeModel):
     """Модель для списка покупок."""
 
-    class Meta:
+    class Meta(BaseUserRecipeModel.Meta):
         verbose_name = 'список покупок'
         verbose_name_plural = 'Списки покупок'
         default_related_name = 'shopping_cart'
@@ -128,7 +192,7 @@ class ShoppingCart(BaseUserRecipeModel):
 class Favorite(BaseUserRecipeModel):
     """Модель для избранного."""
 
-    class Meta:
+    class Meta(BaseUserRecipeModel.Meta):
         verbose_name = 'избранное'
         verbose_name_plural = 'Избранное'
         default_related_name = 'favorite'
@@ -137,13 +201,20 @@ class Favorite(BaseUserRecipeModel):
         return f'Рецепт: {self.recipe} в избранном у {self.user}'
 
 
-class Subscription(models.Model):
-    """Модель для подписки."""
+class Subscription(OutboxModel):
+    """Модель для подписки.
+
+    Подписки пользователя ищутся по уникальному индексу (user,
+    subscribed_to), подписчики - по обратному (subscribed_to, user).
+    """
+    outbox_fields = ('user_id', 'subscribed_to_id')
+
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='subscribed_to',
-        verbose_name='Пользователь')
+        db_index=False, verbose_name='Пользователь')
     subscribed_to = models.ForeignKey(
-        User, on_delete=models.CASCADE, verbose_name='Подписан на')
+        User, on_delete=models.CASCADE, db_index=False,
+        verbose_name='Подписан на')
 
     def clean(self):
         if self.user == self.subscribed_to:
@@ -157,6 +228,59 @@ class Subscription(models.Model):
             models.UniqueConstraint(
                 fields=['user', 'subscribed_to'],
                 name='unique_subscription')]
+        indexes = [
+            models.Index(
+                fields=['subscribed_to', 'user'],
+                name='subscription_reverse_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на {self.subscribed_to}'
+
+
+class SimilarRecipes(models.Model):
+    """Похожие рецепты, рассчитанные командой build_recommendations.
+
+    id рецептов и оценки хранятся упакованными массивами (int64 и
+    float32), по убыванию оценки.
+    """
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, primary_key=True,
+        related_name='similar', verbose_name='Рецепт')
+    recipe_ids = models.BinaryField(verbose_name='Похожие рецепты')
+    scores = models.BinaryField(verbose_name='Оценки')
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name='Дата расчёта')
+
+    class Meta:
+        verbose_name = 'похожие рецепты'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'Похожие на {self.recipe_id}'
+
+
+class RecommendationsBuild(models.Model):
+    """Состояние последнего расчёта рекомендаций.
+
+    Хеши наборов рецептов пользователей и наборов пользователей
+    рецептов позволяют при следующем запуске пересчитать только
+    изменившиеся строки. Там же хранятся самые популярные рецепты для
+    пользователей без избранного.
+    """
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name='Дата расчёта')
+    user_ids = models.BinaryField()
+    user_hashes = models.BinaryField()
+    recipe_ids = models.BinaryField()
+    recipe_hashes = models.BinaryField()
+    popular_recipe_ids = models.BinaryField()
+
+    class Meta:
+        ordering = ('-created_at',)
+        get_latest_by = 'created_at'
+        verbose_name = 'расчёт рекомендаций'
+        verbose_name_plural = 'Расчёты рекомендаций'
+
+    def __str__(self):
+        return f'Расчёт от {self.created_at}'
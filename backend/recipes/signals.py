@@ -0,0 +1,65 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import IngredientRecipe, Recipe
+
+
+def touch_recipes(recipe_ids):
+    """Обновляет дату изменения рецептов."""
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Recipe)
+def mark_recipe_deletion(instance, origin=None, **kwargs):
+    """Запоминает рецепты, которые удаляются вместе с источником.
+
+    Collector отправляет pre_delete на все объекты до удаления строк,
+    поэтому к приходу post_delete ингредиентов рецепты уже отмечены.
+    """
+    if origin is None:
+        return
+    deleted = getattr(origin, '_deleted_recipes', None)
+    if deleted is None:
+        deleted = origin._deleted_recipes = set()
+    deleted.add(instance.pk)
+
+
+@receiver(post_save, sender=IngredientRecipe)
+def touch_recipe_on_ingredient_save(instance, **kwargs):
+    touch_recipes((instance.recipe_id,))
+
+
+@receiver(post_delete, sender=IngredientRecipe)
+def touch_recipe_on_ingredient_delete(instance, origin=None, **kwargs):
+    """Обновляет рецепт при удалении ингредиента из него.
+
+    Рецепты, которые удаляются тем же удалением (сам рецепт или его
+    автор), не обновляются. При удалении через QuerySet сигнал приходит
+    на каждую строку, поэтому рецепт обновляется один раз на источник
+    удаления.
+    """
+    if instance.recipe_id in getattr(origin, '_deleted_recipes', ()):
+        return
+    touched = getattr(origin, '_touched_recipes', None)
+    if touched is None:
+        touched = set()
+        if origin is not None:
+            origin._touched_recipes = touched
+    if instance.recipe_id not in touched:
+        touched.add(instance.recipe_id)
+        touch_recipes((instance.recipe_id,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_recipe_on_tags_change(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        touch_recipes((instance.pk,))
+    elif action == 'pre_clear':
+        touch_recipes(instance.recipes.values('pk'))
+    elif pk_set:
+        touch_recipes(pk_set)
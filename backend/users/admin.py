@@ -1,23 +1,38 @@
+from backend.admin import LargeTableAdmin, count_related
 from django.contrib import admin
 from django.contrib.admin import display
+from django.contrib.auth.models import Permission
+from recipes.models import Recipe, Subscription
 
 from .models import User
 
 
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     list_display = ('pk', 'username', 'email', 'first_name', 'last_name',
                     'password', 'get_number_of_recipes',
                     'get_number_of_subscribers')
-    list_filter = ('username', 'email')
     search_fields = ('email', 'username')
 
-    @display(description='Количество рецептов')
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=count_related(Recipe, 'author'),
+            subscribers_count=count_related(Subscription, 'subscribed_to'))
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if db_field.name == 'user_permissions':
+            # Название права включает тип содержимого.
+            kwargs['queryset'] = Permission.objects.select_related(
+                'content_type')
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+    @display(description='Количество рецептов', ordering='recipes_count')
     def get_number_of_recipes(self, obj):
-        return obj.get_number_of_recipes()
+        return obj.recipes_count
 
-    @display(description='Количество подписчиков')
+    @display(description='Количество подписчиков',
+             ordering='subscribers_count')
     def get_number_of_subscribers(self, obj):
-        return obj.get_number_of_subscribers()
+        return obj.subscribers_count
 
 
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.11 on 2026-10-19 09:26
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_user_options_user_avatar_alter_user_email_and_more'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('username'), name='user_username_lower_unique', violation_error_message='Имя пользователя уже занято!'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='user_email_lower_unique', violation_error_message='Email уже используется!'),
+        ),
+    ]
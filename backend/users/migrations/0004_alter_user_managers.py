@@ -0,0 +1,20 @@
+# Generated by Django 4.2.11 on 2026-10-19 09:38
+
+from django.db import migrations
+import users.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_lower_unique'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', users.models.OutboxUserManager()),
+            ],
+        ),
+    ]
@@ -1,12 +1,20 @@
-from api.constants import (AVATAR_UPLOAD_DIR, EMAIL_MAX_LENGTH,
-                           NAME_MAX_LENGTH, USERNAME_MAX_LENGTH)
-from django.contrib.auth.models import AbstractUser, UnicodeUsernameValidator
+from api.constants import (AVATAR_UPLOAD_DIR, EMAIL_MAX_LENGTH, EMAIL_TAKEN,
+                           NAME_MAX_LENGTH, USERNAME_MAX_LENGTH,
+                           USERNAME_TAKEN)
+from django.contrib.auth.models import (AbstractUser, UnicodeUsernameValidator,
+                                        UserManager)
 from django.db import models
+from django.db.models.functions import Lower
+from outbox.models import OutboxModel, OutboxQuerySet
 
 from .validators import validate_username
 
 
-class User(AbstractUser):
+class OutboxUserManager(UserManager.from_queryset(OutboxQuerySet)):
+    pass
+
+
+class User(OutboxModel, AbstractUser):
     """Модель пользователя."""
     username = models.CharField(
         max_length=USERNAME_MAX_LENGTH, unique=True, blank=False,
@@ -22,9 +30,26 @@ class User(AbstractUser):
         upload_to=AVATAR_UPLOAD_DIR, blank=True, verbose_name='Аватар',
         default='')
 
+    objects = OutboxUserManager()
+
+    # Вход обновляет только last_login, подписчикам это не нужно.
+    outbox_ignored_fields = ('last_login',)
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
+    class Meta(AbstractUser.Meta):
+        # Имя и email уникальны без учёта регистра. Индексы по lower()
+        # используются и для проверки при регистрации.
+        constraints = [
+            models.UniqueConstraint(
+                Lower('username'), name='user_username_lower_unique',
+                violation_error_message=USERNAME_TAKEN),
+            models.UniqueConstraint(
+                Lower('email'), name='user_email_lower_unique',
+                violation_error_message=EMAIL_TAKEN),
+        ]
+
     def get_number_of_recipes(self):
         return self.recipes.count()
 